@@ -0,0 +1,105 @@
+import os
+import gzip
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+
+BACKUP_PREFIX = 'backup-'
+PAGES_PER_STEP = 256  # Pages copied per backup step; the database is only locked for one step at a time
+KEEP_BACKUPS = 10  # Timestamped backups kept by rotation
+
+
+def create_backup(conn, backup_dir, compress=False, progress=None, keep=KEEP_BACKUPS):
+    """Copy the live database into a new timestamped backup in backup_dir and return its path.
+
+    Uses the SQLite online backup API, so the copy is consistent even while the database is in use
+    (including pages still in the WAL). progress is called as progress(status, remaining, total).
+    Older backups beyond `keep` are removed afterwards.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    same_second = [_backup_order(p)[2] for p in list_backups(backup_dir)
+                   if os.path.basename(p).startswith(f'{BACKUP_PREFIX}{stamp}')]
+    if same_second:
+        stamp = f'{stamp}-{max(same_second) + 1}'  # Keeps names unique and in creation order
+    path = os.path.join(backup_dir, f'{BACKUP_PREFIX}{stamp}.db')
+
+    partial = path + '.part'
+    dest = sqlite3.connect(partial)
+    try:
+        conn.backup(dest, pages=PAGES_PER_STEP, progress=progress)
+    finally:
+        dest.close()
+
+    if compress:
+        with open(partial, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(partial)
+        path += '.gz'
+    else:
+        os.replace(partial, path)
+
+    rotate_backups(backup_dir, keep)
+    return path
+
+
+def list_backups(backup_dir, legacy_file=None):
+    """Return the backups in backup_dir, newest first.
+
+    legacy_file (the single backup.db written by older versions) is listed last if it exists.
+    """
+    backups = []
+    if os.path.isdir(backup_dir):
+        for name in os.listdir(backup_dir):
+            if name.startswith(BACKUP_PREFIX) and name.endswith(('.db', '.db.gz')):
+                backups.append(os.path.join(backup_dir, name))
+    backups.sort(key=_backup_order, reverse=True)
+    if legacy_file and os.path.exists(legacy_file):
+        backups.append(legacy_file)
+    return backups
+
+
+def _backup_order(path):
+    """Sort key for backup-<date>-<time>[-<n>].db[.gz] names: by timestamp, then by the same-second counter."""
+    stem = os.path.basename(path)[len(BACKUP_PREFIX):].split('.')[0]
+    date, _, rest = stem.partition('-')
+    time, _, counter = rest.partition('-')
+    return date, time, int(counter) if counter.isdigit() else 0
+
+
+def rotate_backups(backup_dir, keep=KEEP_BACKUPS):
+    """Delete all but the newest `keep` timestamped backups."""
+    for path in list_backups(backup_dir)[keep:]:
+        os.remove(path)
+
+
+def restore_backup(conn, backup_path, progress=None):
+    """Replace the contents of the database behind conn with a backup.
+
+    The backup is written through conn with the online backup API rather than over the file, so
+    SQLite takes the proper locks and other open connections simply see the new contents.
+    Compressed backups are unpacked to a temporary file first. The backup is checked before
+    anything is overwritten; a damaged backup raises sqlite3.DatabaseError.
+    """
+    temp_path = None
+    if backup_path.endswith('.gz'):
+        fd, temp_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(backup_path))
+        with os.fdopen(fd, 'wb') as dst, gzip.open(backup_path, 'rb') as src:
+            shutil.copyfileobj(src, dst)
+        backup_path = temp_path
+
+    try:
+        src = sqlite3.connect(Path(os.path.abspath(backup_path)).as_uri() + '?mode=ro', uri=True)
+        try:
+            result = src.execute('PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f'Backup failed integrity check: {result}')
+            src.backup(conn, pages=PAGES_PER_STEP, progress=progress)
+        finally:
+            src.close()
+    finally:
+        if temp_path:
+            os.remove(temp_path)
@@ -0,0 +1,158 @@
+"""Undoable changes to many parts at once: deleting them, setting or adjusting their stock, and
+changing their type or footprint.
+
+Each command writes all of its parts in one transaction (one executemany) and updates their rows in
+the table in place rather than reloading it; undoing it writes the previous values back the same
+way. Commands go on MainWindow's QUndoStack, so Edit > Undo takes back a whole batch in one step.
+
+A change is checked against the versions the parts were loaded at, as saving is. Undo and redo
+check that the changed field still holds what the command left there, so later batches and edits
+to other fields don't get in the way. If a part is found to have moved on, nothing is written, the
+conflict is reported and the command is dropped from the stack. Undoing a delete restores the parts
+as they were when deleted.
+"""
+import json
+import sqlite3
+
+from PyQt5.QtWidgets import QMessageBox, QUndoCommand
+
+from database import transaction
+from parts_model import FIELD_FOR_COLUMN
+from repository import ConflictError, Part, VERSION
+
+
+# Ways of changing the stock of the selected parts
+SET, ADD, SUBTRACT = "set", "add", "subtract"
+
+# What deleting a part takes with it (see the components_projects_delete trigger), kept for undo
+BOM_LINKS_SQL = "SELECT id, part_id, match FROM bom_lines WHERE part_id IN (SELECT value FROM json_each(?))"
+RESERVATIONS_SQL = '''SELECT project_id, part_id, quantity FROM stock_reservations
+                      WHERE part_id IN (SELECT value FROM json_each(?))'''
+RESTORE_BOM_LINK_SQL = "UPDATE bom_lines SET part_id = ?, match = ? WHERE id = ? AND part_id IS NULL"
+# Reservations of projects deleted in the meantime are not brought back
+RESTORE_RESERVATION_SQL = '''INSERT INTO stock_reservations (project_id, part_id, quantity)
+                             SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM projects WHERE id = ?)
+                             ON CONFLICT (project_id, part_id) DO NOTHING'''
+RESTORE_HASH_SQL = "UPDATE components SET datasheet_hash = ? WHERE id = ?"
+
+
+def adjusted_stock(stock, mode, amount):
+    """Return the stock after setting it to, adding or subtracting amount (never below 0)."""
+    if mode == SET:
+        return amount
+    return max((stock or 0) + (amount if mode == ADD else -amount), 0)
+
+
+class BatchCommand(QUndoCommand):
+    """Runs a batch change and its undo on a MainWindow, reporting a step that fails on it.
+
+    Subclasses implement apply() and revert(); name is what diagnostics times them as.
+    """
+
+    name = "batch"
+
+    def __init__(self, window, text):
+        super().__init__(text)
+        self.window = window
+
+    def redo(self):
+        self._run(self.apply, "make")
+
+    def undo(self):
+        self._run(self.revert, "undo")
+
+    def _run(self, step, verb):
+        try:
+            with self.window.diagnostics.action(self.name, self.window.conn):
+                step()
+        except ConflictError as e:
+            self.setObsolete(True)  # The stack drops it: there is no going back or forth from here
+            self.window.model.refreshParts(e.conflicts)
+            ids = ", ".join(str(part_id) for part_id in sorted(e.conflicts))
+            QMessageBox.warning(self.window, "Parts Changed",
+                                f"Couldn't {verb} \"{self.text()}\": {len(e.conflicts)} of the parts were edited or "
+                                f"deleted by someone else in the meantime (ID {ids}). Nothing has been changed.")
+        except sqlite3.Error as e:
+            self.setObsolete(True)
+            QMessageBox.critical(self.window, "Error", f"An error occurred ({self.text()}): {str(e)}")
+        self.window.update_facets()
+
+
+class SetFieldCommand(BatchCommand):
+    """Set the type, footprint or stock of many parts.
+
+    values is {id: new value} and versions {id: version} the parts were loaded at. What the
+    database held before is read when the change is first made, for undo.
+    """
+
+    def __init__(self, window, column, values, versions, text):
+        super().__init__(window, text)
+        self.column = column
+        self.field = Part._fields[FIELD_FOR_COLUMN[column]]
+        self.name = f"batch {self.field}"
+        self.values = values
+        self.old = None
+        self.versions = versions
+
+    def apply(self):
+        repository = self.window.repository
+        if self.old is None:
+            with transaction(self.window.conn):
+                self.old = {part.id: getattr(part, self.field) for part in repository.get_many(self.values)}
+                self._write(self.values, expected=self.versions)
+        else:
+            self._write(self.values, previous=self.old)
+
+    def revert(self):
+        self._write(self.old, previous=self.values)
+
+    def _write(self, values, expected=None, previous=None):
+        versions = self.window.repository.set_many(self.field, values, expected, previous)
+        self.window.model.setFieldValues(self.column, values, versions)
+
+
+class DeleteCommand(BatchCommand):
+    """Delete many parts; undo puts them back with their ids, BOM links and stock reservations.
+
+    versions is {id: version} the parts were loaded at.
+    """
+
+    name = "batch delete"
+
+    def __init__(self, window, versions, text):
+        super().__init__(window, text)
+        self.versions = versions
+        self.parts = []
+        self.removed = []  # (row, record) taken out of the table
+
+    def apply(self):
+        repository, conn = self.window.repository, self.window.conn
+        ids = json.dumps(list(self.versions))
+        with transaction(conn):
+            self.parts = repository.get_many(self.versions)
+            self.hashes = repository.datasheet_hashes(self.versions)
+            self.bom_links = conn.execute(BOM_LINKS_SQL, (ids,)).fetchall()
+            self.reservations = conn.execute(RESERVATIONS_SQL, (ids,)).fetchall()
+            # Parts someone else already deleted are skipped, as when saving
+            repository.save(deleted=sorted(self.versions.items()))
+        self.removed = self.window.model.dropParts(self.versions)
+
+    def revert(self):
+        repository, conn = self.window.repository, self.window.conn
+        with transaction(conn):
+            repository.upsert_many(self.parts)
+            conn.executemany(RESTORE_HASH_SQL, [(digest, part_id) for part_id, digest in self.hashes.items() if digest])
+            conn.executemany(RESTORE_BOM_LINK_SQL, [(part_id, match, line_id) for line_id, part_id, match in self.bom_links])
+            conn.executemany(RESTORE_RESERVATION_SQL, [(project_id, part_id, quantity, project_id)
+                                                       for project_id, part_id, quantity in self.reservations])
+            self.versions = repository.versions(part.id for part in self.parts)
+        # Rows come back with what was saved (unsaved edits to them went with the delete)
+        parts = {part.id: part for part in self.parts}
+        removed = []
+        for row, record in self.removed:
+            if record[0] in parts:
+                record[:] = parts[record[0]]
+                record[VERSION] = self.versions[record[0]]
+                removed.append((row, record))
+        self.window.model.restoreParts(removed)
+        self.window.index_datasheets()  # Their datasheet text went with them
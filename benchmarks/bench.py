@@ -0,0 +1,260 @@
+"""Time loading, searching, saving, stock history and startup on synthetic inventories.
+
+    python benchmarks/bench.py                          # 1k, 10k, 100k and 1M parts
+    python benchmarks/bench.py --sizes 1000 10000 --repeat 10
+    python benchmarks/bench.py --compare benchmarks/results/baseline.json
+
+Each size runs in its own process, so the peak RSS reported is that size's alone. Generated databases
+are kept in benchmarks/data/ and reused by later runs. Results are written as JSON to
+benchmarks/results/ (or --output) and can be compared against an earlier run with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic import create_database
+
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# (label, term) pairs covering the common search shapes
+SEARCH_TERMS = (
+    ("part prefix", "lm3"),
+    ("cus id", "C0000500"),
+    ("description word", "schottky"),
+    ("common word", "resistor"),
+    ("two words", "ceramic x7r"),
+    ("no match", "zzzzzz"),
+)
+
+SAVE_BATCH = 100  # Rows each of inserted, updated and deleted in the save benchmark
+SCROLL_ROWS = 5000  # Rows paged into the Qt table by the scroll benchmark
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it can't be read."""
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)  # bytes on macOS, KB elsewhere
+
+
+def measure(func, repeat):
+    """Call func repeat times and return the median wall time in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 3)
+
+
+def bench_headless(db_path, count, repeat):
+    from database import connect
+    from ledger import StockLedger, days_ago
+    from parts_model import PAGE_SIZE
+    from repository import PartsRepository, Filters
+    from startup import open_and_load_first_page
+
+    results = {"startup first page": measure(lambda: open_and_load_first_page(db_path), repeat)}
+
+    conn = connect(db_path)
+    repository = PartsRepository(conn)
+    results["load first page"] = measure(lambda: repository.get_page(0, PAGE_SIZE), repeat)
+    results["load middle page"] = measure(lambda: repository.get_page(count // 2, PAGE_SIZE), repeat)
+    for label, term in SEARCH_TERMS:
+        results[f"search {label}"] = measure(lambda: repository.search(term, 0, PAGE_SIZE), repeat)
+
+    by_stock = repository.all_parts_query(order="stock", descending=True)
+    middle = repository.get_page(count // 2, 1, by_stock)
+    results["sorted page by stock"] = measure(lambda: repository.get_page(0, PAGE_SIZE, by_stock), repeat)
+    if middle:
+        results["sorted middle page (keyset)"] = measure(
+            lambda: repository.get_page(0, PAGE_SIZE, by_stock, after=middle[0]), repeat)
+    filtered = repository.all_parts_query(Filters(type="Resistor", footprint="SMD", min_stock=5), order="part")
+    results["filtered sorted page"] = measure(lambda: repository.get_page(0, PAGE_SIZE, filtered), repeat)
+    results["facet counts (cold)"] = measure(lambda: PartsRepository(conn).facet_counts(), repeat)
+    results["facet counts (cached)"] = measure(lambda: repository.facet_counts(Filters(type="IC")), repeat)
+    results["stock summary"] = measure(repository.stock_summary, repeat)
+    low_stock = repository.all_parts_query(Filters(low_stock=True))
+    results["below minimum page"] = measure(lambda: repository.get_page(0, PAGE_SIZE, low_stock), repeat)
+    results["reorder report"] = measure(lambda: sum(1 for _ in repository.reorder_items()), max(1, repeat // 2))
+
+    ledger = StockLedger(conn)
+    results["stock history of a part"] = measure(lambda: ledger.history(count // 2), repeat)
+    results["part stock as of 100 days ago"] = measure(lambda: ledger.stock_at(count // 2, days_ago(100)), repeat)
+    results["all stock as of 100 days ago"] = measure(lambda: ledger.stock_as_of(days_ago(100)), max(1, repeat // 2))
+    results["usage report 90 days"] = measure(lambda: sum(1 for _ in ledger.usage(days_ago(89))), max(1, repeat // 2))
+    conn.close()
+    return results
+
+
+def bench_save(db_path, repeat):
+    """Time saving SAVE_BATCH new, edited and deleted rows, and booking a batch of stock movements,
+    on a scratch copy of the database."""
+    from database import connect
+    from ledger import StockLedger
+    from repository import PartsRepository
+
+    with tempfile.TemporaryDirectory() as scratch:
+        copy = os.path.join(scratch, 'components.db')
+        shutil.copyfile(db_path, copy)
+        conn = connect(copy)
+        repository = PartsRepository(conn)
+        times = []
+        for _ in range(repeat):
+            page = repository.get_page(0, 2 * SAVE_BATCH)
+            inserted = [[None, None, "Resistor", f"NEW{i}", "bench", "SMD", i, "", 0, 0] for i in range(SAVE_BATCH)]
+            updated = [list(part._replace(stock=part.stock + 1)) for part in page[:SAVE_BATCH]]
+            deleted = [part.id for part in page[SAVE_BATCH:]]
+            start = time.perf_counter()
+            repository.save(inserted, updated, deleted)
+            times.append((time.perf_counter() - start) * 1000)
+        moves = [(part_id, -1, "used") for part_id in range(1, SAVE_BATCH * 10 + 1)]
+        record_ms = measure(lambda: StockLedger(conn).record(moves), repeat)
+        conn.close()
+    return {f"save {SAVE_BATCH}+{SAVE_BATCH}+{SAVE_BATCH}": round(statistics.median(times), 3),
+            f"record {SAVE_BATCH * 10} movements": record_ms}
+
+
+def bench_qt(db_path, repeat):
+    """Time filling and scrolling a real QTableView on the offscreen platform."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication, QTableView
+    from database import connect
+    from parts_model import PartsTableModel
+    from repository import PartsRepository
+
+    app = QApplication.instance() or QApplication([])
+    conn = connect(db_path)
+    repository = PartsRepository(conn)
+    model = PartsTableModel(repository)
+    view = QTableView()
+    view.resize(1600, 900)
+    view.setModel(model)
+    view.show()
+
+    def populate():
+        model.setQuery(repository.all_parts_query())
+        app.processEvents()
+
+    def scroll():
+        model.setQuery(repository.all_parts_query())
+        while model.rowCount() < SCROLL_ROWS and model.canFetchMore():
+            view.scrollToBottom()
+            app.processEvents()
+
+    def search():
+        model.setQuery(repository.search_query("lm3"))
+        app.processEvents()
+
+    results = {
+        "qt populate first page": measure(populate, repeat),
+        f"qt scroll to {SCROLL_ROWS} rows": measure(scroll, max(1, repeat // 2)),
+        "qt search": measure(search, repeat),
+    }
+    view.close()
+    conn.close()
+    return results
+
+
+def run_size(db_path, count, repeat):
+    """Benchmark one database; runs in the child process."""
+    results = {}
+    results.update(bench_headless(db_path, count, repeat))
+    results.update(bench_save(db_path, repeat))
+    results.update(bench_qt(db_path, repeat))
+    return {"parts": count, "ms": results, "peak rss mb": peak_rss_mb()}
+
+
+def database_for(count, regenerate=False):
+    """Return the path of the synthetic database with count parts and how long it took to generate (or None)."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f'parts-{count}.db')
+    if os.path.exists(path) and not regenerate:
+        return path, None
+    print(f"Generating {count} parts...", file=sys.stderr)
+    start = time.perf_counter()
+    create_database(path, count)
+    return path, round(time.perf_counter() - start, 2)
+
+
+def compare(current, baseline):
+    """Print each timing next to the baseline's, with the ratio."""
+    previous = {entry["parts"]: entry for entry in baseline["results"]}
+    for entry in current["results"]:
+        old = previous.get(entry["parts"])
+        if old is None:
+            continue
+        print(f"\n{entry['parts']} parts")
+        for name, ms in entry["ms"].items():
+            if name in old["ms"] and old["ms"][name]:
+                print(f"  {name:<32}{old['ms'][name]:10.2f} -> {ms:10.2f} ms  x{ms / old['ms'][name]:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LabParts performance benchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="inventory sizes to run")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per timing (the median is reported)")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', help="print the change against an earlier results file")
+    parser.add_argument('--regenerate', action='store_true', help="rebuild the synthetic databases")
+    parser.add_argument('--child', metavar='DB', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_size(args.child, args.sizes[0], args.repeat)))
+        return
+
+    results = []
+    for count in args.sizes:
+        db_path, generate_s = database_for(count, args.regenerate)
+        print(f"Benchmarking {count} parts...", file=sys.stderr)
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', db_path,
+                                '--sizes', str(count), '--repeat', str(args.repeat)],
+                               capture_output=True, text=True)
+        if child.returncode != 0:
+            sys.exit(f"Benchmark for {count} parts failed:\n{child.stderr}")
+        entry = json.loads(child.stdout.strip().splitlines()[-1])
+        entry["generate s"] = generate_s
+        results.append(entry)
+
+    report = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
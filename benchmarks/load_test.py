@@ -0,0 +1,196 @@
+"""Load test for the HTTP/JSON API (server.py).
+
+    python benchmarks/load_test.py                      # in-process server on a 10k part scratch database
+    python benchmarks/load_test.py --parts 100000 --clients 16 --seconds 30
+    python benchmarks/load_test.py --url http://127.0.0.1:8765 --no-writes
+
+Each client keeps one connection open and loops over a mix of requests: list and search pages, the
+next page of a list, single parts (half of them revalidated with If-None-Match) and, unless
+--no-writes, stock adjustments. Reports requests per second and p50/p95/p99 latency per request kind.
+Without --url the server runs in this process against a scratch copy of the synthetic database, so
+the writes don't touch anything real.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit, quote
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench import database_for, SEARCH_TERMS
+
+
+# (kind, weight) of the request mix
+WORKLOAD = (
+    ("list", 20),
+    ("next page", 10),
+    ("search", 20),
+    ("get", 25),
+    ("get if-none-match", 15),
+    ("stock", 10),
+)
+TYPES = ("Resistor", "Capacitor", "IC", "Diode", "Transistor")
+ORDERS = ("id", "part", "stock", "footprint")
+
+
+class Client:
+    """One keep-alive connection issuing requests and recording (kind, status, ms) for each."""
+
+    def __init__(self, url, part_count, writes, seed):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        self.part_count = part_count
+        self.rng = random.Random(seed)
+        kinds = [(kind, weight) for kind, weight in WORKLOAD if writes or kind != "stock"]
+        self.kinds, self.weights = zip(*kinds)
+        self.etags = {}  # part id -> ETag last seen
+        self.next_page = None  # path of the next page of the last list
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(int)
+        self.errors = []
+
+    def request(self, kind, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        self.conn.request(method, path, body, headers or {})
+        response = self.conn.getresponse()
+        data = response.read()
+        self.timings[kind].append((time.perf_counter() - start) * 1000)
+        self.statuses[response.status] += 1
+        if response.status >= 400:
+            self.errors.append(f"{method} {path}: {response.status} {data[:200]!r}")
+        return response, data
+
+    def list_path(self, params):
+        return "/parts?" + "&".join(f"{key}={quote(str(value))}" for key, value in params.items())
+
+    def step(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "next page" and not self.next_page:
+            kind = "list"
+        part_id = self.rng.randint(1, self.part_count)
+
+        if kind == "list":
+            params = {"order": self.rng.choice(ORDERS), "limit": 100}
+            if self.rng.random() < 0.5:
+                params["type"] = self.rng.choice(TYPES)
+            self.follow(self.list_path(params), kind, params)
+        elif kind == "next page":
+            path, params = self.next_page
+            self.follow(path, kind, params)
+        elif kind == "search":
+            params = {"q": self.rng.choice(SEARCH_TERMS)[1], "limit": 50}
+            self.follow("/search?" + "&".join(f"{key}={quote(str(value))}" for key, value in params.items()),
+                        kind, params)
+        elif kind in ("get", "get if-none-match"):
+            headers = {}
+            if kind == "get if-none-match" and self.etags:
+                part_id = self.rng.choice(list(self.etags))  # Revalidate a part seen before
+                headers["If-None-Match"] = self.etags[part_id]
+            response, _ = self.request(kind, "GET", f"/parts/{part_id}", headers=headers)
+            if response.getheader("ETag"):
+                self.etags[part_id] = response.getheader("ETag")
+        else:
+            body = json.dumps({"delta": self.rng.choice((-2, -1, 1, 5)), "note": "load test"})
+            self.request(kind, "POST", f"/parts/{part_id}/stock", body, {"Content-Type": "application/json"})
+
+    def follow(self, path, kind, params):
+        response, data = self.request(kind, "GET", path)
+        token = json.loads(data).get("next") if response.status == 200 else None
+        self.next_page = (self.list_path(dict(params, cursor=token)), params) if token else None
+
+    def run(self, deadline):
+        while time.perf_counter() < deadline:
+            self.step()
+        self.conn.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(clients, elapsed):
+    """Combine the clients' timings into a results dict."""
+    timings, statuses, errors = defaultdict(list), defaultdict(int), []
+    for client in clients:
+        errors += client.errors
+        for kind, values in client.timings.items():
+            timings[kind] += values
+        for status, count in client.statuses.items():
+            statuses[status] += count
+    total = sum(len(values) for values in timings.values())
+    return {
+        "requests": total,
+        "seconds": round(elapsed, 2),
+        "rps": round(total / elapsed, 1),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "ms": {kind: {"count": len(values),
+                      "p50": round(statistics.median(values), 2),
+                      "p95": round(percentile(values, 0.95), 2),
+                      "p99": round(percentile(values, 0.99), 2)}
+               for kind, values in sorted(timings.items())},
+        "errors": errors[:10],  # The first few, to see what went wrong
+    }
+
+
+def run_load(url, part_count, clients, seconds, writes=True):
+    """Run clients threads against url for seconds and return the report."""
+    workers = [Client(url, part_count, writes, seed) for seed in range(clients)]
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client.run, args=(deadline,)) for client in workers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return report(workers, time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the LabParts HTTP/JSON API")
+    parser.add_argument('--url', help="server to test (default: start one on a scratch synthetic database)")
+    parser.add_argument('--parts', type=int, default=10000, help="synthetic inventory size, or the highest "
+                                                                 "part id to ask for with --url")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent connections")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=4, help="read connections of the in-process server")
+    parser.add_argument('--no-writes', action='store_true', help="leave stock adjustments out of the mix")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        print(json.dumps(run_load(args.url, args.parts, args.clients, args.seconds, not args.no_writes), indent=2))
+        return
+
+    from server import ApiServer
+    db_path, _ = database_for(args.parts)
+    with tempfile.TemporaryDirectory() as scratch:
+        copy = os.path.join(scratch, 'components.db')
+        shutil.copyfile(db_path, copy)
+        server = ApiServer(('127.0.0.1', 0), copy, args.readers, quiet=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            print(f"Load testing {url} ({args.parts} parts, {args.clients} clients, {args.seconds}s)...",
+                  file=sys.stderr)
+            results = run_load(url, args.parts, args.clients, args.seconds, not args.no_writes)
+        finally:
+            server.shutdown()
+            server.server_close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
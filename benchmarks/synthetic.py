@@ -0,0 +1,170 @@
+"""Synthetic parts databases for the benchmarks.
+
+    python benchmarks/synthetic.py 100000 /tmp/parts-100k.db
+"""
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from database import connect, migrate, init_search_index
+
+
+DATA_FILE = os.path.join(BASE_DIR, 'data/data.json')
+
+# Relative frequency of each type in a typical lab drawer; types not listed get weight 1
+TYPE_WEIGHTS = {"Resistor": 30, "Capacitor": 25, "IC": 12, "Diode": 8, "Transistor": 8, "Inductor": 5, "MCU": 4}
+
+# Packages each type usually comes in, most common first; anything else is drawn from the full list
+TYPE_FOOTPRINTS = {
+    "Resistor": ("SMD", "DIP"),
+    "Capacitor": ("SMD", "DIP"),
+    "Inductor": ("SMD",),
+    "Diode": ("SMD", "DIP"),
+    "Transistor": ("SMD", "SOIC", "DIP"),
+    "IC": ("SOIC", "DIP", "TQFP", "QFP"),
+    "MCU": ("TQFP", "QFP", "BGA", "DIP"),
+}
+
+# Part number shapes and description vocabulary per type
+PART_PREFIXES = {
+    "Resistor": ("RC0603FR-07", "CRCW0805", "MFR-25FBF52-"),
+    "Capacitor": ("GRM188R71", "CL10A106", "EEE-FK1"),
+    "Inductor": ("SRN4018-", "LQH3NPN", "744043"),
+    "Diode": ("1N400", "BAT54", "SS3", "1N58"),
+    "Transistor": ("2N390", "BC54", "IRLZ", "AO340"),
+    "IC": ("LM3", "NE55", "TL07", "MCP60", "74HC"),
+    "MCU": ("ATMEGA328P-", "STM32F103", "PIC18F45", "ATTINY85-"),
+}
+DESCRIPTION_WORDS = {
+    "Resistor": ("thick film", "1%", "0.25W", "10k", "4.7k", "100R", "precision"),
+    "Capacitor": ("ceramic", "X7R", "electrolytic", "10uF", "100nF", "25V", "tantalum"),
+    "Inductor": ("power", "shielded", "10uH", "4.7uH", "ferrite"),
+    "Diode": ("schottky", "rectifier", "zener", "switching", "1A", "40V"),
+    "Transistor": ("NPN", "PNP", "MOSFET", "N-channel", "logic level", "small signal"),
+    "IC": ("op-amp", "regulator", "timer", "linear", "low noise", "rail-to-rail", "logic"),
+    "MCU": ("8-bit", "32-bit", "ARM Cortex-M3", "AVR", "flash", "USB"),
+}
+
+BATCH_SIZE = 10000
+
+MOVEMENTS_PER_PART = 2  # Usage movements generated per part, on average
+HISTORY_DAYS = 365  # Span of the generated stock history, ending now
+SNAPSHOT_DAYS = 90  # Days between the generated stock snapshots
+MOVEMENT_SQL = "INSERT INTO stock_movements (part_id, delta, balance, reason, created_at) VALUES (?, ?, ?, ?, ?)"
+
+
+def synthetic_parts(count, types, footprints, seed=0):
+    """Yield count components rows (cus_id, type, part, description, footprint, stock, datasheetpath,
+    min_stock, reorder_qty)."""
+    rng = random.Random(seed)
+    weights = [TYPE_WEIGHTS.get(part_type, 1) for part_type in types]
+    for n in range(count):
+        part_type = rng.choices(types, weights)[0]
+        common = [footprint for footprint in TYPE_FOOTPRINTS.get(part_type, ()) if footprint in footprints]
+        footprint = rng.choice(common) if common and rng.random() < 0.9 else rng.choice(footprints)
+        prefix = rng.choice(PART_PREFIXES.get(part_type, ("P",)))
+        part = f"{prefix}{rng.randrange(10, 999)}{rng.choice(('', 'T', 'N', 'A', '-TR'))}"
+        words = DESCRIPTION_WORDS.get(part_type, ("generic",))
+        description = " ".join(rng.sample(words, min(len(words), rng.randint(2, 4))))
+        cus_id = f"C{n + 1:07d}" if rng.random() < 0.8 else None  # Not every part has a CUS ID
+        stock = int(rng.paretovariate(1.2) * 5) if rng.random() < 0.9 else 0
+        datasheet = f"datasheets/{part}.pdf" if rng.random() < 0.3 else ""
+        min_stock = rng.choice((0, 0, 0, 5, 10, 20))  # Most parts have no reorder level
+        reorder_qty = rng.choice((0, 10, 25, 100)) if min_stock else 0
+        yield cus_id, part_type, part, description, footprint, stock, datasheet, min_stock, reorder_qty
+
+
+def _daily_usage(count, per_day, day, seed):
+    """The (part index, units used) draws for one day, seeded by day so they can be drawn twice."""
+    rng = random.Random(f"{seed}-{day}")
+    return [(rng.randrange(count), rng.randint(1, 5)) for _ in range(per_day)]
+
+
+def write_stock_history(conn, stocks, movements, seed=0):
+    """Write about movements usage movements over HISTORY_DAYS, ending at the stocks given for parts 1..n.
+
+    Each stocked part opens with its final stock plus everything it goes on to use, and snapshots are
+    written every SNAPSHOT_DAYS. Runs before the parts are inserted, so the ledger triggers find no
+    part to update and the stock inserted afterwards already equals the last balance.
+    """
+    count = len(stocks)
+    per_day = movements // HISTORY_DAYS if count else 0
+    balances = list(stocks)
+    for day in range(HISTORY_DAYS if per_day else 0):
+        for index, units in _daily_usage(count, per_day, day, seed):
+            if stocks[index]:
+                balances[index] += units
+
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=HISTORY_DAYS)
+
+    def stamp(day, n=0):
+        return (start + timedelta(days=day, seconds=n * 86400 // max(per_day, 1))).strftime('%Y-%m-%d %H:%M:%S')
+
+    conn.execute("BEGIN")
+    for first in range(0, count, BATCH_SIZE):
+        conn.executemany(MOVEMENT_SQL, [(index + 1, balance, balance, 'opening', stamp(0))
+                                        for index, balance in enumerate(balances[first:first + BATCH_SIZE], first)
+                                        if balance])
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements").fetchone()[0]
+    for day in range(HISTORY_DAYS if per_day else 0):
+        if day and day % SNAPSHOT_DAYS == 0:
+            snapshot_id = conn.execute("INSERT INTO stock_snapshots (taken_at, last_movement_id) VALUES (?, ?)",
+                                       (stamp(day), last_id)).lastrowid
+            conn.executemany("INSERT INTO stock_snapshot_parts (snapshot_id, part_id, stock) VALUES (?, ?, ?)",
+                             ((snapshot_id, index + 1, balance) for index, balance in enumerate(balances) if balance))
+        rows = []
+        for n, (index, units) in enumerate(_daily_usage(count, per_day, day, seed)):
+            if stocks[index]:
+                balances[index] -= units
+                rows.append((index + 1, -units, balances[index], 'used', stamp(day, n)))
+        conn.executemany(MOVEMENT_SQL, rows)
+        last_id += len(rows)
+    conn.commit()
+
+
+def create_database(path, count, data_file=DATA_FILE, seed=0, movements=None):
+    """Write a fresh, fully migrated and indexed database of count synthetic parts to path.
+
+    The parts come with a stock history of MOVEMENTS_PER_PART usage movements each on average, or
+    about the given number of movements in all.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    with open(data_file, 'r') as f:
+        data = json.load(f)
+    types, footprints = data["types"], data["footprints"]
+    conn = connect(path)
+    try:
+        migrate(conn)
+        stocks = [row[5] for row in synthetic_parts(count, types, footprints, seed)]
+        write_stock_history(conn, stocks, MOVEMENTS_PER_PART * count if movements is None else movements, seed)
+        rows = synthetic_parts(count, types, footprints, seed)
+        conn.execute("BEGIN")
+        while True:
+            batch = [row for _, row in zip(range(BATCH_SIZE), rows)]
+            if not batch:
+                break
+            conn.executemany('''INSERT INTO components (cus_id, type, part, description, footprint, stock, datasheetpath,
+                                                        min_stock, reorder_qty)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', batch)
+        conn.execute("DELETE FROM component_changes")  # Nobody needs to be told about the bulk load
+        conn.commit()
+        init_search_index(conn)  # Indexed once at the end rather than row by row through the triggers
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__.strip())
+    start = time.perf_counter()
+    create_database(sys.argv[2], int(sys.argv[1]))
+    print(f"Wrote {sys.argv[1]} parts to {sys.argv[2]} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,556 @@
+"""Headless LabParts commands, for jobs that don't need the GUI.
+
+    python cli.py import parts.csv --map part="Mfr Part #" --on-duplicate update
+    python cli.py export inventory.jsonl
+    python cli.py reindex
+    python cli.py reorder reorder.jsonl
+    python cli.py usage --days 90 usage.csv
+    python cli.py stock-as-of 2026-01-31 stock.csv
+    python cli.py history 42
+    python cli.py dedupe duplicates.csv --similar
+    python cli.py project import amp-board amp-board-bom.csv
+    python cli.py project check amp-board shortages.csv --boards 25
+    python cli.py project build amp-board --boards 25
+    python cli.py index-datasheets
+    python cli.py search-datasheets "input offset voltage"
+    python cli.py link-datasheets --dir datasheets/vendor links.csv --apply
+    python cli.py plan
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from backup import create_backup
+from database import (connect, init_db, rebuild_search_index, explain, has_search_index, duplicate_cus_ids,
+                      renumber_duplicate_cus_ids)
+from datasheet_index import DatasheetIndexer, MAX_WORKERS
+from datasheet_links import DatasheetLinker, link_report_rows, LINK_REPORT_FIELDS, MOVED, MAX_THREADS
+from dedupe import find_duplicates, merge_duplicates, report_rows, REPORT_FIELDS
+from importexport import (SKIP, UPDATE, import_parts, export_parts, export_reorder_report, export_usage_report,
+                          write_records, read_records, read_bom, is_supported)
+from ledger import StockLedger, days_ago, BALANCE_SQL, CUTOFF_SQL, USAGE_SQL
+from projects import (ProjectRepository, ShortageError, check_rows, CHECK_FIELDS, CHECK_SQL, CUS_ID_MATCH_SQL,
+                      PART_MATCH_SQL, CANDIDATES_SQL, UNMATCHED_SQL, SIMILAR)
+from repository import PartsRepository, ConflictError, Filters, Part, SORT_FIELDS, FACETS_SQL, VERSIONS_SQL
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_FILE = os.path.join(BASE_DIR, 'db/components.db')
+
+
+def parse_column_map(pairs):
+    """Turn ["field=Column Name", ...] into {field: "Column Name"}."""
+    column_map = {}
+    for pair in pairs or []:
+        field, sep, column = pair.partition('=')
+        if not sep:
+            raise ValueError(f"Expected FIELD=COLUMN, got '{pair}'")
+        column_map[field.strip()] = column.strip()
+    return column_map
+
+
+def cmd_import(conn, args):
+    if not is_supported(args.file):
+        sys.exit(f"Unsupported file type: {args.file}")
+    start = time.perf_counter()
+    records = read_records(args.file, parse_column_map(args.map))
+    progress = (lambda n: print(f"\r{n} rows", end='', file=sys.stderr)) if args.progress else None
+    added, updated, skipped = import_parts(conn, records, on_duplicate=args.on_duplicate,
+                                           batch_size=args.batch_size, progress=progress)
+    if progress:
+        print(file=sys.stderr)
+    print(f"Imported {args.file}: {added} added, {updated} updated, {skipped} skipped "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_export(conn, args):
+    if not is_supported(args.file):
+        sys.exit(f"Unsupported file type: {args.file}")
+    start = time.perf_counter()
+    count = export_parts(conn, args.file)
+    print(f"Exported {count} parts to {args.file} in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_reindex(conn, args):
+    rebuild_search_index(conn)
+    print("Search index rebuilt")
+
+
+def cmd_renumber_cus_ids(conn, args):
+    """Give the parts sharing a CUS ID with an older part their own, so the database can be upgraded."""
+    duplicates = duplicate_cus_ids(conn)
+    for cus_id, ids in duplicates.items():
+        print(f"  {cus_id:<16}parts {', '.join(map(str, ids))}")
+    if not args.apply:
+        print(f"{len(duplicates)} CUS IDs used by more than one part; --apply to renumber all but the oldest")
+        return
+    for part_id, old, new in renumber_duplicate_cus_ids(conn):
+        print(f"  part {part_id}: {old} -> {new}")
+
+
+def cmd_reorder(conn, args):
+    """Print the low-stock counts per type and footprint, and write the reorder report if a file is given."""
+    repository = PartsRepository(conn)
+    low = [summary for summary in repository.stock_summary() if summary.low]
+    for summary in low:
+        print(f"{summary.type or '-':<16}{summary.footprint or '-':<12}{summary.low:>6} of {summary.parts} parts low")
+    print(f"{sum(summary.low for summary in low)} parts below their minimum stock")
+    if args.file:
+        if not is_supported(args.file):
+            sys.exit(f"Unsupported file type: {args.file}")
+        count = export_reorder_report(repository, args.file)
+        print(f"Wrote {count} reorder lines to {args.file}")
+
+
+def cmd_usage(conn, args):
+    """Print the most used parts over the last N days, and write the full usage report if a file is given."""
+    ledger = StockLedger(conn)
+    since = days_ago(args.days - 1)
+    for record, _ in zip(ledger.usage(since), range(args.top)):
+        days_left = "-" if record["days_left"] is None else record["days_left"]
+        print(f"{record['part'] or '-':<24}{record['used']:>8} used{record['per_day']:>9}/day{days_left:>8} days left")
+    if args.file:
+        if not is_supported(args.file):
+            sys.exit(f"Unsupported file type: {args.file}")
+        count = export_usage_report(ledger, args.file, since)
+        print(f"Wrote usage of {count} parts since {since} to {args.file}")
+
+
+def cmd_stock_as_of(conn, args):
+    """Print the total stock on a date, and write each part's stock then and now if a file is given."""
+    start = time.perf_counter()
+    stock = StockLedger(conn).stock_as_of(args.date)
+    print(f"{sum(stock.values())} units of {len(stock)} parts in stock as of {args.date} "
+          f"({time.perf_counter() - start:.2f}s)")
+    if args.file:
+        if not is_supported(args.file):
+            sys.exit(f"Unsupported file type: {args.file}")
+        fields = ("id", "cus_id", "type", "part", "footprint", "stock_then", "stock_now")
+        rows = conn.execute("SELECT id, cus_id, type, part, footprint, COALESCE(stock, 0) FROM components ORDER BY id")
+        records = (dict(zip(fields, row[:5] + (stock.get(row[0], 0), row[5]))) for row in rows)
+        count = write_records(args.file, fields, records)
+        print(f"Wrote {count} parts to {args.file}")
+
+
+def cmd_history(conn, args):
+    for movement in StockLedger(conn).history(args.part_id, args.limit):
+        note = f"  {movement.note}" if movement.note else ""
+        print(f"{movement.created_at}  {movement.delta:+8}  -> {movement.balance:<8}{movement.reason}{note}")
+
+
+def cmd_snapshot(conn, args):
+    snapshot_id = StockLedger(conn).take_snapshot()
+    print(f"Stock snapshot {snapshot_id} taken")
+
+
+def cmd_dedupe(conn, args):
+    """Report duplicate parts, write the groups if a file is given, and merge them with --apply."""
+    start = time.perf_counter()
+    groups = find_duplicates(conn, similar=args.similar)
+    parts = sum(len(group.parts) for group in groups)
+    print(f"{len(groups)} groups of duplicates ({parts} parts would become {len(groups)}) "
+          f"found in {time.perf_counter() - start:.2f}s")
+    for group in groups[:args.top]:
+        ids = ", ".join(str(part.id) for part in group.parts)
+        print(f"{group.kind:<8}{group.key:<24}{group.merged.stock:>8} in stock  ids {ids}")
+    if args.file:
+        if not is_supported(args.file):
+            sys.exit(f"Unsupported file type: {args.file}")
+        count = write_records(args.file, REPORT_FIELDS, report_rows(groups))
+        print(f"Wrote {count} parts to {args.file}")
+    if args.apply and groups:
+        backup = create_backup(conn, os.path.dirname(os.path.abspath(args.db)))
+        print(f"Backed up to {backup}")
+        removed = merge_duplicates(conn, groups)
+        print(f"Merged {removed} duplicates")
+
+
+def find_project(projects, name):
+    project = projects.find(name)
+    if project is None:
+        sys.exit(f"No project called '{name}'")
+    return project
+
+
+def cmd_project_list(conn, args):
+    for project in ProjectRepository(conn).projects():
+        reserved = f", stock reserved for {project.reserved_boards}" if project.reserved_boards else ""
+        print(f"{project.id:>4}  {project.name:<24}{project.matched}/{project.lines} BOM lines matched{reserved}")
+
+
+def cmd_project_import(conn, args):
+    """Load a BOM into a project, creating the project if needed, and report the lines left unmatched."""
+    projects = ProjectRepository(conn)
+    start = time.perf_counter()
+    project_id, lines, matched = projects.import_bom(args.name, read_bom(args.file, parse_column_map(args.map)),
+                                                     args.description or "")
+    print(f"{lines} BOM lines, {matched} matched to parts in {time.perf_counter() - start:.2f}s")
+    print_unmatched(projects.unmatched(project_id))
+
+
+def cmd_project_match(conn, args):
+    projects = ProjectRepository(conn)
+    project = find_project(projects, args.name)
+    print(f"{projects.rematch(project.id)} more BOM lines matched")
+    print_unmatched(projects.unmatched(project.id))
+
+
+def cmd_project_confirm(conn, args):
+    """List the BOM lines only similar to a part, and with --apply use those parts for them."""
+    projects = ProjectRepository(conn)
+    project = find_project(projects, args.name)
+    similar = projects.similar(project.id)
+    for line, part in similar:
+        print(f"  line {line.line}: {line.part or line.cus_id or ''} -> {part} ({line.part_id})")
+    if not args.apply:
+        print(f"{len(similar)} BOM lines only similar to a part; --apply to use those parts")
+        return
+    print(f"{projects.confirm_similar(project.id)} similar parts confirmed")
+
+
+def print_unmatched(lines):
+    for line in lines:
+        state = "unconfirmed similar" if line.match == SIMILAR else "unmatched"
+        print(f"  {state} line {line.line}: {line.part or line.cus_id or ''}  {line.reference or ''}")
+
+
+def print_check(check, top=None):
+    short = [requirement for requirement in check.requirements if requirement.short]
+    print(f"{len(check.requirements)} parts needed for {check.boards} boards: {len(short)} short, "
+          f"{len(check.unmatched)} BOM lines unmatched; stock covers {check.buildable} boards")
+    for requirement in short[:top]:
+        print(f"  {requirement.part or requirement.cus_id or requirement.part_id:<24}needs {requirement.needed:>7}"
+              f"  available {requirement.available:>7}  short {requirement.short}")
+    print_unmatched(check.unmatched)
+
+
+def cmd_project_check(conn, args):
+    """Check whether a number of boards can be built from the stock not reserved for other projects."""
+    projects = ProjectRepository(conn)
+    project = find_project(projects, args.name)
+    check = projects.check(project.id, args.boards)
+    print_check(check, args.top)
+    if args.file:
+        if not is_supported(args.file):
+            sys.exit(f"Unsupported file type: {args.file}")
+        count = write_records(args.file, CHECK_FIELDS, check_rows(check))
+        print(f"Wrote {count} rows to {args.file}")
+
+
+def cmd_project_reserve(conn, args):
+    projects = ProjectRepository(conn)
+    project = find_project(projects, args.name)
+    check = projects.reserve(project.id, args.boards)
+    print(f"Reserved {sum(requirement.needed for requirement in check.requirements)} parts for {args.boards} "
+          f"x {project.name}")
+
+
+def cmd_project_release(conn, args):
+    projects = ProjectRepository(conn)
+    project = find_project(projects, args.name)
+    projects.release(project.id)
+    print(f"Released the stock reserved for {project.name}")
+
+
+def cmd_project_build(conn, args):
+    """Take the parts for a number of boards out of stock, all or nothing."""
+    projects = ProjectRepository(conn)
+    project = find_project(projects, args.name)
+    check = projects.build(project.id, args.boards, args.note)
+    print(f"Used {sum(requirement.needed for requirement in check.requirements)} parts "
+          f"({len(check.requirements)} part numbers) for {args.boards} x {project.name}")
+
+
+def cmd_project_delete(conn, args):
+    projects = ProjectRepository(conn)
+    project = find_project(projects, args.name)
+    projects.delete(project.id)
+    print(f"Deleted {project.name}")
+
+
+def cmd_index_datasheets(conn, args):
+    """Bring the full-text index of linked datasheets up to date, or rebuild it with --rebuild."""
+    indexer = DatasheetIndexer(conn, BASE_DIR, args.workers)
+    if not indexer.available():
+        sys.exit("Can't read text from PDFs: install PyMuPDF or poppler's pdftotext")
+    start = time.perf_counter()
+    progress = (lambda done, total: print(f"\r{done}/{total} files", end="", flush=True)) if args.progress else None
+    stats = (indexer.rebuild if args.rebuild else indexer.run)(progress)
+    if progress:
+        print()
+    print(f"{stats.indexed} indexed, {stats.unchanged} unchanged, {stats.removed} removed, "
+          f"{stats.missing} missing, {stats.failed} unreadable in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_search_datasheets(conn, args):
+    """Print the parts whose details or datasheet match, with the matching passage of the datasheet."""
+    repository = PartsRepository(conn)
+    query = repository.search_query(args.term, datasheets=True)
+    parts = repository.get_page(limit=args.limit, query=query)
+    snippets = repository.datasheet_snippets(query.datasheet_match, [part.id for part in parts]) \
+        if query.datasheet_match else {}
+    for part in parts:
+        print(f"{part.id:>6}  {part.part or '':<20}{part.description or ''}")
+        if part.id in snippets:
+            print(f"        {snippets[part.id]}")
+
+
+def cmd_link_datasheets(conn, args):
+    """Report dangling datasheet links and, given --dir, the datasheets found there; link them with --apply."""
+    if args.file and not is_supported(args.file):
+        sys.exit(f"Unsupported file type: {args.file}")
+    linker = DatasheetLinker(conn, BASE_DIR, args.workers)
+    start = time.perf_counter()
+    progress = (lambda stage, done, total: print(f"\r{stage}: {done}/{total}", end="", flush=True)) \
+        if args.progress else None
+    plan = linker.plan(args.dir, progress)
+    if progress:
+        print()
+    moved = sum(link.match == MOVED for link in plan.links)
+    if args.dir:
+        print(f"{plan.files} PDFs found: {len(plan.links) - moved} to link, {moved} moved, "
+              f"{len(plan.unmatched)} matching no part, {len(plan.ambiguous)} matching several")
+    print(f"{len(plan.dangling)} dangling links in {time.perf_counter() - start:.2f}s")
+    for link in plan.links[:args.top]:
+        print(f"{link.part_id:>6}  {link.match:<8}{link.part or '':<20}{link.path}")
+    for link in plan.dangling[:args.top]:
+        print(f"{link.part_id:>6}  missing {link.part or '':<20}{link.path}")
+    if args.file:
+        count = write_records(args.file, LINK_REPORT_FIELDS, link_report_rows(plan))
+        print(f"Wrote {count} rows to {args.file}")
+    if args.apply and plan.links:
+        linked = linker.apply(plan.links)
+        print(f"Linked {len(linked)} datasheets")
+
+
+# A row for pages to continue after
+PLAN_AFTER = Part._make([1, "X", "X", "X", "X", "X", 1, "X", 0, 0, 1])
+
+# Pages of the parts table, each with the index it is expected to use: (filters, order, continues
+# after a row, index)
+PAGE_INDEX_CHECKS = (
+    (Filters(type="X"), None, False, "idx_components_type (type=?)"),
+    (Filters(footprint="X"), None, False, "idx_components_footprint (footprint=?)"),
+    (Filters(low_stock=True), None, False, "idx_components_low_stock"),
+    (Filters(), "part", False, "idx_components_part"),
+    (Filters(), "type", True, "idx_components_type (type>?)"),
+    (Filters(), "stock", True, "idx_components_stock (stock>?)"),
+    (Filters(type="X"), "part", True, "idx_components_type_part (type=? AND part>?)"),
+    (Filters(footprint="X", min_stock=1, max_stock=10), "stock", False, "idx_components_footprint_stock (footprint=?)"),
+)
+
+
+def plan_checks(repository):
+    """Yield (sql, params, index) for the statements the app runs most, as it runs them, each with the
+    index it is expected to use."""
+    for filters, order, after, index in PAGE_INDEX_CHECKS:
+        yield repository.page_sql(repository.all_parts_query(filters, order), PLAN_AFTER if after else None) + (index,)
+    if has_search_index(repository.conn):
+        yield repository.page_sql(repository.search_query("lm358")) + ("components_fts VIRTUAL TABLE",)
+    yield FACETS_SQL, (), "idx_components_facets"
+    yield VERSIONS_SQL, ("[1]",), "INTEGER PRIMARY KEY"
+    yield CUS_ID_MATCH_SQL, ('["X"]',), "idx_components_cus_id"
+    yield PART_MATCH_SQL, ('["X"]',), "idx_components_part_nocase"
+    yield CANDIDATES_SQL, ("X%",), "idx_components_part_nocase"
+    yield UNMATCHED_SQL, (1,), "idx_bom_lines_project"
+    yield CHECK_SQL, {"project": 1, "boards": 1}, "idx_stock_reservations_part"
+    yield BALANCE_SQL, (1, 1), "idx_stock_movements_part"
+    yield CUTOFF_SQL, ("X",), "idx_stock_movements_created"
+    yield USAGE_SQL, ("X", "Y"), "idx_stock_usage_daily_day"
+
+
+# Filters the parts table's pages are checked with: each alone, the stock range with and without a
+# type, and all of them at once
+PLAN_FILTERS = (
+    Filters(),
+    Filters(type="X"),
+    Filters(footprint="X"),
+    Filters(type="X", footprint="X"),
+    Filters(min_stock=1),
+    Filters(max_stock=10),
+    Filters(min_stock=1, max_stock=10),
+    Filters(type="X", min_stock=1, max_stock=10),
+    Filters(has_datasheet=True),
+    Filters(has_datasheet=False),
+    Filters(low_stock=True),
+    Filters("X", "X", 1, 10, True, True),
+)
+
+
+def page_plan_checks(repository):
+    """Yield (description, sql, params) of the first and a later page of the parts table, as
+    PartsRepository.page_sql writes them, for every PLAN_FILTERS combination and sort order."""
+    for filters in PLAN_FILTERS:
+        narrowed = ", ".join(f"{field}={value}" for field, value in filters._asdict().items() if value is not None)
+        for order in (None,) + SORT_FIELDS:
+            for descending in (False, True):
+                query = repository.all_parts_query(filters, order, descending)
+                for row in (None, PLAN_AFTER):
+                    description = (f"page{' after a row' if row else ''} of parts ({narrowed or 'all'}) "
+                                   f"by {order or 'default'}{' desc' if descending else ''}")
+                    yield (description,) + repository.page_sql(query, row)
+
+
+def cmd_plan(conn, args):
+    """Print EXPLAIN QUERY PLAN for the common lookups and fail if one would scan the table, or if a
+    page of the parts table in any filter and sort order would have to be sorted."""
+    failures = 0
+    repository = PartsRepository(conn)
+    for sql, params, index in plan_checks(repository):
+        plan = explain(conn, sql, params)
+        ok = any(index in line for line in plan)
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {sql}\n       {'; '.join(plan)}")
+    pages = 0
+    for description, sql, params in page_plan_checks(repository):
+        plan = explain(conn, sql, params)
+        pages += 1
+        if any("TEMP B-TREE" in line for line in plan):
+            failures += 1
+            print(f"FAIL {description}\n       {sql}\n       {'; '.join(plan)}")
+    print(f"{'ok  ' if not failures else '    '} {pages} pages of the parts table checked for sorting")
+    if failures:
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="LabParts command line tools")
+    parser.add_argument('--db', default=DATABASE_FILE, help="database file (default: db/components.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('import', help="bulk import parts from CSV, JSON or JSON lines")
+    p.add_argument('file')
+    p.add_argument('--map', action='append', metavar='FIELD=COLUMN',
+                   help="read a components field from the named input column (repeatable)")
+    p.add_argument('--on-duplicate', choices=(SKIP, UPDATE), default=SKIP,
+                   help="what to do with rows whose CUS ID (or part number) already exists")
+    p.add_argument('--batch-size', type=int, default=1000)
+    p.add_argument('--progress', action='store_true', help="print a running row count")
+    p.set_defaults(func=cmd_import)
+
+    p = commands.add_parser('export', help="export all parts to CSV, JSON or JSON lines")
+    p.add_argument('file')
+    p.set_defaults(func=cmd_export)
+
+    p = commands.add_parser('reindex', help="rebuild the full-text search index")
+    p.set_defaults(func=cmd_reindex)
+
+    p = commands.add_parser('renumber-cus-ids', help="list CUS IDs used by more than one part, which stop the "
+                                                     "database being upgraded, and renumber them")
+    p.add_argument('--apply', action='store_true', help="append the part id to the CUS ID of all but the oldest part")
+    p.set_defaults(func=cmd_renumber_cus_ids, migrate=False)
+
+    p = commands.add_parser('reorder', help="summarise low stock and export the reorder report")
+    p.add_argument('file', nargs='?', help="write the report to this CSV, JSON or JSON lines file")
+    p.set_defaults(func=cmd_reorder)
+
+    p = commands.add_parser('usage', help="report how fast parts are being used")
+    p.add_argument('file', nargs='?', help="write the report to this CSV, JSON or JSON lines file")
+    p.add_argument('--days', type=int, default=90, help="period to report on, ending today (default: 90)")
+    p.add_argument('--top', type=int, default=20, help="parts to print (default: 20)")
+    p.set_defaults(func=cmd_usage)
+
+    p = commands.add_parser('stock-as-of', help="stock on hand at the end of a date (YYYY-MM-DD, UTC)")
+    p.add_argument('date')
+    p.add_argument('file', nargs='?', help="write each part's stock then and now to this file")
+    p.set_defaults(func=cmd_stock_as_of)
+
+    p = commands.add_parser('history', help="print a part's stock movements, newest first")
+    p.add_argument('part_id', type=int)
+    p.add_argument('--limit', type=int, default=50)
+    p.set_defaults(func=cmd_history)
+
+    p = commands.add_parser('snapshot', help="snapshot every part's stock now")
+    p.set_defaults(func=cmd_snapshot)
+
+    p = commands.add_parser('dedupe', help="find duplicate parts and optionally merge them")
+    p.add_argument('file', nargs='?', help="write the duplicate groups to this CSV, JSON or JSON lines file")
+    p.add_argument('--similar', action='store_true',
+                   help="also group part numbers that differ only in trailing ordering-code letters")
+    p.add_argument('--apply', action='store_true',
+                   help="merge each group into its oldest part, summing stock (takes a backup first)")
+    p.add_argument('--top', type=int, default=20, help="groups to print (default: 20)")
+    p.set_defaults(func=cmd_dedupe)
+
+    p = commands.add_parser('project', help="projects' bills of materials, build checks and stock reservations")
+    actions = p.add_subparsers(dest='action', required=True)
+    a = actions.add_parser('list', help="list the projects")
+    a.set_defaults(func=cmd_project_list)
+    a = actions.add_parser('import', help="load a BOM from CSV or JSON into a project (created if new)")
+    a.add_argument('name')
+    a.add_argument('file')
+    a.add_argument('--description')
+    a.add_argument('--map', action='append', metavar='FIELD=COLUMN',
+                   help="read a BOM field (reference, cus_id, part, description, footprint, quantity) "
+                        "from the named column (repeatable)")
+    a.set_defaults(func=cmd_project_import)
+    a = actions.add_parser('match', help="match the BOM lines that matched nothing again")
+    a.add_argument('name')
+    a.set_defaults(func=cmd_project_match)
+    a = actions.add_parser('confirm', help="list the BOM lines only similar to a part, and confirm those parts")
+    a.add_argument('name')
+    a.add_argument('--apply', action='store_true', help="use the similar parts for those lines")
+    a.set_defaults(func=cmd_project_confirm)
+    for action, func, text in (('check', cmd_project_check, "check whether a number of boards can be built"),
+                               ('reserve', cmd_project_reserve, "reserve the stock for a number of boards"),
+                               ('build', cmd_project_build, "take the parts for a number of boards out of stock")):
+        a = actions.add_parser(action, help=text)
+        a.add_argument('name')
+        a.add_argument('--boards', type=int, default=1)
+        a.set_defaults(func=func)
+    a = actions.choices['build']
+    a.add_argument('--note', help="note for the stock movements (default: built N x PROJECT)")
+    a = actions.choices['check']
+    a.add_argument('file', nargs='?', help="write the parts needed and shortages to this file")
+    a.add_argument('--top', type=int, default=20, help="shortages to print (default: 20)")
+    a = actions.add_parser('release', help="give back the stock reserved for a project")
+    a.add_argument('name')
+    a.set_defaults(func=cmd_project_release)
+    a = actions.add_parser('delete', help="delete a project and its BOM")
+    a.add_argument('name')
+    a.set_defaults(func=cmd_project_delete)
+
+    p = commands.add_parser('index-datasheets', help="index the text of linked datasheets for searching")
+    p.add_argument('--rebuild', action='store_true', help="forget the index and read every datasheet again")
+    p.add_argument('--workers', type=int, default=MAX_WORKERS, help=f"processes reading PDFs (default: {MAX_WORKERS})")
+    p.add_argument('--progress', action='store_true', help="print a running file count")
+    p.set_defaults(func=cmd_index_datasheets)
+
+    p = commands.add_parser('search-datasheets', help="search parts and the text of their datasheets")
+    p.add_argument('term')
+    p.add_argument('--limit', type=int, default=20)
+    p.set_defaults(func=cmd_search_datasheets)
+
+    p = commands.add_parser('link-datasheets', help="find dangling datasheet links and link the PDFs in a folder")
+    p.add_argument('file', nargs='?', help="write the links and dangling links to CSV, JSON or JSON lines")
+    p.add_argument('--dir', help="folder (searched with its subfolders) to link datasheets from")
+    p.add_argument('--apply', action='store_true', help="link the datasheets found")
+    p.add_argument('--top', type=int, default=20, help="links and dangling links to print")
+    p.add_argument('--workers', type=int, default=MAX_THREADS,
+                   help=f"threads listing folders and checking links (default: {MAX_THREADS})")
+    p.add_argument('--progress', action='store_true', help="print running counts")
+    p.set_defaults(func=cmd_link_datasheets)
+
+    p = commands.add_parser('plan', help="check that common lookups use their indexes and pages need no sort")
+    p.set_defaults(func=cmd_plan)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    conn = connect(args.db)
+    try:
+        if getattr(args, 'migrate', True):
+            init_db(conn)
+        args.func(conn, args)
+    except (ValueError, OSError, sqlite3.Error, ConflictError, ShortageError) as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,511 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+
+
+def connect(path, **kwargs):
+    """Open a connection to the parts database with the PRAGMAs every connection should use."""
+    conn = sqlite3.connect(path, **kwargs)
+    configure_connection(conn)
+    return conn
+
+
+def configure_connection(conn):
+    """Tune a freshly opened connection.
+
+    WAL lets the GUI, the search worker and the CLI read while another connection writes, and
+    synchronous=NORMAL is durable enough in WAL mode while avoiding an fsync per commit.
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -20000")  # ~20 MB page cache
+    conn.execute("PRAGMA mmap_size = 268435456")  # Map up to 256 MB of the file
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def _create_components(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS components (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cus_id TEXT,
+        type TEXT,
+        part TEXT,
+        description TEXT,
+        footprint TEXT,
+        stock INTEGER,
+        datasheetpath TEXT
+    )''')
+
+
+class DuplicateCusIdError(sqlite3.IntegrityError):
+    """The database can't be upgraded: some CUS IDs are used by more than one part.
+
+    duplicates maps each such CUS ID to the ids of its parts. Nothing has been changed; give the
+    parts their own CUS IDs (renumber_duplicate_cus_ids() can do it) and open the database again.
+    """
+
+    def __init__(self, duplicates):
+        self.duplicates = duplicates
+        listed = "; ".join(f"'{cus_id}': parts {', '.join(map(str, ids))}"
+                           for cus_id, ids in list(duplicates.items())[:10])
+        more = f" and {len(duplicates) - 10} more" if len(duplicates) > 10 else ""
+        super().__init__(f"{len(duplicates)} CUS IDs are used by more than one part ({listed}{more}). "
+                         "Give each part its own CUS ID, e.g. with `python cli.py renumber-cus-ids --apply`, "
+                         "then open the database again.")
+
+
+def duplicate_cus_ids(conn):
+    """Return {cus_id: [part ids]} for the CUS IDs more than one part has."""
+    rows = conn.execute('''SELECT cus_id, json_group_array(id) FROM components
+                            WHERE cus_id IS NOT NULL AND TRIM(cus_id) != ''
+                            GROUP BY cus_id HAVING COUNT(*) > 1 ORDER BY MIN(id)''')
+    return {cus_id: json.loads(ids) for cus_id, ids in rows}
+
+
+def renumber_duplicate_cus_ids(conn):
+    """Give every part sharing a CUS ID with an older part its own, by appending its id
+    ("C12" becomes "C12-57"). Returns [(id, old CUS ID, new CUS ID)] of the parts changed."""
+    with transaction(conn):
+        changes = [(part_id, cus_id, f"{cus_id}-{part_id}")
+                   for cus_id, ids in duplicate_cus_ids(conn).items() for part_id in ids[1:]]
+        conn.executemany("UPDATE components SET cus_id = ? WHERE id = ?",
+                         [(new, part_id) for part_id, _, new in changes])
+    return changes
+
+
+def _add_lookup_indexes(conn):
+    # cus_id becomes unique. Parts sharing a CUS ID are reported rather than renumbered behind the
+    # user's back. A blank ID is stored as NULL, as every write does (a unique index allows any
+    # number of NULLs): it was no CUS ID before and still is.
+    duplicates = duplicate_cus_ids(conn)
+    if duplicates:
+        raise DuplicateCusIdError(duplicates)
+    conn.execute("UPDATE components SET cus_id = NULL WHERE TRIM(cus_id) = ''")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_components_cus_id ON components (cus_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_components_part ON components (part)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_components_type ON components (type)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_components_footprint ON components (footprint)")
+
+
+def _add_datasheet_hash(conn):
+    # SHA-256 of the linked datasheet, the key of its copy in the local datasheet cache
+    conn.execute("ALTER TABLE components ADD COLUMN datasheet_hash TEXT")
+
+
+def _add_stock_index(conn):
+    # Stock range filters and sorting by stock
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_components_stock ON components (stock)")
+
+
+# A part is low on stock once it has a minimum and has fallen below it
+LOW_STOCK = "min_stock > 0 AND stock < min_stock"
+
+
+def _summary_change(row, sign):
+    """Statement adding (sign '') or removing (sign '-') one components row in stock_summary."""
+    return f'''INSERT INTO stock_summary (type, footprint, parts, units, low)
+               VALUES (COALESCE({row}.type, ''), COALESCE({row}.footprint, ''), {sign}1, {sign}COALESCE({row}.stock, 0),
+                       {sign}COALESCE({row}.min_stock > 0 AND {row}.stock < {row}.min_stock, 0))
+               ON CONFLICT (type, footprint) DO UPDATE SET
+                   parts = parts + excluded.parts, units = units + excluded.units, low = low + excluded.low;'''
+
+
+def _add_reorder_levels(conn):
+    # Per-part reorder threshold and quantity, a partial index over the parts below their threshold,
+    # and per type/footprint totals kept current by triggers so counts never rescan components
+    conn.execute("ALTER TABLE components ADD COLUMN min_stock INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE components ADD COLUMN reorder_qty INTEGER NOT NULL DEFAULT 0")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_components_low_stock ON components (id) WHERE {LOW_STOCK}")
+    conn.execute('''CREATE TABLE IF NOT EXISTS stock_summary (
+        type TEXT NOT NULL,
+        footprint TEXT NOT NULL,
+        parts INTEGER NOT NULL,
+        units INTEGER NOT NULL,
+        low INTEGER NOT NULL,
+        PRIMARY KEY (type, footprint)
+    ) WITHOUT ROWID''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_insert AFTER INSERT ON components BEGIN
+        {_summary_change('new', '')}
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_delete AFTER DELETE ON components BEGIN
+        {_summary_change('old', '-')}
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS stock_summary_update
+        AFTER UPDATE OF type, footprint, stock, min_stock ON components BEGIN
+        {_summary_change('old', '-')}
+        {_summary_change('new', '')}
+    END''')
+    rebuild_stock_summary(conn)
+
+
+# The balance after a part's latest movement, 0 if it has none
+_LEDGER_BALANCE = "COALESCE((SELECT balance FROM stock_movements WHERE part_id = new.id ORDER BY id DESC LIMIT 1), 0)"
+_OLD_LEDGER_BALANCE = _LEDGER_BALANCE.replace("new.id", "old.id")
+
+
+def _add_stock_movements(conn):
+    # Append-only stock ledger. Every movement records the part's balance after it, so the stock at any
+    # point in time is a single index lookup and components.stock is simply the latest balance.
+    conn.execute('''CREATE TABLE IF NOT EXISTS stock_movements (
+        id INTEGER PRIMARY KEY,
+        part_id INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        balance INTEGER NOT NULL,
+        reason TEXT NOT NULL DEFAULT 'adjustment',
+        note TEXT,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_part ON stock_movements (part_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_created ON stock_movements (created_at)")
+    # Units used and received per part per day, so usage over a period never reads the movements
+    conn.execute('''CREATE TABLE IF NOT EXISTS stock_usage_daily (
+        part_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        used INTEGER NOT NULL,
+        received INTEGER NOT NULL,
+        PRIMARY KEY (part_id, day)
+    ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_usage_daily_day ON stock_usage_daily (day)")
+    # Every part's stock as of a movement id, so "stock as of" replays only the movements since
+    conn.execute('''CREATE TABLE IF NOT EXISTS stock_snapshots (
+        id INTEGER PRIMARY KEY,
+        taken_at TEXT NOT NULL DEFAULT (datetime('now')),
+        last_movement_id INTEGER NOT NULL
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS stock_snapshot_parts (
+        snapshot_id INTEGER NOT NULL,
+        part_id INTEGER NOT NULL,
+        stock INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, part_id)
+    ) WITHOUT ROWID''')
+
+    # The stock already on hand becomes each part's opening balance
+    conn.execute('''INSERT INTO stock_movements (part_id, delta, balance, reason)
+                    SELECT id, stock, stock, 'opening' FROM components WHERE COALESCE(stock, 0) != 0''')
+
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS stock_movements_no_update BEFORE UPDATE ON stock_movements BEGIN
+        SELECT RAISE(ABORT, 'stock_movements is append-only');
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS stock_movements_no_delete BEFORE DELETE ON stock_movements BEGIN
+        SELECT RAISE(ABORT, 'stock_movements is append-only');
+    END''')
+    # A recorded movement sets the part's stock to its balance...
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS stock_movements_apply AFTER INSERT ON stock_movements BEGIN
+        UPDATE components SET stock = new.balance WHERE id = new.part_id AND stock IS NOT new.balance;
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS stock_usage_daily_insert AFTER INSERT ON stock_movements
+        WHEN new.reason != 'opening' BEGIN
+        INSERT INTO stock_usage_daily (part_id, day, used, received)
+        VALUES (new.part_id, date(new.created_at), MAX(-new.delta, 0), MAX(new.delta, 0))
+        ON CONFLICT (part_id, day) DO UPDATE SET used = used + excluded.used, received = received + excluded.received;
+    END''')
+    # ...and a stock written straight to components (table edits, imports) is recorded as a movement
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS components_stock_insert AFTER INSERT ON components
+        WHEN COALESCE(new.stock, 0) != {_LEDGER_BALANCE} BEGIN
+        INSERT INTO stock_movements (part_id, delta, balance, reason)
+        VALUES (new.id, COALESCE(new.stock, 0) - {_LEDGER_BALANCE}, COALESCE(new.stock, 0), 'opening');
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS components_stock_update AFTER UPDATE OF stock ON components
+        WHEN COALESCE(new.stock, 0) != {_LEDGER_BALANCE} BEGIN
+        INSERT INTO stock_movements (part_id, delta, balance)
+        VALUES (new.id, COALESCE(new.stock, 0) - {_LEDGER_BALANCE}, COALESCE(new.stock, 0));
+    END''')
+
+
+def _add_row_versions(conn):
+    # Every change to a part bumps its version (checked before saving edits, so one user's save can't
+    # silently undo another's) and is appended to component_changes, which other clients poll.
+    # updated_at has no default because ALTER TABLE only allows constant ones; the triggers set it.
+    conn.execute("ALTER TABLE components ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    conn.execute("ALTER TABLE components ADD COLUMN updated_at TEXT")
+    conn.execute("UPDATE components SET updated_at = datetime('now')")
+    conn.execute('''CREATE TABLE IF NOT EXISTS component_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        part_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS components_version_insert AFTER INSERT ON components BEGIN
+        UPDATE components SET updated_at = datetime('now') WHERE id = new.id;
+        INSERT INTO component_changes (part_id, version, op) VALUES (new.id, new.version, 'insert');
+    END''')
+    # Updating any of the part's own fields bumps the version, unless the update set it already.
+    # datasheet_hash is left out: it only records what is in the local datasheet cache.
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS components_version_update
+        AFTER UPDATE OF cus_id, type, part, description, footprint, stock, datasheetpath, min_stock, reorder_qty
+        ON components WHEN new.version IS old.version BEGIN
+        UPDATE components SET version = old.version + 1, updated_at = datetime('now') WHERE id = new.id;
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS components_changes_update AFTER UPDATE OF version ON components
+        WHEN new.version IS NOT old.version BEGIN
+        INSERT INTO component_changes (part_id, version, op) VALUES (new.id, new.version, 'update');
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS components_changes_delete AFTER DELETE ON components BEGIN
+        INSERT INTO component_changes (part_id, version, op) VALUES (old.id, old.version, 'delete');
+    END''')
+
+
+def _add_projects(conn):
+    # Projects, their bills of materials matched onto components, and the stock reserved for their
+    # next build. Foreign keys aren't enforced on these connections, so triggers do the cleaning up.
+    conn.execute('''CREATE TABLE IF NOT EXISTS projects (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT,
+        reserved_boards INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS bom_lines (
+        id INTEGER PRIMARY KEY,
+        project_id INTEGER NOT NULL REFERENCES projects (id),
+        line INTEGER NOT NULL,
+        reference TEXT,
+        cus_id TEXT,
+        part TEXT,
+        description TEXT,
+        footprint TEXT,
+        quantity INTEGER NOT NULL,
+        part_id INTEGER REFERENCES components (id),
+        match TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bom_lines_project ON bom_lines (project_id, line)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bom_lines_part ON bom_lines (part_id)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS stock_reservations (
+        project_id INTEGER NOT NULL,
+        part_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (project_id, part_id)
+    ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_reservations_part ON stock_reservations (part_id)")
+    # Case-insensitive part number lookups and prefix LIKEs when matching BOM lines onto parts
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_components_part_nocase ON components (part COLLATE NOCASE)")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS projects_delete AFTER DELETE ON projects BEGIN
+        DELETE FROM bom_lines WHERE project_id = old.id;
+        DELETE FROM stock_reservations WHERE project_id = old.id;
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS components_projects_delete AFTER DELETE ON components BEGIN
+        UPDATE bom_lines SET part_id = NULL, match = NULL WHERE part_id = old.id;
+        DELETE FROM stock_reservations WHERE part_id = old.id;
+    END''')
+
+
+def _add_stock_closing(conn):
+    # Deleting a part closes its ledger with a movement down to 0, so "stock as of" a later time
+    # doesn't count it. Restoring the part (undo) opens it again through components_stock_insert.
+    # Closings aren't usage, so the daily totals skip them as they skip openings.
+    conn.execute("DROP TRIGGER IF EXISTS stock_usage_daily_insert")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS stock_usage_daily_insert AFTER INSERT ON stock_movements
+        WHEN new.reason NOT IN ('opening', 'closing') BEGIN
+        INSERT INTO stock_usage_daily (part_id, day, used, received)
+        VALUES (new.part_id, date(new.created_at), MAX(-new.delta, 0), MAX(new.delta, 0))
+        ON CONFLICT (part_id, day) DO UPDATE SET used = used + excluded.used, received = received + excluded.received;
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS components_stock_delete AFTER DELETE ON components
+        WHEN {_OLD_LEDGER_BALANCE} != 0 BEGIN
+        INSERT INTO stock_movements (part_id, delta, balance, reason)
+        VALUES (old.id, -{_OLD_LEDGER_BALANCE}, 0, 'closing');
+    END''')
+    # Parts deleted before now are closed as of now
+    conn.execute('''INSERT INTO stock_movements (part_id, delta, balance, reason)
+                    SELECT part_id, -balance, 0, 'closing' FROM stock_movements
+                    WHERE id IN (SELECT MAX(id) FROM stock_movements GROUP BY part_id) AND balance != 0
+                      AND part_id NOT IN (SELECT id FROM components)
+                    ORDER BY part_id''')
+
+
+def _add_sort_indexes(conn):
+    # The type and footprint filters combined with a column sort: each index returns one type's (or
+    # footprint's) parts in the sort order, so a page is read in order instead of sorting the lot.
+    # The single-column indexes already cover the default (id) order, the rowid being their last column.
+    for column in ("type", "footprint"):
+        for sort in ("cus_id", "type", "part", "footprint", "stock"):
+            if sort != column:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_components_{column}_{sort} ON components ({column}, {sort})")
+
+
+def _add_facets_index(conn):
+    # Everything the filter dropdowns count (see repository.FACETS_SQL), so counting them reads this
+    # index in its order rather than the table
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_components_facets
+                    ON components (type, footprint, COALESCE(datasheetpath, '') != '')''')
+
+
+# Schema migrations, applied in order. MIGRATIONS[n] upgrades a database from user_version n to n + 1.
+# Append new steps to the end; never edit or reorder ones that have shipped.
+MIGRATIONS = [
+    _create_components,
+    _add_lookup_indexes,
+    _add_datasheet_hash,
+    _add_stock_index,
+    _add_reorder_levels,
+    _add_stock_movements,
+    _add_row_versions,
+    _add_projects,
+    _add_stock_closing,
+    _add_sort_indexes,
+    _add_facets_index,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the schema up to SCHEMA_VERSION, one transaction per step. Returns the steps applied."""
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise sqlite3.DatabaseError(f"Database schema version {version} is newer than this LabParts ({SCHEMA_VERSION})")
+    applied = 0
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            MIGRATIONS[target - 1](conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied += 1
+    return applied
+
+
+@contextmanager
+def transaction(conn):
+    """Run the enclosed writes in one IMMEDIATE transaction, committed on success."""
+    if conn.in_transaction:
+        yield  # Already inside one: the outer transaction commits
+        return
+    conn.execute("BEGIN IMMEDIATE")  # Take the write lock up front
+    try:
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def init_db(conn):
+    """Create or upgrade the schema, and the full-text search indexes, as needed."""
+    migrate(conn)
+    init_search_index(conn)
+    init_datasheet_index(conn)
+    conn.commit()
+
+
+def rebuild_stock_summary(conn):
+    """Recount stock_summary from components (the triggers keep it current after that)."""
+    conn.execute("DELETE FROM stock_summary")
+    conn.execute(f'''INSERT INTO stock_summary (type, footprint, parts, units, low)
+                    SELECT COALESCE(type, ''), COALESCE(footprint, ''), COUNT(*), COALESCE(SUM(stock), 0),
+                           COALESCE(SUM({LOW_STOCK}), 0)
+                    FROM components GROUP BY 1, 2''')
+
+
+def explain(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement."""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def has_search_index(conn):
+    """Return True if the components_fts index exists in this database."""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'components_fts'").fetchone()
+    return row is not None
+
+
+def init_search_index(conn):
+    """Create the FTS5 index over components and the triggers that keep it in sync.
+
+    The index is an external-content table, so it stores only the tokens, not a second copy of the
+    text. A database that predates the index is indexed once when the table is first created.
+    Returns False if this SQLite build has no FTS5 support, in which case search falls back to LIKE.
+    """
+    if has_search_index(conn):
+        return True
+    try:
+        conn.execute('''CREATE VIRTUAL TABLE components_fts USING fts5(
+            cus_id, type, part, description,
+            content='components', content_rowid='id',
+            prefix='2 3'
+        )''')
+    except sqlite3.OperationalError:
+        return False  # SQLite compiled without FTS5
+
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS components_fts_insert AFTER INSERT ON components BEGIN
+            INSERT INTO components_fts (rowid, cus_id, type, part, description)
+            VALUES (new.id, new.cus_id, new.type, new.part, new.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS components_fts_delete AFTER DELETE ON components BEGIN
+            INSERT INTO components_fts (components_fts, rowid, cus_id, type, part, description)
+            VALUES ('delete', old.id, old.cus_id, old.type, old.part, old.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS components_fts_update AFTER UPDATE OF cus_id, type, part, description ON components BEGIN
+            INSERT INTO components_fts (components_fts, rowid, cus_id, type, part, description)
+            VALUES ('delete', old.id, old.cus_id, old.type, old.part, old.description);
+            INSERT INTO components_fts (rowid, cus_id, type, part, description)
+            VALUES (new.id, new.cus_id, new.type, new.part, new.description);
+        END;
+    ''')
+    rebuild_search_index(conn)
+    return True
+
+
+def has_datasheet_index(conn):
+    """Return True if the datasheet_fts index exists in this database."""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'datasheet_fts'").fetchone()
+    return row is not None
+
+
+def init_datasheet_index(conn):
+    """Create the full-text index of datasheet contents, filled by datasheet_index.DatasheetIndexer.
+
+    datasheet_fts holds the text extracted from each part's datasheet, with the part id as rowid.
+    datasheet_index records which file (path, modification time, size, hash) each part's text came
+    from, so unchanged files are not read again. Returns False without FTS5, like init_search_index.
+    """
+    if has_datasheet_index(conn):
+        return True
+    try:
+        conn.execute("CREATE VIRTUAL TABLE datasheet_fts USING fts5(text, prefix='3')")
+    except sqlite3.OperationalError:
+        return False
+
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS datasheet_index (
+            part_id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            mtime REAL,
+            size INTEGER,
+            hash TEXT,
+            error TEXT,
+            indexed_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        CREATE TRIGGER IF NOT EXISTS datasheet_index_delete AFTER DELETE ON components BEGIN
+            DELETE FROM datasheet_fts WHERE rowid = old.id;
+            DELETE FROM datasheet_index WHERE part_id = old.id;
+        END;
+    ''')
+    return True
+
+
+def rebuild_search_index(conn):
+    """Re-index every row of components from scratch."""
+    conn.execute("INSERT INTO components_fts (components_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO components_fts (components_fts) VALUES ('optimize')")
+    conn.commit()
+
+
+def to_match_query(search_term):
+    """Turn free text into an FTS5 MATCH expression that prefix-matches every word.
+
+    "lm317 to-220" becomes '"lm317"* "to-220"*'. Each word is quoted so that punctuation common
+    in part numbers is never parsed as FTS syntax. Returns None if the term has nothing to match on.
+    """
+    words = []
+    for word in search_term.split():
+        if any(ch.isalnum() for ch in word):
+            words.append('"' + word.replace('"', '""') + '"*')
+    return " ".join(words) if words else None
+
@@ -0,0 +1,158 @@
+"""Full-text index of the datasheets linked to parts, so searches can match what is inside the PDFs.
+
+DatasheetIndexer extracts the text of each linked PDF on a process pool (extraction is CPU-bound
+and would hold the GIL) and stores it in datasheet_fts under the part's id. datasheet_index
+remembers the path, modification time, size and hash each part's text came from, so a pass only
+reads files that changed: a file with the same mtime and size is skipped, and one that was touched
+but still has the same hash is not extracted again. No Qt here; search.DatasheetIndexWorker runs
+it for the GUI and `python cli.py index-datasheets` from the command line.
+"""
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from database import transaction, has_datasheet_index
+from datasheets import file_hash, extract_text, can_extract_text
+
+
+# Outcome of one indexing pass, in parts: text stored, files unchanged, texts dropped because the
+# part no longer has a datasheet, datasheets that couldn't be found, and ones that couldn't be read
+IndexStats = namedtuple('IndexStats', 'indexed unchanged removed missing failed')
+
+BATCH_SIZE = 20  # Files written per transaction, so the GUI never waits long for the write lock
+MAX_WORKERS = 4
+
+# Each linked part with what its indexed text came from (NULLs if it has none yet)
+PLAN_SQL = '''SELECT c.id, c.datasheetpath, i.path, i.mtime, i.size, i.hash FROM components c
+              LEFT JOIN datasheet_index i ON i.part_id = c.id
+              WHERE COALESCE(c.datasheetpath, '') != \'\''''
+# Indexed parts whose datasheet has been unlinked
+UNLINKED_SQL = '''SELECT i.part_id FROM datasheet_index i JOIN components c ON c.id = i.part_id
+                  WHERE COALESCE(c.datasheetpath, '') = \'\''''
+# Writes skip parts deleted while their file was being read
+STORE_TEXT_SQL = "INSERT INTO datasheet_fts (rowid, text) SELECT ?, ? WHERE EXISTS (SELECT 1 FROM components WHERE id = ?)"
+STORE_STATE_SQL = '''INSERT INTO datasheet_index (part_id, path, mtime, size, hash, error)
+                     SELECT ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM components WHERE id = ?)
+                     ON CONFLICT (part_id) DO UPDATE SET path = excluded.path, mtime = excluded.mtime,
+                         size = excluded.size, hash = excluded.hash, error = excluded.error,
+                         indexed_at = datetime('now')'''
+
+
+def read_datasheet(path, known_digest=None):
+    """Return (digest, text) for a PDF; text is None if the digest is known_digest. Runs in a pool process."""
+    digest = file_hash(path)
+    if digest == known_digest:
+        return digest, None
+    return digest, extract_text(path) or ""
+
+
+class DatasheetIndexer:
+    """Brings datasheet_fts up to date with the datasheets linked to parts, on one SQLite connection.
+
+    Relative datasheet paths are resolved against base_dir, as the GUI does.
+    """
+
+    def __init__(self, conn, base_dir, max_workers=MAX_WORKERS):
+        self.conn = conn
+        self.base_dir = base_dir
+        self.max_workers = max_workers
+
+    def available(self):
+        """Return True if the index exists and there is a way to read text out of PDFs."""
+        return has_datasheet_index(self.conn) and can_extract_text()
+
+    def plan(self):
+        """Work out what needs reading.
+
+        Returns (files, unchanged, missing): files maps each absolute path to read to
+        (mtime, size, digest it was last indexed at or None, [(part id, stored path)]).
+        """
+        files, unchanged, missing = {}, 0, 0
+        for part_id, datasheetpath, path, mtime, size, digest in self.conn.execute(PLAN_SQL).fetchall():
+            source = os.path.abspath(os.path.join(self.base_dir, datasheetpath))
+            try:
+                stat = os.stat(source)
+            except OSError:
+                missing += 1  # Offline share or moved file; any text already indexed is kept
+                continue
+            if path == datasheetpath and (mtime, size) == (stat.st_mtime, stat.st_size):
+                unchanged += 1
+                continue
+            digests, parts = files.setdefault(source, (stat.st_mtime, stat.st_size, [], []))[2:]
+            digests.append(digest if path == datasheetpath else None)
+            parts.append((part_id, datasheetpath))
+        # A file's text is only skipped when it is unchanged for every part linking to it
+        files = {source: (mtime, size, digests[0] if len(set(digests)) == 1 else None, parts)
+                 for source, (mtime, size, digests, parts) in files.items()}
+        return files, unchanged, missing
+
+    def run(self, progress=None, should_stop=None):
+        """Index every new or changed datasheet and drop the text of unlinked ones. Returns IndexStats.
+
+        progress(done, total) is called as files finish; should_stop() is polled between files and
+        ends the pass early when it returns True (what was written so far is kept).
+        """
+        if not self.available():
+            return IndexStats(0, 0, 0, 0, 0)
+        removed = self._remove_unlinked()
+        files, unchanged, missing = self.plan()
+        indexed = failed = 0
+        if files:
+            pending = []
+            # Spawned rather than forked: the GUI calls this from a thread, and forking a threaded process is unsafe
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(min(self.max_workers, len(files)), mp_context=context) as pool:
+                futures = {pool.submit(read_datasheet, source, entry[2]): source for source, entry in files.items()}
+                for done, future in enumerate(as_completed(futures), 1):
+                    mtime, size, _, parts = files[futures[future]]
+                    try:
+                        digest, text = future.result()
+                        error = None
+                    except Exception as e:
+                        digest, text, error = None, None, str(e) or type(e).__name__
+                        failed += len(parts)
+                    else:
+                        if text is None:
+                            unchanged += len(parts)  # Touched, but the same file
+                        else:
+                            indexed += len(parts)
+                    pending += [(part_id, path, mtime, size, digest, text, error) for part_id, path in parts]
+                    if len(pending) >= BATCH_SIZE:
+                        self._store(pending)
+                        pending = []
+                    if progress:
+                        progress(done, len(files))
+                    if should_stop and should_stop():
+                        for other in futures:
+                            other.cancel()
+                        break
+            self._store(pending)
+        return IndexStats(indexed, unchanged, removed, missing, failed)
+
+    def _store(self, results):
+        """Write (part id, path, mtime, size, digest, text, error) results; text None keeps the stored text."""
+        if not results:
+            return
+        with transaction(self.conn):
+            for part_id, path, mtime, size, digest, text, error in results:
+                if text is not None or error is not None:
+                    self.conn.execute("DELETE FROM datasheet_fts WHERE rowid = ?", (part_id,))
+                if text:
+                    self.conn.execute(STORE_TEXT_SQL, (part_id, text, part_id))
+                # A file that failed is remembered by mtime and size too, so it is retried once it changes
+                self.conn.execute(STORE_STATE_SQL, (part_id, path, mtime, size, digest, error, part_id))
+
+    def _remove_unlinked(self):
+        with transaction(self.conn):
+            part_ids = [(part_id,) for part_id, in self.conn.execute(UNLINKED_SQL).fetchall()]
+            self.conn.executemany("DELETE FROM datasheet_fts WHERE rowid = ?", part_ids)
+            self.conn.executemany("DELETE FROM datasheet_index WHERE part_id = ?", part_ids)
+        return len(part_ids)
+
+    def rebuild(self, progress=None, should_stop=None):
+        """Forget everything indexed and read every datasheet again."""
+        with transaction(self.conn):
+            self.conn.execute("DELETE FROM datasheet_fts")
+            self.conn.execute("DELETE FROM datasheet_index")
+        return self.run(progress, should_stop)
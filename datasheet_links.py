@@ -0,0 +1,272 @@
+"""Linking datasheets to parts in bulk, and finding links whose file has gone.
+
+DatasheetLinker walks a directory tree of PDFs and matches each file to parts by the part number
+in its name: "LM358.pdf", "lm358dr_datasheet.pdf" and "TI-LM358-rev3.pdf" all match part LM358.
+Every part number is looked up in a map built once from the parts (the same normalized forms
+dedupe uses), so a tree of any size is matched in one pass. Directories are listed and existing
+links checked on a thread pool, as both mostly wait on the filesystem (often a network share).
+
+A plan is worked out first and nothing is written until apply(), which links every matched file
+in one transaction:
+
+- parts without a datasheet are linked to the file matching their part number (failing that, to
+  one matching it once the trailing ordering-code letters are dropped, as "LM358N" for "LM358P");
+- parts whose datasheet is missing are linked to a file of the same name found under the
+  directory (moved), or else to one matching their part number;
+- links that are missing and weren't found again are reported as dangling.
+
+Without a directory, plan() only checks the existing links. No Qt here; search.DatasheetLinkWorker
+runs it for the GUI and `python cli.py link-datasheets` from the command line.
+"""
+import os
+import re
+from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from database import transaction
+from dedupe import normalize_part, base_part
+
+
+# A datasheet to link to a part: the part's current path (None if it has none) and the new one,
+# relative to the app if possible, and how the file was matched
+Link = namedtuple('Link', 'part_id part old_path path match')
+# A part whose linked datasheet can't be found
+DanglingLink = namedtuple('DanglingLink', 'part_id part path')
+# What a pass found: the links to make, links still dangling, how many PDFs were found, the ones
+# that matched no part, ones whose name matched several part numbers equally well (path, keys),
+# and whether it was stopped before the end (the rest is then incomplete)
+LinkPlan = namedtuple('LinkPlan', 'links dangling files unmatched ambiguous cancelled')
+
+EXACT, SIMILAR, MOVED = "part", "similar", "moved"
+DANGLING = "dangling"
+
+# Columns of the link report, one row per link to make or dangling link
+LINK_REPORT_FIELDS = ("id", "part", "status", "old_path", "path")
+
+MAX_THREADS = 8
+CHECK_CHUNK = 256  # Linked paths checked per task
+MAX_TOKENS = 3  # Longest run of name pieces tried as one part number ("TPS", "7A33", "01")
+
+LINKED_SQL = '''SELECT id, part, datasheetpath FROM components
+                WHERE COALESCE(datasheetpath, '') != \'\''''
+UNLINKED_SQL = '''SELECT id, part FROM components
+                  WHERE COALESCE(datasheetpath, '') = '' AND COALESCE(part, '') != \'\''''
+# Only links the part still has: one linked by hand since the plan was made is left alone
+LINK_SQL = '''UPDATE components SET datasheetpath = ?, datasheet_hash = NULL
+              WHERE id = ? AND COALESCE(datasheetpath, '') = ?'''
+
+_PIECES = re.compile(r"[^0-9A-Za-z]+")
+
+
+def name_keys(file_name):
+    """Return the normalized part numbers a file name could stand for, longest first.
+
+    The name is split at punctuation and every run of up to MAX_TOKENS pieces is tried, so part
+    numbers are found among words such as "datasheet" or a vendor prefix. Keys without a digit
+    are left out: no part number is all letters, but plenty of words are.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    pieces = [piece for piece in _PIECES.split(stem) if piece]
+    keys = {normalize_part(stem)}
+    for start in range(len(pieces)):
+        for end in range(start + 1, min(start + MAX_TOKENS, len(pieces)) + 1):
+            keys.add(normalize_part("".join(pieces[start:end])))
+    return sorted((key for key in keys if len(key) >= 3 and any(c.isdigit() for c in key)), key=len, reverse=True)
+
+
+def relative_path(path, base_dir):
+    """Return path relative to base_dir, as datasheets are stored, or absolute if on another drive."""
+    try:
+        return os.path.relpath(path, base_dir)
+    except ValueError:
+        return os.path.abspath(path)
+
+
+class PartIndex:
+    """Part ids by normalized part number, and by that number without its ordering-code letters."""
+
+    def __init__(self, parts):
+        """parts is an iterable of (id, part number)."""
+        self.exact = defaultdict(list)
+        self.similar = defaultdict(list)
+        for part_id, part in parts:
+            key = normalize_part(part)
+            if key:
+                self.exact[key].append(part_id)
+                base = base_part(key)
+                if base:
+                    self.similar[base].append(part_id)
+
+    def match(self, file_name):
+        """Return (kind, key, part ids) for a file name, (None, keys, []) if several part numbers
+        match it equally well, or None if nothing does.
+
+        The longest part number found wins; one matching only without ordering-code letters is
+        used when no part number matches outright.
+        """
+        keys = name_keys(file_name)
+        for kind, index, candidates in ((EXACT, self.exact, keys),
+                                        (SIMILAR, self.similar, [base_part(key) for key in keys])):
+            found = [key for key in dict.fromkeys(candidates) if key and key in index]
+            if found:
+                longest = [key for key in found if len(key) == len(found[0])]
+                if len(longest) > 1:
+                    return None, longest, []
+                return kind, found[0], index[found[0]]
+        return None
+
+
+def list_directory(path):
+    """Return (PDF files, subdirectories) directly in a directory; runs on the pool."""
+    files, directories = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.name.lower().endswith(".pdf") and entry.is_file():
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        pass  # Unreadable directories are skipped, as if empty
+    return files, directories
+
+
+def missing_paths(paths):
+    """Return those of the given absolute paths that don't exist; runs on the pool."""
+    return [path for path in paths if not os.path.exists(path)]
+
+
+class DatasheetLinker:
+    """Plans and applies bulk datasheet links on one SQLite connection.
+
+    Relative datasheet paths are resolved against base_dir, as the GUI does. progress(stage, done,
+    total) is called as directories are listed and links checked (the number of directories grows
+    as they are found); should_stop() is polled between them and ends the pass early.
+    """
+
+    def __init__(self, conn, base_dir, max_workers=MAX_THREADS):
+        self.conn = conn
+        self.base_dir = base_dir
+        self.max_workers = max_workers
+
+    def plan(self, root=None, progress=None, should_stop=None):
+        """Work out the links to make from the PDFs under root, and which existing links are dangling.
+
+        Returns a LinkPlan; with root None only the existing links are checked.
+        """
+        should_stop = should_stop or (lambda: False)
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            dangling = self._check_links(pool, progress, should_stop)
+            files = self._scan(pool, root, progress, should_stop) if root and not should_stop() else []
+        cancelled = should_stop()
+        if not files or cancelled:
+            return LinkPlan([], dangling, len(files), [], [], cancelled)
+
+        unlinked = self.conn.execute(UNLINKED_SQL).fetchall()
+        index = PartIndex(unlinked)
+        index_dangling = PartIndex((link.part_id, link.part) for link in dangling if link.part)
+        by_name = defaultdict(list)
+        chosen = {}  # part id -> (rank, path, match)
+        unmatched, ambiguous = [], []
+        for path in sorted(files, key=lambda path: (path.count(os.sep), path)):  # Shallowest first
+            by_name[os.path.basename(path).lower()].append(path)
+            matched = False
+            for part_index in (index, index_dangling):
+                found = part_index.match(path)
+                if found is None:
+                    continue
+                kind, key, part_ids = found
+                if kind is None:
+                    ambiguous.append((path, key))
+                    matched = True
+                    break
+                matched = True
+                rank = (kind != EXACT, -len(key))
+                for part_id in part_ids:
+                    if part_id not in chosen or rank < chosen[part_id][0]:
+                        chosen[part_id] = (rank, path, kind)
+            if not matched:
+                unmatched.append(path)
+
+        links, still_dangling = [], []
+        for link in dangling:
+            # A file of the same name under root is taken to be the one that was moved
+            same_name = by_name.get(os.path.basename(link.path).lower(), [])
+            if len(same_name) == 1:
+                chosen[link.part_id] = (None, same_name[0], MOVED)
+            if link.part_id in chosen:
+                _, path, kind = chosen.pop(link.part_id)
+                links.append(Link(link.part_id, link.part, link.path, relative_path(path, self.base_dir), kind))
+            else:
+                still_dangling.append(link)
+        parts = dict(unlinked)
+        for part_id, (_, path, kind) in chosen.items():
+            links.append(Link(part_id, parts.get(part_id), None, relative_path(path, self.base_dir), kind))
+        links.sort(key=lambda link: link.part_id)
+        return LinkPlan(links, still_dangling, len(files), unmatched, ambiguous, False)
+
+    def _check_links(self, pool, progress, should_stop):
+        linked = self.conn.execute(LINKED_SQL).fetchall()
+        parts_by_path = defaultdict(list)
+        for part_id, part, datasheetpath in linked:
+            parts_by_path[os.path.abspath(os.path.join(self.base_dir, datasheetpath))].append(
+                (part_id, part, datasheetpath))
+        paths = list(parts_by_path)
+        chunks = [paths[i:i + CHECK_CHUNK] for i in range(0, len(paths), CHECK_CHUNK)]
+        futures = [pool.submit(missing_paths, chunk) for chunk in chunks]
+        dangling = []
+        for done, future in enumerate(futures, 1):
+            if should_stop():
+                for other in futures:
+                    other.cancel()
+                break
+            for path in future.result():
+                dangling += [DanglingLink(*part) for part in parts_by_path[path]]
+            if progress:
+                progress("Checking links", done, len(futures))
+        return sorted(dangling)
+
+    def _scan(self, pool, root, progress, should_stop):
+        """Return every PDF under root, listing directories in parallel as they are found."""
+        files = []
+        pending = {pool.submit(list_directory, root)}
+        listed, found = 0, 1
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if should_stop():
+                for future in pending:
+                    future.cancel()
+                break
+            for future in finished:
+                directory_files, directories = future.result()
+                files += directory_files
+                pending |= {pool.submit(list_directory, directory) for directory in directories}
+                listed += 1
+                found += len(directories)
+            if progress:
+                progress("Scanning folders", listed, found)
+        return files
+
+    def apply(self, links):
+        """Make the given links in one transaction. Returns the ids of the parts that were linked.
+
+        A part whose datasheet changed since the plan was made is skipped.
+        """
+        linked = []
+        with transaction(self.conn):
+            for link in links:
+                if self.conn.execute(LINK_SQL, (link.path, link.part_id, link.old_path or "")).rowcount:
+                    linked.append(link.part_id)
+        return linked
+
+
+def link_report_rows(plan):
+    """Yield one report row per link to make and per link left dangling."""
+    for link in plan.links:
+        yield {"id": link.part_id, "part": link.part, "status": link.match, "old_path": link.old_path,
+               "path": link.path}
+    for link in plan.dangling:
+        yield {"id": link.part_id, "part": link.part, "status": DANGLING, "old_path": link.path, "path": None}
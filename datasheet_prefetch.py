@@ -0,0 +1,59 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class DatasheetPrefetcher(QObject):
+    """Copies datasheets into the local cache and renders their thumbnails on a background pool.
+
+    Results come back as signals, which Qt delivers on the GUI thread:
+    cached(part id, digest) once a part's datasheet is in the cache, and
+    thumbnailReady(digest, png path) once its preview exists ("" if it can't be rendered).
+    """
+
+    cached = pyqtSignal(int, str)
+    thumbnailReady = pyqtSignal(str, str)
+
+    def __init__(self, cache, base_dir, max_workers=2, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.base_dir = base_dir
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='datasheet')
+        self._lock = threading.Lock()
+        self._waiting = {}  # Source path (or digest) of each queued/running job -> [(part id, known digest)]
+
+    def prefetch(self, part_id, relative_path, digest=None):
+        """Queue caching and thumbnailing for one part's datasheet, unless it is already queued."""
+        key = digest or relative_path
+        with self._lock:
+            if key in self._waiting:
+                # Parts sharing a datasheet share one job
+                self._waiting[key].append((part_id, digest))
+                return
+            self._waiting[key] = [(part_id, digest)]
+        self._pool.submit(self._job, key, relative_path, digest)
+
+    def _job(self, key, relative_path, digest):
+        try:
+            if not digest or self.cache.get(digest) is None:
+                source = os.path.abspath(os.path.join(self.base_dir, relative_path))
+                if not os.path.exists(source):
+                    return
+                digest = self.cache.put(source)
+            with self._lock:
+                parts = self._waiting.pop(key, [])
+            for part_id, known in parts:
+                if known != digest:
+                    self.cached.emit(part_id, digest)
+            self.thumbnailReady.emit(digest, self.cache.thumbnail(digest) or "")
+        except OSError:
+            pass  # Unreachable share or unreadable file: the datasheet is simply not prefetched
+        finally:
+            with self._lock:
+                self._waiting.pop(key, None)
+
+    def shutdown(self):
+        """Drop queued jobs and stop accepting new ones."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+
+try:
+    import pymupdf  # Optional: renders thumbnails without an external tool
+except ImportError:
+    try:
+        import fitz as pymupdf  # Older PyMuPDF releases
+    except ImportError:
+        pymupdf = None
+
+
+CHUNK_SIZE = 1 << 20
+THUMBNAIL_WIDTH = 220
+TEXT_LIMIT = 200000  # Characters of a datasheet's text kept for search; the parametrics come first
+
+
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasheetCache:
+    """Size-bounded, content-addressed store of local datasheet copies.
+
+    Each PDF is kept once under its SHA-256 digest, however many parts link to it, so slow network
+    shares are read only once. When the total size passes max_bytes the least recently used copies
+    are removed (the originals are never touched). First-page thumbnails live alongside in
+    thumbnails/. Safe to use from several threads.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.thumbnail_dir = os.path.join(directory, 'thumbnails')
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> size, least recently used first
+        self._size = 0
+
+        # Rebuild the LRU order from file modification times, which get() refreshes
+        found = []
+        for root, _, files in os.walk(directory):
+            if root == self.thumbnail_dir:
+                continue
+            for name in files:
+                if name.endswith('.pdf'):
+                    stat = os.stat(os.path.join(root, name))
+                    found.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, digest, size in sorted(found):
+            self._entries[digest] = size
+            self._size += size
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + '.pdf')
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self.thumbnail_dir, digest + '.png')
+
+    def get(self, digest):
+        """Return the cached copy for digest, marking it recently used, or None."""
+        with self._lock:
+            if digest not in self._entries:
+                return None
+            self._entries.move_to_end(digest)
+        path = self.path_for(digest)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(digest, 0)
+            return None
+        return path
+
+    def put(self, source_path):
+        """Copy a file into the cache, hashing it in the same pass, and return its digest."""
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(suffix='.part', dir=self.directory)
+        try:
+            with open(source_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            digest = digest.hexdigest()
+            path = self.path_for(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            if digest not in self._entries:
+                self._size += size
+            self._entries[digest] = size
+            self._entries.move_to_end(digest)
+            evicted = self._evict(keep=digest)
+        for old in evicted:
+            self._remove_files(old)
+        return digest
+
+    def _evict(self, keep):
+        """Drop least recently used entries until under max_bytes. Called with the lock held."""
+        evicted = []
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            digest = next(iter(self._entries))
+            if digest == keep:
+                self._entries.move_to_end(digest)
+                continue
+            self._size -= self._entries.pop(digest)
+            evicted.append(digest)
+        return evicted
+
+    def _remove_files(self, digest):
+        for path in (self.path_for(digest), self.thumbnail_path(digest)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def thumbnail(self, digest, width=THUMBNAIL_WIDTH):
+        """Return a PNG of the first page of a cached datasheet, rendering it if needed.
+
+        Rendering uses PyMuPDF if it is installed, else poppler's pdftoppm if it is on the PATH.
+        Returns None if neither is available or the PDF can't be rendered.
+        """
+        png = self.thumbnail_path(digest)
+        if os.path.exists(png):
+            return png
+        pdf = self.get(digest)
+        if pdf is None:
+            return None
+        try:
+            if render_first_page(pdf, png, width):
+                return png
+        except Exception:
+            pass  # A broken PDF just has no preview
+        return None
+
+
+def render_first_page(pdf_path, png_path, width):
+    """Render page one of pdf_path to png_path, width pixels wide. Returns False if no renderer is available."""
+    if pymupdf is not None:
+        with pymupdf.open(pdf_path) as doc:
+            page = doc[0]
+            zoom = width / page.rect.width
+            page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom)).save(png_path)
+        return True
+
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm:
+        out_prefix = png_path[:-4]
+        subprocess.run([pdftoppm, '-png', '-f', '1', '-l', '1', '-singlefile', '-scale-to-x', str(width),
+                        '-scale-to-y', '-1', pdf_path, out_prefix],
+                       check=True, capture_output=True, timeout=60)
+        return os.path.exists(png_path)
+    return False
+
+
+def can_extract_text():
+    """Return True if PyMuPDF or poppler's pdftotext is available to read text out of PDFs."""
+    return pymupdf is not None or shutil.which('pdftotext') is not None
+
+
+def extract_text(pdf_path, max_chars=TEXT_LIMIT):
+    """Return the text of a PDF, page after page, cut off after max_chars characters.
+
+    Uses PyMuPDF if it is installed, else poppler's pdftotext. Returns None if neither is available.
+    """
+    if pymupdf is not None:
+        pages, length = [], 0
+        with pymupdf.open(pdf_path) as doc:
+            for page in doc:
+                text = page.get_text()
+                pages.append(text)
+                length += len(text)
+                if length >= max_chars:
+                    break
+        return "\n".join(pages)[:max_chars]
+
+    pdftotext = shutil.which('pdftotext')
+    if pdftotext:
+        result = subprocess.run([pdftotext, '-q', '-enc', 'UTF-8', pdf_path, '-'],
+                                check=True, capture_output=True, timeout=120)
+        return result.stdout.decode('utf-8', 'replace')[:max_chars]
+    return None
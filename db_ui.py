@@ -27,31 +27,9 @@ class Ui_Form(object):
         self.saveDatabaseButton = QtWidgets.QPushButton(Form)
         self.saveDatabaseButton.setGeometry(QtCore.QRect(270, 780, 141, 28))
         self.saveDatabaseButton.setObjectName("saveDatabaseButton")
-        self.partsTable = QtWidgets.QTableWidget(Form)
+        self.partsTable = QtWidgets.QTableView(Form)
         self.partsTable.setGeometry(QtCore.QRect(20, 80, 1291, 681))
         self.partsTable.setObjectName("partsTable")
-        self.partsTable.setColumnCount(10)
-        self.partsTable.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(3, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(4, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(5, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(6, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(7, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(8, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.partsTable.setHorizontalHeaderItem(9, item)
 
         self.retranslateUi(Form)
         QtCore.QMetaObject.connectSlotsByName(Form)
@@ -62,26 +40,6 @@ class Ui_Form(object):
         self.searchButton.setText(_translate("Form", "Search"))
         self.addComponentButton.setText(_translate("Form", "Add Component"))
         self.saveDatabaseButton.setText(_translate("Form", "Save Database"))
-        item = self.partsTable.horizontalHeaderItem(0)
-        item.setText(_translate("Form", "ID"))
-        item = self.partsTable.horizontalHeaderItem(1)
-        item.setText(_translate("Form", "CUS ID"))
-        item = self.partsTable.horizontalHeaderItem(2)
-        item.setText(_translate("Form", "Type"))
-        item = self.partsTable.horizontalHeaderItem(3)
-        item.setText(_translate("Form", "Part"))
-        item = self.partsTable.horizontalHeaderItem(4)
-        item.setText(_translate("Form", "Description"))
-        item = self.partsTable.horizontalHeaderItem(5)
-        item.setText(_translate("Form", "Footprint"))
-        item = self.partsTable.horizontalHeaderItem(6)
-        item.setText(_translate("Form", "Stock"))
-        item = self.partsTable.horizontalHeaderItem(7)
-        item.setText(_translate("Form", "Datasheet"))
-        item = self.partsTable.horizontalHeaderItem(8)
-        item.setText(_translate("Form", "Delete"))
-        item = self.partsTable.horizontalHeaderItem(9)
-        item.setText(_translate("Form", "Datasheet Path"))
 
 
 if __name__ == "__main__":
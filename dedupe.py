@@ -0,0 +1,236 @@
+"""Finding and merging duplicate parts.
+
+The same part often gets entered twice, e.g. "LM358N" and "lm358n/nopb" under different CUS IDs,
+splitting its stock. Parts are bucketed by blocking keys worked out from the part number, so only
+parts sharing a bucket are ever compared and a whole inventory is checked in one pass:
+
+- exact: the same normalized part number (case, punctuation and packaging suffixes such as
+  "/NOPB" or "-TR" ignored), type and footprint.
+- similar: the same part number once the trailing ordering-code letters are dropped ("LM358N",
+  "LM358P"), same type and footprint, and descriptions that mostly share their words. Worth a
+  look, but such suffixes can mean a different grade, so these are only merged when asked for.
+
+Part numbers differing in any digit are never matched: "LM358" and "LM385" are different parts.
+"""
+import json
+import re
+from collections import namedtuple, defaultdict
+
+from database import transaction
+from ledger import StockLedger
+from repository import PartsRepository, Part, SELECT_COLUMNS
+
+
+# A set of parts believed to be the same, and the one part they would be merged into
+DuplicateGroup = namedtuple('DuplicateGroup', 'kind key parts merged')
+
+EXACT, SIMILAR = "exact", "similar"
+
+# Reason of the stock movements that move a duplicate's stock onto the part it is merged into
+MERGED = "merged"
+
+# Columns of the duplicates report, one row per part; merged_stock is the total on the kept part's row
+REPORT_FIELDS = ("group", "kind", "action", "id", "cus_id", "type", "part", "description", "footprint", "stock",
+                 "datasheetpath", "merged_stock")
+
+# Reel, lead-free and distributor suffixes that don't change what the part is, longest first
+PACKAGING_SUFFIXES = ("CT-ND", "TR-ND", "-ND", "/NOPB", "#PBF", "-PBF", "/TR", "-TR", "#TR", "-T/R", "-REEL")
+
+MIN_SIMILARITY = 0.5  # Share of description words two similar parts need in common
+MAX_BLOCK = 200  # Buckets with more distinct part numbers than this are not compared pairwise
+
+MERGE_SQL = '''UPDATE components SET cus_id = ?, type = ?, description = ?, footprint = ?, datasheetpath = ?,
+                                     datasheet_hash = ?, min_stock = ?, reorder_qty = ?
+               WHERE id = ?'''
+HASHES_SQL = "SELECT id, datasheet_hash FROM components WHERE id IN (SELECT value FROM json_each(?))"
+# BOM lines and stock reserved for projects follow a duplicate to the part it is merged into
+MOVE_BOM_SQL = "UPDATE bom_lines SET part_id = ?, match = 'merged' WHERE part_id = ?"
+MOVE_RESERVATIONS_SQL = '''INSERT INTO stock_reservations (project_id, part_id, quantity)
+                           SELECT project_id, ?, quantity FROM stock_reservations WHERE part_id = ?
+                           ON CONFLICT (project_id, part_id) DO UPDATE SET quantity = quantity + excluded.quantity'''
+
+_NOT_ALNUM = re.compile(r"[^0-9A-Z]")
+_ORDERING_CODE = re.compile(r"[A-Z]+$")
+
+
+def strip_packaging(part):
+    """Return the part number in upper case without its packaging suffixes."""
+    part = (part or "").strip().upper()
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in PACKAGING_SUFFIXES:
+            if part.endswith(suffix) and len(part) > len(suffix):
+                part, stripped = part[:-len(suffix)], True
+    return part
+
+
+def normalize_part(part):
+    """Return the part number in the form duplicates share: upper case, without packaging suffixes
+    or punctuation. Returns "" if nothing is left."""
+    return _NOT_ALNUM.sub("", strip_packaging(part))
+
+
+def base_part(normalized):
+    """Return a normalized part number without its trailing ordering-code letters, or None if too
+    little would be left to go on."""
+    base = _ORDERING_CODE.sub("", normalized)
+    if len(base) < 3 or not any(c.isdigit() for c in base):
+        return None
+    return base
+
+
+def description_similarity(a, b):
+    """Share of words the two descriptions have in common (Jaccard); 1.0 if either is blank."""
+    words_a, words_b = set((a or "").lower().split()), set((b or "").lower().split())
+    if not words_a or not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def _fold(value):
+    return (value or "").strip().lower()
+
+
+def merge_parts(parts):
+    """Return the Part the given duplicates merge into.
+
+    The part with the lowest id is kept, since labels and bills of materials are most likely to
+    point at it. Its stock becomes the total of all of them; blank fields are filled from the others
+    (the longest description, the first datasheet), and the highest reorder levels are kept.
+    """
+    parts = sorted(parts, key=lambda part: part.id)
+    kept = parts[0]
+
+    def first(field):
+        return getattr(kept, field) or next((getattr(part, field) for part in parts if getattr(part, field)),
+                                            getattr(kept, field))
+
+    return kept._replace(
+        cus_id=first("cus_id"),
+        type=first("type"),
+        description=kept.description or max((part.description or "" for part in parts), key=len),
+        footprint=first("footprint"),
+        stock=sum(part.stock or 0 for part in parts),
+        datasheetpath=first("datasheetpath"),
+        min_stock=max(part.min_stock or 0 for part in parts),
+        reorder_qty=max(part.reorder_qty or 0 for part in parts),
+    )
+
+
+def find_duplicates(conn, similar=False):
+    """Return the DuplicateGroups of parts in the database, exact matches first.
+
+    With similar=True, groups of similar part numbers are included too, each taking the place of
+    the exact groups it joins. Reads the whole table once; no pair of parts is compared unless they
+    share a bucket.
+    """
+    buckets = defaultdict(list)  # (normalized part, type, footprint) -> parts
+    for row in conn.execute(f"SELECT {SELECT_COLUMNS} FROM components ORDER BY id"):
+        part = Part._make(row)
+        normalized = normalize_part(part.part)
+        if normalized:
+            buckets[(normalized, _fold(part.type), _fold(part.footprint))].append(part)
+
+    similar_groups, joined = _similar_groups(buckets) if similar else ([], set())
+    return [DuplicateGroup(EXACT, key[0], parts, merge_parts(parts))
+            for key, parts in buckets.items() if len(parts) > 1 and key not in joined] + similar_groups
+
+
+def _similar_groups(buckets):
+    """Join exact buckets whose part numbers share a base and whose descriptions are alike.
+
+    Returns the groups and the keys of the buckets they took in.
+    """
+    blocks = defaultdict(list)  # (base part, type, footprint) -> exact bucket keys
+    for key in buckets:
+        base = base_part(key[0])
+        if base is not None:
+            blocks[(base,) + key[1:]].append(key)
+
+    groups, joined_keys = [], set()
+    for block, keys in blocks.items():
+        if len(keys) < 2 or len(keys) > MAX_BLOCK:
+            continue
+        # Union-find over the buckets of the block, compared by their first part's description
+        parent = list(range(len(keys)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(len(keys)):
+            for j in range(i + 1, len(keys)):
+                if description_similarity(buckets[keys[i]][0].description,
+                                          buckets[keys[j]][0].description) >= MIN_SIMILARITY:
+                    parent[root(j)] = root(i)
+        joined = defaultdict(list)
+        for i, key in enumerate(keys):
+            joined[root(i)].append(key)
+        for members in joined.values():
+            if len(members) > 1:
+                parts = sorted((part for key in members for part in buckets[key]), key=lambda part: part.id)
+                groups.append(DuplicateGroup(SIMILAR, block[0], parts, merge_parts(parts)))
+                joined_keys.update(members)
+    return groups, joined_keys
+
+
+def report_rows(groups):
+    """Yield the duplicates report as dicts of REPORT_FIELDS, the kept part of each group first."""
+    for number, group in enumerate(groups, 1):
+        for part in sorted(group.parts, key=lambda part: part.id != group.merged.id):
+            kept = part.id == group.merged.id
+            record = {field: getattr(part, field) for field in REPORT_FIELDS if field in Part._fields}
+            record.update(group=number, kind=group.kind, action="keep" if kept else "merge",
+                          merged_stock=group.merged.stock if kept else None)
+            yield record
+
+
+def merge_duplicates(conn, groups):
+    """Merge each group into its kept part, in one transaction, and return how many parts were removed.
+
+    Each duplicate's stock is moved onto the kept part as a pair of "merged" movements, so the stock
+    history stays complete, and BOM lines and reservations pointing at a duplicate move to the kept
+    part; then the duplicates are deleted and the kept part takes the merged fields. Raises
+    ConflictError, changing nothing, if any of the parts has changed since the groups were found.
+    A part can only be merged once: groups overlapping an earlier one are skipped.
+    """
+    repository = PartsRepository(conn)
+    ledger = StockLedger(conn)
+    with transaction(conn):
+        seen, distinct = set(), []
+        for group in groups:
+            ids = {part.id for part in group.parts}
+            if not ids & seen:
+                distinct.append(group)
+                seen |= ids
+        groups = distinct
+        repository.check_versions({part.id: part.version for group in groups for part in group.parts})
+
+        movements, duplicate_ids, moves, updates = [], [], [], []
+        for group in groups:
+            kept = group.merged
+            note = f"merged into part {kept.id}"
+            for part in group.parts:
+                if part.id != kept.id:
+                    duplicate_ids.append(part.id)
+                    moves.append((kept.id, part.id))
+                    if part.stock:
+                        movements += [(part.id, -part.stock, MERGED, note), (kept.id, part.stock, MERGED, note)]
+            # The cached datasheet goes with the path the kept part takes over
+            source = next(part.id for part in group.parts if part.datasheetpath == kept.datasheetpath)
+            updates.append([kept.cus_id, kept.type, kept.description, kept.footprint, kept.datasheetpath, source,
+                            kept.min_stock, kept.reorder_qty, kept.id])
+        hashes = dict(conn.execute(HASHES_SQL, (json.dumps([update[5] for update in updates]),)))
+        for update in updates:
+            update[5] = hashes.get(update[5])
+
+        # All in a few batches; the duplicates go before the kept parts take over their CUS IDs
+        ledger.record(movements)
+        conn.executemany(MOVE_BOM_SQL, moves)
+        conn.executemany(MOVE_RESERVATIONS_SQL, moves)
+        removed = repository.delete_many(duplicate_ids)
+        conn.executemany(MERGE_SQL, updates)
+    return removed
@@ -0,0 +1,366 @@
+"""Opt-in instrumentation of the GUI and its database work, for finding out why LabParts is slow.
+
+While recording, Diagnostics collects:
+
+- every SQL statement run on an attached connection (through sqlite3's trace callback), timed
+  from when SQLite starts it until the connection's next statement, or until the event loop next
+  goes idle for the GUI's connection, so the time includes fetching its rows and is an upper bound;
+- the latency of user actions (search, save, delete, view...), as wrapped in action();
+- table refreshes: how long until the event loop was idle again (the view repainted) and how many
+  widgets they left behind;
+- event-loop stalls: timer ticks that came later than STALL_MS.
+
+Slow statements, actions, refreshes and stalls go to a rotating JSON-lines log, one object per
+line; everything is summed up in memory for DiagnosticsDialog. When recording is off nothing is
+traced or timed: connections have no trace callback, no timer runs and action() only checks a flag.
+Start with `python main.py --diagnostics` (or LABPARTS_DIAGNOSTICS=1), or tick the box in
+File > Diagnostics.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from PyQt5.QtCore import QAbstractEventDispatcher, QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import (QApplication, QCheckBox, QDialog, QDialogButtonBox, QLabel, QPlainTextEdit,
+                             QPushButton, QVBoxLayout)
+
+
+TICK_MS = 50  # Event-loop heartbeat while recording
+STALL_MS = 100  # A heartbeat this much later than due counts as a stall
+SLOW_SQL_MS = 20  # Statements at least this slow are written to the log (all are summed up)
+LOG_BYTES = 1024 * 1024  # Size at which the log rolls over...
+LOG_BACKUPS = 3  # ...keeping this many old ones
+LATENCIES_KEPT = 500  # Recent durations kept per action for percentiles
+TOP_STATEMENTS = 15
+
+# Literals in traced SQL (sqlite3 passes statements with their parameters filled in), so the same
+# statement sums up as one whatever it was run with
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_key(sql):
+    """Return the SQL with literals replaced by ? and whitespace collapsed."""
+    return _SPACE.sub(" ", _LITERALS.sub("?", sql)).strip()[:300]
+
+
+class _StatementTimer:
+    """The trace callback of one connection: times each statement until the next one starts."""
+
+    def __init__(self, diagnostics, name):
+        self.diagnostics = diagnostics
+        self.name = name
+        self.current = None  # (sql, start) of the statement running or last run
+
+    def __call__(self, sql):
+        now = time.perf_counter()
+        if self.current is not None:
+            if self.current[0] == sql:
+                return  # The same statement reported again as its triggers run
+            self.diagnostics.record_statement(self.name, self.current[0], now - self.current[1])
+        self.current = (sql, now)
+
+    def flush(self):
+        """Close the statement last started: whatever ran it has returned by now."""
+        if self.current is not None:
+            sql, start = self.current
+            self.current = None
+            self.diagnostics.record_statement(self.name, sql, time.perf_counter() - start)
+
+
+class Diagnostics(QObject):
+    """Records what the GUI and its connections spend their time on, while enabled.
+
+    Connections are attached from the thread that uses them, with attach(); call it again there
+    after recording is switched on or off (toggled tells the GUI thread when). Everything else is
+    called on the GUI thread, except the recording methods, which any thread may call.
+    """
+
+    toggled = pyqtSignal(bool)
+
+    def __init__(self, log_file, enabled=False, parent=None):
+        super().__init__(parent)
+        self.log_file = log_file
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._timers = {}  # id(connection) -> _StatementTimer
+        self._logger = None
+        self._models = []
+        self._refresh = None  # (what, start, widgets) of a table refresh waiting for the view to settle
+        self._action = None  # Name of the action running on the GUI thread, for stalls
+        self.clear()
+
+        self.heartbeat = QTimer(self)
+        self.heartbeat.setInterval(TICK_MS)
+        self.heartbeat.timeout.connect(self._tick)
+        self._last_tick = None
+        self.set_enabled(enabled)
+
+    def clear(self):
+        """Forget what has been summed up so far (the log file is kept)."""
+        with self._lock:
+            self.statements = defaultdict(lambda: [0, 0.0, 0.0])  # (connection, sql) -> [count, total, max]
+            self.actions = defaultdict(lambda: deque(maxlen=LATENCIES_KEPT))  # name -> recent seconds
+            self.stalls = deque(maxlen=LATENCIES_KEPT)  # (seconds, action)
+            self.refreshes = deque(maxlen=LATENCIES_KEPT)  # (what, seconds, widgets)
+            self.since = time.time()
+
+    def set_enabled(self, enabled):
+        """Start or stop recording."""
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        dispatcher = QAbstractEventDispatcher.instance()
+        if enabled:
+            self._open_log()
+            self._last_tick = time.perf_counter()
+            self.heartbeat.start()
+            dispatcher.aboutToBlock.connect(self._idle)
+            for model in self._models:
+                self._connect_model(model)
+        else:
+            self.heartbeat.stop()
+            dispatcher.aboutToBlock.disconnect(self._idle)
+            for model in self._models:
+                self._disconnect_model(model)
+            self._refresh = None
+        self.log({"kind": "recording", "on": enabled})
+        self.toggled.emit(enabled)
+
+    def _open_log(self):
+        if self._logger is not None:
+            return
+        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(self.log_file, maxBytes=LOG_BYTES, backupCount=LOG_BACKUPS,
+                                                       encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"labparts.diagnostics.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(handler)
+
+    def log(self, event):
+        """Append an event (a dict) to the log, stamped with the time."""
+        if self._logger is not None:
+            event = {"at": time.strftime("%Y-%m-%dT%H:%M:%S"), **event}
+            self._logger.info(json.dumps(event))
+
+    def close(self):
+        """Stop recording and close the log file."""
+        self.set_enabled(False)
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
+            self._logger = None
+
+    # SQL
+
+    def attach(self, conn, name):
+        """Trace conn's statements under name while recording, or stop tracing it when not.
+
+        Call from the thread that uses conn (sqlite3 connections refuse calls from other threads).
+        """
+        self.flush(conn)
+        if self.enabled:
+            timer = self._timers.get(id(conn)) or _StatementTimer(self, name)
+            self._timers[id(conn)] = timer
+            conn.set_trace_callback(timer)
+        else:
+            self._timers.pop(id(conn), None)
+            conn.set_trace_callback(None)
+
+    def detach(self, conn):
+        """Stop tracing a connection about to be closed."""
+        self.flush(conn)
+        self._timers.pop(id(conn), None)
+        conn.set_trace_callback(None)
+
+    def flush(self, conn):
+        """Close the timing of conn's last statement. Call from the connection's thread."""
+        timer = self._timers.get(id(conn))
+        if timer is not None:
+            timer.flush()
+
+    def record_statement(self, connection, sql, seconds):
+        key = statement_key(sql)
+        with self._lock:
+            stats = self.statements[(connection, key)]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+        if seconds * 1000 >= SLOW_SQL_MS:
+            self.log({"kind": "sql", "connection": connection, "ms": round(seconds * 1000, 2), "sql": key})
+
+    # Actions
+
+    @contextmanager
+    def action(self, name, conn=None, **detail):
+        """Time the enclosed block as one user action. conn, the GUI connection, has its last
+        statement closed at the end, so its time isn't carried into the next event."""
+        if not self.enabled:
+            yield
+            return
+        outer, self._action = self._action, name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._action = outer
+            if conn is not None:
+                self.flush(conn)
+            self.record_action(name, time.perf_counter() - start, **detail)
+
+    def record_action(self, name, seconds, **detail):
+        """Record how long an action took (for actions that end in a later event, like a search)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.actions[name].append(seconds)
+        self.log({"kind": "action", "name": name, "ms": round(seconds * 1000, 2), **detail})
+
+    # Table refreshes
+
+    def watch_model(self, model):
+        """Record each reset of model, and each batch of rows added to it, as a table refresh."""
+        self._models.append(model)
+        if self.enabled:
+            self._connect_model(model)
+
+    def _connect_model(self, model):
+        model.modelAboutToBeReset.connect(self._begin_reset)
+        model.rowsAboutToBeInserted.connect(self._begin_rows)
+
+    def _disconnect_model(self, model):
+        model.modelAboutToBeReset.disconnect(self._begin_reset)
+        model.rowsAboutToBeInserted.disconnect(self._begin_rows)
+
+    def _begin_reset(self):
+        self._begin_refresh("reset")
+
+    def _begin_rows(self, parent, first, last):
+        self._begin_refresh(f"{last - first + 1} rows")
+
+    def _begin_refresh(self, what):
+        if self._refresh is None:
+            # Net widgets: with painted delegates, a refresh shouldn't leave any behind
+            self._refresh = (what, time.perf_counter(), len(QApplication.allWidgets()))
+
+    def _end_refresh(self):
+        what, start, widgets = self._refresh
+        self._refresh = None
+        seconds, widgets = time.perf_counter() - start, len(QApplication.allWidgets()) - widgets
+        with self._lock:
+            self.refreshes.append((what, seconds, widgets))
+        self.log({"kind": "refresh", "what": what, "ms": round(seconds * 1000, 2), "widgets": widgets})
+
+    # Event loop
+
+    def _tick(self):
+        now = time.perf_counter()
+        late = now - self._last_tick - TICK_MS / 1000
+        self._last_tick = now
+        if late * 1000 >= STALL_MS:
+            with self._lock:
+                self.stalls.append((late, self._action))
+            self.log({"kind": "stall", "ms": round(late * 1000, 2), "action": self._action})
+
+    def _idle(self):
+        # The GUI thread has run out of events to handle, so whatever it started has returned
+        for timer in list(self._timers.values()):
+            if timer.name == "gui":
+                timer.flush()
+        if self._refresh is not None:
+            self._end_refresh()
+
+    # Summary
+
+    def summary(self):
+        """Return what has been recorded as text, for the diagnostics dialog."""
+        with self._lock:
+            actions = {name: sorted(times) for name, times in self.actions.items()}
+            statements = sorted(self.statements.items(), key=lambda item: -item[1][1])[:TOP_STATEMENTS]
+            stalls, refreshes = list(self.stalls), list(self.refreshes)
+        lines = [f"Recording {'on' if self.enabled else 'off'} since {time.strftime('%H:%M:%S', time.localtime(self.since))}",
+                 f"Log: {self.log_file}", "", "Actions               count    p50 ms    p95 ms    max ms"]
+        for name, times in sorted(actions.items()):
+            lines.append(f"  {name:<18}{len(times):>7}{_ms(_percentile(times, 50)):>10}"
+                         f"{_ms(_percentile(times, 95)):>10}{_ms(times[-1]):>10}")
+        lines += ["", "Event-loop stalls"]
+        if stalls:
+            worst = max(stalls)
+            lines.append(f"  {len(stalls)} over {STALL_MS} ms, worst {_ms(worst[0])} ms"
+                         + (f" during {worst[1]}" if worst[1] else ""))
+        else:
+            lines.append("  none")
+        lines += ["", "Table refreshes"]
+        if refreshes:
+            lines.append(f"  {len(refreshes)}, slowest {_ms(max(seconds for _, seconds, _ in refreshes))} ms, "
+                         f"most widgets left behind {max(widgets for _, _, widgets in refreshes)}")
+        else:
+            lines.append("  none")
+        lines += ["", "SQL by total time     count  total ms    max ms"]
+        for (connection, sql), (count, total, worst) in statements:
+            lines.append(f"  {connection:<18}{count:>7}{_ms(total):>10}{_ms(worst):>10}  {sql[:120]}")
+        return "\n".join(lines)
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * percent // 100)]
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f}"
+
+
+class DiagnosticsDialog(QDialog):
+    """Shows Diagnostics.summary(), with a switch to start and stop recording."""
+
+    def __init__(self, diagnostics, parent=None):
+        super().__init__(parent)
+        self.diagnostics = diagnostics
+        self.setWindowTitle("Diagnostics")
+        self.resize(900, 600)
+
+        layout = QVBoxLayout(self)
+        self.recording = QCheckBox("Record diagnostics")
+        self.recording.setChecked(diagnostics.enabled)
+        self.recording.toggled.connect(self.on_recording_toggled)
+        layout.addWidget(self.recording)
+        layout.addWidget(QLabel("Timings are kept in memory and slow events are logged, until recording is switched off."))
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        layout.addWidget(self.text)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        refresh = QPushButton("Refresh")
+        refresh.clicked.connect(self.refresh)
+        buttons.addButton(refresh, QDialogButtonBox.ActionRole)
+        clear = QPushButton("Clear")
+        clear.clicked.connect(lambda: (self.diagnostics.clear(), self.refresh()))
+        buttons.addButton(clear, QDialogButtonBox.ActionRole)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        # Keep the figures current while the dialog is open
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+        self.refresh()
+
+    def on_recording_toggled(self, on):
+        self.diagnostics.set_enabled(on)
+        self.refresh()
+
+    def refresh(self):
+        self.text.setPlainText(self.diagnostics.summary())
@@ -0,0 +1,294 @@
+import csv
+import json
+import os
+
+from ledger import USAGE_FIELDS
+from repository import REORDER_FIELDS
+
+
+# Writable columns of the components table, in insert order
+COMPONENT_FIELDS = ("cus_id", "type", "part", "description", "footprint", "stock", "datasheetpath", "min_stock",
+                    "reorder_qty")
+
+# Fields of a bill of materials line; quantity is per board
+BOM_FIELDS = ("reference", "cus_id", "part", "description", "footprint", "quantity")
+
+# Fields read as whole numbers (unparseable values become 0, blank ones None)
+INTEGER_FIELDS = ("stock", "min_stock", "reorder_qty", "quantity")
+
+# Header names (lower-cased) recognised for each field, covering common distributor BOM/order exports
+COLUMN_ALIASES = {
+    "cus_id": ("cus_id", "cus id", "customer id", "customer reference", "customer part number", "customer no."),
+    "type": ("type", "category", "part type"),
+    "part": ("part", "part number", "mpn", "manufacturer part number", "mfr part #", "mfr. part no.", "mfr part number"),
+    "description": ("description", "desc", "product description"),
+    "footprint": ("footprint", "package", "package / case", "case", "package type"),
+    "stock": ("stock", "qty", "quantity", "quantity available", "on hand"),
+    "datasheetpath": ("datasheetpath", "datasheet", "datasheet path", "datasheet url"),
+    "min_stock": ("min_stock", "min stock", "minimum stock", "reorder level", "reorder point", "safety stock"),
+    "reorder_qty": ("reorder_qty", "reorder qty", "reorder quantity", "order qty", "order quantity"),
+}
+
+# Header names recognised in BOMs exported by EDA tools and distributors' BOM tools
+BOM_ALIASES = {
+    "reference": ("reference", "references", "designator", "designators", "ref des", "refdes", "ref"),
+    "cus_id": COLUMN_ALIASES["cus_id"],
+    "part": COLUMN_ALIASES["part"] + ("manufacturer_part_number", "mfr_part_number", "mfr. #", "part_number"),
+    "description": COLUMN_ALIASES["description"] + ("value", "comment"),
+    "footprint": COLUMN_ALIASES["footprint"],
+    "quantity": ("quantity", "qty", "qty per board", "quantity per pcb", "count"),
+}
+
+# Bound-parameter SQL for COMPONENT_FIELDS; a blank cus_id is stored as NULL so the unique index ignores it
+PLACEHOLDERS = ", ".join("NULLIF(?, '')" if field == "cus_id" else "?" for field in COMPONENT_FIELDS)
+
+# What a new part gets for a field the input has no value for
+DEFAULTS = {field: 0 if field in INTEGER_FIELDS else "" for field in COMPONENT_FIELDS}
+
+BATCH_SIZE = 1000  # Rows per executemany call during import
+
+SKIP, UPDATE = "skip", "update"  # What to do with a row that matches an existing part
+
+
+def map_columns(header, column_map=None, fields=COMPONENT_FIELDS, aliases=COLUMN_ALIASES):
+    """Work out which input column feeds each components field (or each of fields, named by aliases).
+
+    column_map ({field: column name}) takes precedence over the built-in aliases.
+    Returns {field: column name}; fields with no matching column are left out.
+    """
+    mapping = {}
+    lowered = {name.strip().lower(): name for name in header if name}
+    for field in fields:
+        if column_map and field in column_map:
+            if column_map[field] not in header:
+                raise ValueError(f"Column '{column_map[field]}' not found in input")
+            mapping[field] = column_map[field]
+            continue
+        for alias in aliases[field]:
+            if alias in lowered:
+                mapping[field] = lowered[alias]
+                break
+    if "part" not in mapping and "cus_id" not in mapping:
+        raise ValueError("Input needs a part number or CUS ID column")
+    return mapping
+
+
+def normalize_record(raw, mapping, fields=COMPONENT_FIELDS):
+    """Build a components record (a dict of COMPONENT_FIELDS, or of fields) from one mapped input row.
+
+    Fields with no column in the input, and blank numbers, are None, so an update can tell them
+    from values that were given.
+    """
+    record = {}
+    for field in fields:
+        if field not in mapping:
+            record[field] = None
+            continue
+        value = raw.get(mapping[field])
+        value = "" if value is None else str(value).strip()
+        if field in INTEGER_FIELDS:
+            digits = value.replace(",", "")
+            value = None if not digits else int(float(digits)) if digits.replace(".", "", 1).isdigit() else 0
+        record[field] = value
+    return record
+
+
+def read_csv(path, column_map=None, fields=COMPONENT_FIELDS, aliases=COLUMN_ALIASES):
+    """Yield components records from a CSV file, one row at a time."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        mapping = map_columns(reader.fieldnames or [], column_map, fields, aliases)
+        for raw in reader:
+            yield normalize_record(raw, mapping, fields)
+
+
+def read_json(path, column_map=None, fields=COMPONENT_FIELDS, aliases=COLUMN_ALIASES):
+    """Yield components records from JSON.
+
+    JSON-lines files (.jsonl/.ndjson, one object per line) are streamed. A .json file holds a single
+    array of objects, which has to be parsed as a whole.
+    """
+    with open(path, encoding="utf-8-sig") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            objects = (json.loads(line) for line in f if line.strip())
+        else:
+            objects = iter(json.load(f))
+        mapping = None
+        for raw in objects:
+            if mapping is None:
+                mapping = map_columns(list(raw.keys()), column_map, fields, aliases)
+            yield normalize_record(raw, mapping, fields)
+
+
+def read_records(path, column_map=None, fields=COMPONENT_FIELDS, aliases=COLUMN_ALIASES):
+    """Yield components records (or records of fields) from a CSV or JSON file, chosen by extension."""
+    if path.lower().endswith((".json", ".jsonl", ".ndjson")):
+        return read_json(path, column_map, fields, aliases)
+    return read_csv(path, column_map, fields, aliases)
+
+
+def read_bom(path, column_map=None):
+    """Yield the lines of a bill of materials as dicts of BOM_FIELDS, from a CSV or JSON file."""
+    return read_records(path, column_map, BOM_FIELDS, BOM_ALIASES)
+
+
+def dedupe_keys(cus_id, part):
+    """Identities of a part for de-duplication: its CUS ID and its part number, those it has."""
+    cus_id, part = (cus_id or "").strip().lower(), (part or "").strip().lower()
+    return [key for key in (("cus_id", cus_id), ("part", part)) if key[1]]
+
+
+def _cus_id(keys):
+    return keys[0][1] if keys and keys[0][0] == "cus_id" else ""
+
+
+def _find(known, keys):
+    """Return the (id, CUS ID) entry of known matching a row's dedupe_keys, or None.
+
+    A row matches on its CUS ID, or else on its part number, unless it and the part found both have
+    CUS IDs and they differ: those are two stock items with the same part number.
+    """
+    cus_id = _cus_id(keys)
+    for kind, value in keys:
+        found = known.get((kind, value))
+        if found is not None and (kind == "cus_id" or not cus_id or not found[1]):
+            return found
+    return None
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def update_sql(fields):
+    """Return the UPDATE of a part setting only the given fields, from their values then the id.
+
+    A changed datasheet path forgets the cached file's hash, so its datasheet is cached again; the
+    path is bound a second time for that.
+    """
+    assignments = [f"{field} = ?" for field in fields]
+    if "datasheetpath" in fields:
+        assignments.append("datasheet_hash = CASE WHEN datasheetpath IS ? THEN datasheet_hash END")
+    return f"UPDATE components SET {', '.join(assignments)} WHERE id = ?"
+
+
+def import_parts(conn, records, on_duplicate=SKIP, batch_size=BATCH_SIZE, progress=None):
+    """Insert records into components in batches, inside one transaction.
+
+    Rows are matched against existing parts (and earlier rows of the same input) by CUS ID or part
+    number (see dedupe_keys).
+    Matches are skipped, or with on_duplicate=UPDATE have the fields the row gives a value for
+    overwritten; fields the input has no column for, and blank cells, leave what is stored alone.
+    progress, if given, is called with the number of input rows processed after each batch.
+    Returns (added, updated, skipped).
+    """
+    # The parts already in the database by each of their keys, as (id, normalized CUS ID)
+    existing = {}
+    for part_id, cus_id, part in conn.execute("SELECT id, cus_id, part FROM components"):
+        keys = dedupe_keys(cus_id, part)
+        for key in keys:
+            existing.setdefault(key, (part_id, _cus_id(keys)))
+
+    added = updated = skipped = processed = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for batch in _batches(records, batch_size):
+            inserts, updates = [], {}  # updates: fields set -> rows
+            for record in batch:
+                keys = dedupe_keys(record["cus_id"], record["part"])
+                found = _find(existing, keys)
+                if not keys:
+                    skipped += 1  # Nothing to identify the part by
+                elif found is not None:
+                    if on_duplicate == UPDATE and found[0] is not None:
+                        fields = tuple(field for field in COMPONENT_FIELDS if record[field] not in (None, ""))
+                        row = [record[field] for field in fields]
+                        if "datasheetpath" in fields:
+                            row.append(record["datasheetpath"])
+                        updates.setdefault(fields, []).append(row + [found[0]])
+                    else:
+                        skipped += 1
+                else:
+                    for key in keys:  # A part first seen in this input, with no id yet
+                        existing.setdefault(key, (None, _cus_id(keys)))
+                    inserts.append([DEFAULTS[field] if record[field] is None else record[field]
+                                    for field in COMPONENT_FIELDS])
+            conn.executemany(f'''INSERT INTO components ({", ".join(COMPONENT_FIELDS)})
+                                 VALUES ({PLACEHOLDERS})''', inserts)
+            for fields, rows in updates.items():
+                conn.executemany(update_sql(fields), rows)
+                updated += len(rows)
+            added += len(inserts)
+            processed += len(batch)
+            if progress:
+                progress(processed)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return added, updated, skipped
+
+
+def iter_parts(conn):
+    """Yield every part as a dict, streaming from the database."""
+    columns = ("id",) + COMPONENT_FIELDS
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM components ORDER BY id")
+    for row in cursor:
+        yield dict(zip(columns, row))
+
+
+def write_records(path, fields, records):
+    """Write dicts of fields to a CSV, JSON or JSON-lines file (chosen by extension) and return the count.
+
+    Records are written as they are produced, so memory use doesn't grow with their number.
+    """
+    count = 0
+    lower = path.lower()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if lower.endswith((".jsonl", ".ndjson")):
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+                count += 1
+        elif lower.endswith(".json"):
+            f.write("[")
+            for record in records:
+                f.write((",\n" if count else "\n") + json.dumps(record))
+                count += 1
+            f.write("\n]\n")
+        else:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for record in records:
+                writer.writerow(record[field] for field in fields)
+                count += 1
+    return count
+
+
+def export_parts(conn, path):
+    """Write every part to a CSV, JSON or JSON-lines file, streaming from the database. Returns the count."""
+    return write_records(path, ("id",) + COMPONENT_FIELDS, iter_parts(conn))
+
+
+def export_reorder_report(repository, path):
+    """Write the parts below their minimum stock, with the quantity to order, and return the count.
+
+    Same formats as export_parts. This is the list the planned Wishlist is to be filled from.
+    """
+    return write_records(path, REORDER_FIELDS, repository.reorder_items())
+
+
+def export_usage_report(ledger, path, since, until=None):
+    """Write how much of each part was used and received between two dates, and the daily rate. Returns the count."""
+    return write_records(path, USAGE_FIELDS, ledger.usage(since, until))
+
+
+def is_supported(path):
+    """Return True if path has an extension import/export understands."""
+    return os.path.splitext(path.lower())[1] in (".csv", ".json", ".jsonl", ".ndjson")
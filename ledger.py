@@ -0,0 +1,149 @@
+"""Stock history: the append-only stock_movements ledger behind components.stock.
+
+Every change to a part's stock is a movement carrying the balance after it. Editing the Stock
+column or importing parts records an adjustment through triggers, and deleting a part closes its
+stock to 0; StockLedger.record() books receipts and usage as deltas, in one batch. Snapshots and per-day usage totals keep "stock as of"
+and usage reports fast however long the ledger gets.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+from database import transaction
+
+
+Movement = namedtuple('Movement', 'id part_id delta balance reason note created_at')
+
+MOVEMENT_COLUMNS = ", ".join(Movement._fields)
+
+# Reasons the app records; any other text is accepted too
+OPENING, ADJUSTMENT, RECEIVED, USED = "opening", "adjustment", "received", "used"
+CLOSING = "closing"  # A deleted part's stock going to 0
+
+# Columns of the usage report
+USAGE_FIELDS = ("id", "cus_id", "type", "part", "footprint", "stock", "used", "received", "per_day", "days_left")
+
+SNAPSHOT_INTERVAL_DAYS = 7
+
+# The balance is worked out in SQL from the stock at the time of the insert, and the insert trigger
+# applies it before the next row of the batch, so several movements of one part add up correctly.
+RECORD_SQL = '''INSERT INTO stock_movements (part_id, delta, balance, reason, note)
+                SELECT id, ?, COALESCE(stock, 0) + ?, ?, ? FROM components WHERE id = ?'''
+# The last movement recorded at or before a time; ids follow recording order, so everything up to it
+# is the ledger as it stood then
+CUTOFF_SQL = "SELECT id FROM stock_movements WHERE created_at <= ? ORDER BY created_at DESC, id DESC LIMIT 1"
+BALANCE_SQL = "SELECT balance FROM stock_movements WHERE part_id = ? AND id <= ? ORDER BY id DESC LIMIT 1"
+# Each part's last balance in the window after the snapshot, plus the snapshot's figure for parts
+# that didn't move in it
+AS_OF_SQL = '''SELECT part_id, balance FROM stock_movements
+               WHERE id IN (SELECT MAX(id) FROM stock_movements WHERE id > :base AND id <= :cutoff GROUP BY part_id)
+               UNION ALL
+               SELECT part_id, stock FROM stock_snapshot_parts
+               WHERE snapshot_id = :snapshot
+                 AND part_id NOT IN (SELECT part_id FROM stock_movements WHERE id > :base AND id <= :cutoff)'''
+USAGE_SQL = '''SELECT c.id, c.cus_id, c.type, c.part, c.footprint, COALESCE(c.stock, 0), u.used, u.received
+               FROM (SELECT part_id, SUM(used) AS used, SUM(received) AS received FROM stock_usage_daily
+                     WHERE day BETWEEN ? AND ? GROUP BY part_id) u
+               JOIN components c ON c.id = u.part_id
+               ORDER BY u.used DESC, c.id'''
+
+
+def today():
+    """Today's date in UTC, which is what the ledger's timestamps use."""
+    return datetime.now(timezone.utc).date()
+
+
+def days_ago(days):
+    """Return the UTC date the given number of days before today, as 'YYYY-MM-DD'."""
+    return (today() - timedelta(days=days)).isoformat()
+
+
+def end_of_day(day):
+    """Turn a 'YYYY-MM-DD' date into the last timestamp of that day; full timestamps pass through."""
+    return f"{day} 23:59:59" if len(day) == 10 else day
+
+
+class StockLedger:
+    """Records and queries stock movements on one SQLite connection.
+
+    Times are SQLite UTC timestamps ('YYYY-MM-DD HH:MM:SS'); "as of" queries also accept a date and
+    read it as the end of that day.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def record(self, movements, note=None):
+        """Book (part_id, delta, reason) movements in one transaction and return how many were recorded.
+
+        A movement may carry its own note as a fourth item; note applies to the rest. Movements of
+        parts that don't exist are skipped.
+        """
+        rows = [(movement[1], movement[1], movement[2], movement[3] if len(movement) > 3 else note, movement[0])
+                for movement in movements]
+        with transaction(self.conn):
+            recorded = self.conn.executemany(RECORD_SQL, rows).rowcount
+        return max(recorded, 0)
+
+    def history(self, part_id, limit=100):
+        """Return a part's latest movements, newest first."""
+        rows = self.conn.execute(f'''SELECT {MOVEMENT_COLUMNS} FROM stock_movements
+                                     WHERE part_id = ? ORDER BY id DESC LIMIT ?''', (part_id, limit))
+        return [Movement._make(row) for row in rows]
+
+    def _cutoff(self, at):
+        row = self.conn.execute(CUTOFF_SQL, (end_of_day(at),)).fetchone()
+        return row[0] if row else 0
+
+    def stock_at(self, part_id, at):
+        """Return a part's stock as of a date or time."""
+        row = self.conn.execute(BALANCE_SQL, (part_id, self._cutoff(at))).fetchone()
+        return row[0] if row else 0
+
+    def stock_as_of(self, at):
+        """Return {part_id: stock} for every part with stock as of a date or time.
+
+        Starts from the latest snapshot before then and reads only the movements recorded since it.
+        """
+        cutoff = self._cutoff(at)
+        snapshot = self.conn.execute('''SELECT id, last_movement_id FROM stock_snapshots WHERE last_movement_id <= ?
+                                        ORDER BY last_movement_id DESC, id DESC LIMIT 1''', (cutoff,)).fetchone()
+        snapshot_id, base = snapshot or (None, 0)
+        rows = self.conn.execute(AS_OF_SQL, {"base": base, "cutoff": cutoff, "snapshot": snapshot_id})
+        return {part_id: stock for part_id, stock in rows if stock}
+
+    def take_snapshot(self):
+        """Store every part's current stock as a snapshot and return its id."""
+        with transaction(self.conn):
+            last = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements").fetchone()[0]
+            snapshot_id = self.conn.execute("INSERT INTO stock_snapshots (last_movement_id) VALUES (?)",
+                                            (last,)).lastrowid
+            self.conn.execute('''INSERT INTO stock_snapshot_parts (snapshot_id, part_id, stock)
+                                 SELECT ?, id, stock FROM components WHERE COALESCE(stock, 0) != 0''', (snapshot_id,))
+        return snapshot_id
+
+    def snapshot_if_due(self, max_age_days=SNAPSHOT_INTERVAL_DAYS):
+        """Take a snapshot if stock has moved since the last one and that is more than max_age_days old.
+
+        Returns the new snapshot's id, or None if none was due.
+        """
+        last = self.conn.execute('''SELECT last_movement_id, taken_at >= datetime('now', ?) FROM stock_snapshots
+                                    ORDER BY id DESC LIMIT 1''', (f"-{max_age_days} days",)).fetchone()
+        latest = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements").fetchone()[0]
+        if latest == 0 or (last and (last[0] == latest or last[1])):
+            return None
+        return self.take_snapshot()
+
+    def usage(self, since, until=None):
+        """Yield the usage report for the days since..until (inclusive, until defaults to today) as dicts
+        of USAGE_FIELDS, most used first. days_left is how long the stock lasts at that rate.
+        """
+        until = until or today().isoformat()
+        days = (date.fromisoformat(until) - date.fromisoformat(since)).days + 1
+        if days < 1:
+            raise ValueError(f"{since} is after {until}")
+        for row in self.conn.execute(USAGE_SQL, (since, until)):
+            record = dict(zip(USAGE_FIELDS, row))
+            per_day = record["used"] / days
+            record["per_day"] = round(per_day, 2)
+            record["days_left"] = int(record["stock"] / per_day) if per_day else None
+            yield record
@@ -1,28 +1,67 @@
 import sys
 import os
 import sqlite3
-import subprocess
+import multiprocessing
 import json
+import time
 
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QTableWidgetItem, QPushButton, QLineEdit, QMessageBox,
-    QFileDialog, QHBoxLayout, QHeaderView, QSplashScreen, QVBoxLayout, QLabel, QComboBox, QAction, QMenuBar
+    QApplication, QMainWindow, QWidget, QMessageBox, QAbstractItemView, QProgressDialog, QInputDialog,
+    QFileDialog, QHBoxLayout, QHeaderView, QSplashScreen, QVBoxLayout, QLabel, QAction, QMenuBar,
+    QComboBox, QLineEdit, QCheckBox, QUndoStack
 )
-from PyQt5.QtCore import Qt, QThread
-from PyQt5.QtGui import QIcon, QPixmap, QColor, QFont, QPainter
-from PyQt5.QtGui import QIntValidator
+from PyQt5.QtCore import Qt, QEventLoop, QTimer
+from PyQt5.QtGui import QIcon, QPixmap, QColor, QFont, QPainter, QIntValidator, QKeySequence
 
 from db_ui import Ui_Form  
-from search import searchDatabase  
+from search import LiveSearch, DatasheetIndexWorker, DatasheetLinkWorker
+from database import connect, init_db, rebuild_search_index
+from repository import PartsRepository, Filters, ConflictError, VERSION
+from backup import create_backup, list_backups, restore_backup
+from importexport import (import_parts, export_parts, export_reorder_report, export_usage_report, read_records,
+                          read_bom)
+from ledger import StockLedger, days_ago
+from projects import ProjectRepository, ShortageError, SIMILAR
+from startup import StartupWorker, StartupProfile, timed
+from resources import SharedResources
+from diagnostics import Diagnostics, DiagnosticsDialog
+from datasheets import DatasheetCache
+from datasheet_links import DatasheetLinker, MOVED
+from batch_edit import SetFieldCommand, DeleteCommand, adjusted_stock, SET, ADD, SUBTRACT
+from datasheet_prefetch import DatasheetPrefetcher
+from viewer import DatasheetViewer
+from parts_model import (
+    PartsTableModel, StockDelegate, ComboDelegate, ButtonDelegate, FIELD_FOR_COLUMN,
+    COL_TYPE, COL_FOOTPRINT, COL_STOCK, COL_MIN_STOCK, COL_REORDER_QTY, COL_DATASHEET, COL_DELETE,
+    COL_DATASHEET_PATH, PAGE_SIZE
+)
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_FILE = os.path.join(BASE_DIR, 'db/components.db')
 DATA_FILE = os.path.join(BASE_DIR, 'data/data.json')
-BACKUP_FILE = os.path.join(BASE_DIR, 'db/backup.db')
+STYLE_FILE = os.path.join(BASE_DIR, 'style/style.qss')
+DIAGNOSTICS_LOG = os.path.join(BASE_DIR, 'logs/diagnostics.jsonl')
+ICON_FILE = os.path.join(BASE_DIR, 'icons/transistor.ico')
+BACKUP_DIR = os.path.join(BASE_DIR, 'db')
+BACKUP_FILE = os.path.join(BASE_DIR, 'db/backup.db')  # Single backup written by older versions
+
+# Local copies of linked datasheets; both settings can be overridden from the environment
+DATASHEET_CACHE_DIR = os.environ.get('LABPARTS_DATASHEET_CACHE', os.path.join(BASE_DIR, 'datasheets', 'cache'))
+DATASHEET_CACHE_BYTES = int(os.environ.get('LABPARTS_DATASHEET_CACHE_MB', '512')) * 1024 * 1024
+PREFETCH_MARGIN = 25  # Rows above and below the viewport whose datasheets are prefetched
+
+INDEX_DELAY_MS = 3000  # Datasheet indexing starts this long after the window opens, once startup has settled
+
+CHANGE_POLL_MS = 2000  # How often to look for parts changed by other LabParts instances sharing the database
+
+# Bundled viewer (Windows); other platforms use the system PDF viewer
+SUMATRA_PATH = os.path.join(BASE_DIR, 'thirdParty', 'SumatraPDF-3.5.2-64.exe')
 
 class MainWindow(QMainWindow): 
-    def __init__(self):
+    def __init__(self, startup=None, diagnostics=False):
+        """Build the window. startup is the StartupData prepared behind the splash screen, if any;
+        diagnostics starts with instrumentation recording."""
         super().__init__()
         self.ui = Ui_Form()  
         self.ui.setupUi(self)  
@@ -47,10 +86,22 @@ class MainWindow(QMainWindow):
         search_layout = QHBoxLayout()
         search_layout.addWidget(self.ui.searchField)
         search_layout.addWidget(self.ui.searchButton)
+        self.datasheet_search = QCheckBox("Search datasheets")
+        search_layout.addWidget(self.datasheet_search)
         main_layout.addLayout(search_layout)
 
-        # Add the parts table widget to the layout
-        main_layout.addWidget(self.ui.partsTable)
+        # Filter section (type, footprint, stock range, datasheet)
+        main_layout.addLayout(self.build_filter_bar())
+
+        # Add the parts table widget and the datasheet preview pane to the layout
+        table_layout = QHBoxLayout()
+        table_layout.addWidget(self.ui.partsTable)
+        self.preview = QLabel("No datasheet")
+        self.preview.setFixedWidth(240)
+        self.preview.setAlignment(Qt.AlignHCenter | Qt.AlignTop)
+        self.preview.setWordWrap(True)
+        table_layout.addWidget(self.preview)
+        main_layout.addLayout(table_layout)
 
         # Center the "Add Component" and "Save Database" buttons
         button_layout = QHBoxLayout()
@@ -69,20 +120,118 @@ class MainWindow(QMainWindow):
         footer_layout.addStretch()
         main_layout.addLayout(footer_layout)
 
+        # Load data from JSON file, unless it was already read during startup, and watch it for changes
+        self.load_data(startup)
+
+        # Open the database connection (already migrated if startup ran)
+        self.conn = connect(DATABASE_FILE)
+        self.setup_diagnostics(diagnostics)
+        self.repository = PartsRepository(self.conn)
+        self.initDB()
+
+        # Back the parts table with a lazily paged model
+        self.setup_table_model()
+        self.diagnostics.watch_model(self.model)
+
         # Set up column behaviors for the parts table
         self.setup_table_columns()
 
         # Connect the buttons to their respective functions
         self.setup_actions()
 
-        # Load data from JSON file
-        self.load_data()
+        # Datasheet cache, previews and prefetching around the viewport
+        self.setup_datasheet_cache()
 
-        # Open the database connection
-        self.conn = sqlite3.connect(DATABASE_FILE)
-        self.cursor = self.conn.cursor()
-        self.initDB()
-        self.loadDatabase()
+        # Pick up edits saved by other users of the same database
+        self.setup_change_polling()
+
+        # Keep the full-text index of linked datasheets up to date in the background
+        self.setup_datasheet_index()
+
+        if startup:
+            # Show the first page that was read during startup
+            self.model.beginStream(self.repository.all_parts_query())
+            self.model.appendRows(startup.first_page, done=True, exhausted=len(startup.first_page) < PAGE_SIZE)
+            self.update_facets()
+        else:
+            self.loadDatabase()
+
+    def setup_diagnostics(self, enabled):
+        """Create the (opt-in) instrumentation and trace this window's connection while it records."""
+        self.diagnostics = Diagnostics(DIAGNOSTICS_LOG, enabled, self)
+        self.diagnostics.toggled.connect(lambda _: self.diagnostics.attach(self.conn, "gui"))
+        self.diagnostics.attach(self.conn, "gui")
+        self.diagnostics_dialog = None
+
+    def showDiagnostics(self):
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(self.diagnostics, self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def setup_datasheet_index(self):
+        """Schedule the first datasheet indexing pass."""
+        self.index_worker = None
+        self.link_worker = None
+        self.index_again = False  # A datasheet was linked while a pass was running
+        QTimer.singleShot(INDEX_DELAY_MS, self.index_datasheets)
+
+    def index_datasheets(self):
+        """Index new and changed datasheets on a background thread (their text on a process pool)."""
+        if self.index_worker is not None:
+            self.index_again = True
+            return
+        self.index_worker = DatasheetIndexWorker(DATABASE_FILE, BASE_DIR, self)
+        self.index_worker.progress.connect(
+            lambda done, total: self.datasheet_search.setToolTip(f"Indexing datasheets: {done} of {total}"))
+        self.index_worker.finished.connect(self.on_datasheets_indexed)
+        self.index_worker.start()
+
+    def on_datasheets_indexed(self):
+        worker, self.index_worker = self.index_worker, None
+        if worker.error:
+            self.datasheet_search.setToolTip(f"Datasheet indexing failed: {worker.error}")
+        elif worker.stats:
+            self.datasheet_search.setToolTip(f"{worker.stats.indexed + worker.stats.unchanged} datasheets indexed"
+                                             + (f", {worker.stats.failed} unreadable" if worker.stats.failed else ""))
+            if worker.stats.indexed and self.datasheet_search.isChecked() and self.ui.searchField.text().strip():
+                self.perform_search()  # New matches may have come in
+        worker.deleteLater()
+        if self.index_again:
+            self.index_again = False
+            self.index_datasheets()
+
+    def setup_change_polling(self):
+        """Start polling the database for parts changed by other connections."""
+        self._data_version = self.repository.data_version()
+        self._change_seq = self.repository.last_change()
+        self.change_timer = QTimer(self)
+        self.change_timer.setInterval(CHANGE_POLL_MS)
+        self.change_timer.timeout.connect(self.poll_changes)
+        self.change_timer.start()
+
+    def poll_changes(self):
+        """Refresh the rows other users have changed since the last poll.
+
+        PRAGMA data_version only moves when another connection commits, so an idle poll costs no
+        query at all; otherwise just the changed parts are read from the change log and re-read.
+        """
+        try:
+            data_version = self.repository.data_version()
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            changes = self.repository.changes_since(self._change_seq)
+            if changes is None:
+                # Too far behind the change log: reload what is shown
+                self._change_seq = self.repository.last_change()
+                self.model.refresh()
+            else:
+                self._change_seq, changed = changes
+                self.model.refreshParts(changed)
+            self.update_facets()
+        except sqlite3.Error:
+            pass  # Try again on the next poll
 
     def setup_menu(self):
         """Set up the menu bar with Backup and Restore options."""
@@ -91,21 +240,282 @@ class MainWindow(QMainWindow):
         # File menu
         file_menu = menu_bar.addMenu('File')
 
-        # Backup Database action
+        # Backup Database actions
         backup_action = QAction('Backup Database', self)
-        backup_action.triggered.connect(self.backupDatabase)
+        backup_action.triggered.connect(lambda: self.backupDatabase())
         file_menu.addAction(backup_action)
 
+        compressed_backup_action = QAction('Backup Database (Compressed)', self)
+        compressed_backup_action.triggered.connect(lambda: self.backupDatabase(compress=True))
+        file_menu.addAction(compressed_backup_action)
+
         # Restore Database action
         restore_action = QAction('Restore Database', self)
         restore_action.triggered.connect(self.restoreDatabase)
         file_menu.addAction(restore_action)
 
+        # Import / Export actions
+        import_action = QAction('Import Parts...', self)
+        import_action.triggered.connect(self.importParts)
+        file_menu.addAction(import_action)
+
+        export_action = QAction('Export Parts...', self)
+        export_action.triggered.connect(self.exportParts)
+        file_menu.addAction(export_action)
+
+        reorder_action = QAction('Reorder Report...', self)
+        reorder_action.triggered.connect(self.exportReorderReport)
+        file_menu.addAction(reorder_action)
+
+        usage_action = QAction('Usage Report...', self)
+        usage_action.triggered.connect(self.exportUsageReport)
+        file_menu.addAction(usage_action)
+
+        # Rebuild Search Index action
+        reindex_action = QAction('Rebuild Search Index', self)
+        reindex_action.triggered.connect(self.rebuildSearchIndex)
+        file_menu.addAction(reindex_action)
+
+        # Bulk datasheet linking and the check for missing datasheets
+        link_action = QAction('Link Datasheets...', self)
+        link_action.triggered.connect(self.linkDatasheets)
+        file_menu.addAction(link_action)
+
+        check_links_action = QAction('Check Datasheet Links', self)
+        check_links_action.triggered.connect(lambda: self.scanDatasheetLinks(None))
+        file_menu.addAction(check_links_action)
+
+        diagnostics_action = QAction('Diagnostics...', self)
+        diagnostics_action.triggered.connect(self.showDiagnostics)
+        file_menu.addAction(diagnostics_action)
+
         # Exit action
         exit_action = QAction('Exit', self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
 
+        # Edit menu: changes to every selected row at once, each undone in one step
+        self.undo_stack = QUndoStack(self)
+        edit_menu = menu_bar.addMenu('Edit')
+        undo_action = self.undo_stack.createUndoAction(self, 'Undo')
+        undo_action.setShortcut(QKeySequence.Undo)
+        edit_menu.addAction(undo_action)
+        redo_action = self.undo_stack.createRedoAction(self, 'Redo')
+        redo_action.setShortcut(QKeySequence.Redo)
+        edit_menu.addAction(redo_action)
+        edit_menu.addSeparator()
+        self.batch_actions = []
+        for label, handler in (('Delete Selected Parts...', self.deleteSelected),
+                               ('Change Stock of Selected...', self.changeSelectedStock),
+                               ('Change Type of Selected...', lambda: self.changeSelected(COL_TYPE)),
+                               ('Change Footprint of Selected...', lambda: self.changeSelected(COL_FOOTPRINT))):
+            action = QAction(label, self)
+            action.triggered.connect(handler)
+            edit_menu.addAction(action)
+            self.batch_actions.append(action)
+
+        # Projects menu: BOMs, build checks and stock reservations
+        projects_menu = menu_bar.addMenu('Projects')
+        for label, handler in (('Import BOM...', self.importBom),
+                               ('Check Build...', self.checkBuild),
+                               ('Reserve Stock...', self.reserveStock),
+                               ('Release Reserved Stock...', self.releaseStock),
+                               ('Build (Use Stock)...', self.buildProject)):
+            action = QAction(label, self)
+            action.triggered.connect(handler)
+            projects_menu.addAction(action)
+
+    def setup_table_model(self):
+        """Attach the parts model and the per-column delegates to the parts table."""
+        self.model = PartsTableModel(self.repository, self)
+        table = self.ui.partsTable
+        table.setModel(self.model)
+
+        # Header clicks sort in the database (see PartsTableModel.sort); no indicator means the default order
+        table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        table.setSortingEnabled(True)
+
+        # Editors are only created for the cell being edited
+        table.setItemDelegateForColumn(COL_STOCK, StockDelegate(table))
+        table.setItemDelegateForColumn(COL_MIN_STOCK, StockDelegate(table))
+        table.setItemDelegateForColumn(COL_REORDER_QTY, StockDelegate(table))
+        table.setItemDelegateForColumn(COL_TYPE, ComboDelegate(self.resources.types, table))
+        table.setItemDelegateForColumn(COL_FOOTPRINT, ComboDelegate(self.resources.footprints, table))
+        table.setEditTriggers(QAbstractItemView.AllEditTriggers)
+
+        # Whole rows are selected (Ctrl/Shift-click for several) for the Edit menu's batch changes,
+        # which the table's right-click menu offers too
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        table.setContextMenuPolicy(Qt.ActionsContextMenu)
+        table.addActions(self.batch_actions)
+        self.batch_actions[0].setShortcut(QKeySequence.Delete)
+        self.batch_actions[0].setShortcutContext(Qt.WidgetWithChildrenShortcut)  # Only while the table has focus
+
+        # Buttons are painted by the delegates rather than built per row, and every click goes
+        # through on_table_action
+        self.table_actions = {
+            'link_datasheet': self.link_datasheet,
+            'view_datasheet': self.view_datasheet,
+            'delete': self.delete_part,
+        }
+        self.datasheet_delegate = ButtonDelegate(['Add', 'View'], ['link_datasheet', 'view_datasheet'], parent=table)
+        self.datasheet_delegate.triggered.connect(self.on_table_action)
+        table.setItemDelegateForColumn(COL_DATASHEET, self.datasheet_delegate)
+        self.delete_delegate = ButtonDelegate(['Delete'], ['delete'], object_name='deleteButton', parent=table)
+        self.delete_delegate.triggered.connect(self.on_table_action)
+        table.setItemDelegateForColumn(COL_DELETE, self.delete_delegate)
+
+    def build_filter_bar(self):
+        """Create the filter widgets and return their layout; the dropdowns are filled by update_facets."""
+        self.type_filter = QComboBox()
+        self.footprint_filter = QComboBox()
+        self.min_stock_filter = QLineEdit()
+        self.min_stock_filter.setPlaceholderText("Min stock")
+        self.max_stock_filter = QLineEdit()
+        self.max_stock_filter.setPlaceholderText("Max stock")
+        self.datasheet_filter = QCheckBox("Has datasheet")
+        self.low_stock_filter = QCheckBox("Below minimum")
+
+        layout = QHBoxLayout()
+        layout.addWidget(QLabel("Filter:"))
+        for widget in (self.type_filter, self.footprint_filter, self.min_stock_filter, self.max_stock_filter):
+            layout.addWidget(widget)
+        for edit in (self.min_stock_filter, self.max_stock_filter):
+            edit.setValidator(QIntValidator(0, 2 ** 31 - 1, edit))
+            edit.setFixedWidth(90)
+        layout.addWidget(self.datasheet_filter)
+        layout.addWidget(self.low_stock_filter)
+        layout.addStretch()
+
+        self.type_filter.activated.connect(self.apply_filters)
+        self.footprint_filter.activated.connect(self.apply_filters)
+        self.datasheet_filter.toggled.connect(self.apply_filters)
+        self.low_stock_filter.toggled.connect(self.apply_filters)
+        # Stock bounds are typed, so wait for the pause like the search field does
+        self.min_stock_filter.textEdited.connect(lambda _: self.live_search.schedule(self.ui.searchField.text()))
+        self.max_stock_filter.textEdited.connect(lambda _: self.live_search.schedule(self.ui.searchField.text()))
+        return layout
+
+    def current_filters(self):
+        """Return the Filters picked in the filter bar."""
+        min_stock, max_stock = self.min_stock_filter.text(), self.max_stock_filter.text()
+        return Filters(
+            type=self.type_filter.currentData(),
+            footprint=self.footprint_filter.currentData(),
+            min_stock=int(min_stock) if min_stock else None,
+            max_stock=int(max_stock) if max_stock else None,
+            has_datasheet=True if self.datasheet_filter.isChecked() else None,
+            low_stock=True if self.low_stock_filter.isChecked() else None,
+        )
+
+    def build_query(self, search_term):
+        """Return the PartsQuery for search_term with the current filters and column sort."""
+        order, descending = self.model.sortKey()
+        return self.repository.search_query(search_term, self.current_filters(), order, descending,
+                                            self.datasheet_search.isChecked())
+
+    def apply_filters(self, *_):
+        self.update_facets()
+        self.perform_search()
+
+    def update_facets(self):
+        """Refresh the filter dropdowns with how many parts each choice would leave."""
+        counts = self.repository.facet_counts(self.current_filters())
+        for combo, facet, values, everything in ((self.type_filter, "type", self.resources.type_list(), "All types"),
+                                                 (self.footprint_filter, "footprint", self.resources.footprint_list(),
+                                                  "All footprints")):
+            selected = combo.currentData()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(f"{everything} ({sum(counts[facet].values())})", None)
+            for value in values:
+                combo.addItem(f"{value} ({counts[facet].get(value, 0)})", value)
+            combo.setCurrentIndex(max(0, combo.findData(selected)) if selected is not None else 0)
+            combo.blockSignals(False)
+        self.datasheet_filter.setText(f"Has datasheet ({counts['has_datasheet'].get(True, 0)})")
+        self.low_stock_filter.setText(f"Below minimum ({self.repository.low_stock_count()})")
+
+    def setup_datasheet_cache(self):
+        """Create the datasheet cache and wire prefetching to scrolling and the preview to the current row."""
+        self.datasheet_cache = DatasheetCache(DATASHEET_CACHE_DIR, DATASHEET_CACHE_BYTES)
+        self.prefetcher = DatasheetPrefetcher(self.datasheet_cache, BASE_DIR, parent=self)
+        self.prefetcher.cached.connect(self.on_datasheet_cached)
+        self.prefetcher.thumbnailReady.connect(self.on_thumbnail_ready)
+        self.preview_digest = None
+        self.viewer = DatasheetViewer(SUMATRA_PATH)
+
+        # Prefetch once scrolling or loading settles
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(200)
+        self.prefetch_timer.timeout.connect(self.prefetch_visible)
+        self.ui.partsTable.verticalScrollBar().valueChanged.connect(self.prefetch_timer.start)
+        self.model.modelReset.connect(self.prefetch_timer.start)
+        self.model.rowsInserted.connect(self.prefetch_timer.start)
+
+        self.ui.partsTable.selectionModel().currentRowChanged.connect(lambda current, _: self.show_preview(current.row()))
+
+    def prefetch_visible(self):
+        """Cache and thumbnail the datasheets of the rows on screen and just around them."""
+        table = self.ui.partsTable
+        if self.model.rowCount() == 0:
+            return
+        top = table.rowAt(0)
+        bottom = table.rowAt(table.viewport().height() - 1)
+        top = max(0, top if top >= 0 else 0)
+        bottom = bottom if bottom >= 0 else self.model.rowCount() - 1
+        rows = range(max(0, top - PREFETCH_MARGIN), min(self.model.rowCount(), bottom + PREFETCH_MARGIN + 1))
+
+        linked = [(self.model.partId(row), self.model.datasheetPath(row)) for row in rows if self.model.datasheetPath(row)]
+        hashes = self.repository.datasheet_hashes([part_id for part_id, _ in linked])
+        for part_id, path in linked:
+            self.prefetcher.prefetch(part_id if part_id is not None else -1, path, hashes.get(part_id))
+
+    def on_datasheet_cached(self, part_id, digest):
+        """Remember the hash of a datasheet that was just copied into the cache."""
+        if part_id >= 0:
+            self.repository.set_datasheet_hash(part_id, digest)
+
+    def show_preview(self, row):
+        """Show the first-page thumbnail of the datasheet for the given row, if there is one."""
+        self.preview_digest = None
+        if row < 0 or not self.model.datasheetPath(row):
+            self.preview.setText("No datasheet")
+            return
+        part_id = self.model.partId(row)
+        digest = self.repository.datasheet_hashes([part_id]).get(part_id)
+        png = self.datasheet_cache.thumbnail_path(digest) if digest else None
+        if png and os.path.exists(png):
+            self.preview.setPixmap(QPixmap(png))
+            return
+        self.preview.setText("Loading preview...")
+        self.preview_digest = digest
+        self.prefetcher.prefetch(part_id if part_id is not None else -1, self.model.datasheetPath(row), digest)
+
+    def on_thumbnail_ready(self, digest, png):
+        """Show a freshly rendered thumbnail if it belongs to the current row."""
+        current = self.ui.partsTable.currentIndex()
+        if not current.isValid() or not self.model.datasheetPath(current.row()):
+            return
+        if self.preview_digest in (None, digest):
+            part_id = self.model.partId(current.row())
+            if self.repository.datasheet_hashes([part_id]).get(part_id, digest) == digest:
+                if png:
+                    self.preview.setPixmap(QPixmap(png))
+                else:
+                    self.preview.setText("No preview available")
+
+    def on_table_action(self, action, row):
+        """Run the handler of a button clicked in the table on the record shown at row.
+
+        Handlers get the record rather than the row: rows move while a dialog is open (a change
+        polled from another instance can drop or reload rows), so they look the row up again with
+        model.rowOf() whenever they need it.
+        """
+        if 0 <= row < self.model.rowCount():
+            self.table_actions[action](self.model.record(row))
+
     def setup_table_columns(self):
         """Set up the table columns and their behaviors."""
         # Stretch the Description column (column index 4) more than the other columns
@@ -120,338 +530,643 @@ class MainWindow(QMainWindow):
         header.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # Part column auto-resize
         header.setSectionResizeMode(5, QHeaderView.Interactive)  # Footprint column auto-resize
         header.setSectionResizeMode(6, QHeaderView.Interactive)  # Stock column auto-resize
-        header.setSectionResizeMode(7, QHeaderView.Interactive)  # Allow manual resizing for "Datasheet" column
-        header.setSectionResizeMode(8, QHeaderView.Interactive)  # Allow manual resizing for "Delete" column
-        header.setSectionResizeMode(9, QHeaderView.Interactive)  # Datasheet path auto-resize
+        header.setSectionResizeMode(COL_MIN_STOCK, QHeaderView.Interactive)  # Min Stock column
+        header.setSectionResizeMode(COL_REORDER_QTY, QHeaderView.Interactive)  # Reorder Qty column
+        header.setSectionResizeMode(COL_DATASHEET, QHeaderView.Interactive)  # Allow manual resizing for "Datasheet" column
+        header.setSectionResizeMode(COL_DELETE, QHeaderView.Interactive)  # Allow manual resizing for "Delete" column
+        header.setSectionResizeMode(COL_DATASHEET_PATH, QHeaderView.Interactive)  # Datasheet path auto-resize
 
         # Set specific widths for columns
         self.ui.partsTable.setColumnWidth(1, 75)  # "CUSID" column width
         self.ui.partsTable.setColumnWidth(2, 130)  # "Type" column width
         self.ui.partsTable.setColumnWidth(5, 130)  # "Footprint" column width
         self.ui.partsTable.setColumnWidth(6, 80)  # "Datasheet" column width
-        self.ui.partsTable.setColumnWidth(7, 200)  # "Datasheet" column width
-        self.ui.partsTable.setColumnWidth(8, 150)  # "Delete" column width
-        self.ui.partsTable.setColumnWidth(9, 100)  # "Datasheet Path" column width
+        self.ui.partsTable.setColumnWidth(COL_MIN_STOCK, 90)  # "Min Stock" column width
+        self.ui.partsTable.setColumnWidth(COL_REORDER_QTY, 90)  # "Reorder Qty" column width
+        self.ui.partsTable.setColumnWidth(COL_DATASHEET, 200)  # "Datasheet" column width
+        self.ui.partsTable.setColumnWidth(COL_DELETE, 150)  # "Delete" column width
+        self.ui.partsTable.setColumnWidth(COL_DATASHEET_PATH, 100)  # "Datasheet Path" column width
 
         # Set larger row heights
         self.ui.partsTable.verticalHeader().setDefaultSectionSize(50)  
 
         # Hide the Datasheet Path column
-        self.ui.partsTable.setColumnHidden(9, True)
+        self.ui.partsTable.setColumnHidden(COL_DATASHEET_PATH, True)
 
     def setup_actions(self):
         """Connect buttons to their respective functions"""
         self.ui.addComponentButton.clicked.connect(self.add_component)
         self.ui.saveDatabaseButton.clicked.connect(self.saveDatabase)
         self.ui.searchButton.clicked.connect(self.perform_search) 
-
-    def backupDatabase(self):
-        """Backup the current database to a backup file."""
+        self.ui.searchField.returnPressed.connect(self.perform_search)
+
+        # Search as the user types, off the GUI thread
+        self.live_search = LiveSearch(self, DATABASE_FILE)
+        self.ui.searchField.textEdited.connect(self.live_search.schedule)
+        self.datasheet_search.toggled.connect(lambda _: self.perform_search())
+
+    def progressCallback(self, title):
+        """Return a progress dialog and a backup-API progress callback that drives it."""
+        dialog = QProgressDialog(title, None, 0, 0, self)
+        dialog.setWindowTitle(title)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+
+        def callback(status, remaining, total):
+            dialog.setMaximum(total)
+            dialog.setValue(total - remaining)
+            QApplication.processEvents()
+
+        return dialog, callback
+
+    def backupDatabase(self, compress=False):
+        """Backup the current database to a new timestamped backup file."""
+        dialog, progress = self.progressCallback("Backing up database...")
         try:
-            if os.path.exists(DATABASE_FILE):
-                # Copy the database file to a backup
-                with open(DATABASE_FILE, 'rb') as db_file:
-                    with open(BACKUP_FILE, 'wb') as backup_file:
-                        backup_file.write(db_file.read())
-                QMessageBox.information(self, "Backup Successful", "Database backup created successfully!")
-            else:
-                QMessageBox.warning(self, "Backup Failed", "No database file found to backup.")
+            path = create_backup(self.conn, BACKUP_DIR, compress=compress, progress=progress)
+            dialog.close()
+            QMessageBox.information(self, "Backup Successful",
+                                    f"Database backup created successfully!\n{os.path.relpath(path, BASE_DIR)}")
         except Exception as e:
+            dialog.close()
             QMessageBox.critical(self, "Error", f"An error occurred while creating backup: {str(e)}")
 
     def restoreDatabase(self):
-        """Restore the database from a backup file."""
+        """Restore the database from a chosen backup file."""
+        backups = list_backups(BACKUP_DIR, BACKUP_FILE)
+        if not backups:
+            QMessageBox.warning(self, "Restore Failed", "No backup file found to restore from.")
+            return
+
+        names = [os.path.relpath(path, BASE_DIR) for path in backups]
+        name, ok = QInputDialog.getItem(self, "Restore Database",
+                                        "Replace the current database with (unsaved changes are discarded):",
+                                        names, 0, False)
+        if not ok:
+            return
+
+        dialog, progress = self.progressCallback("Restoring database...")
         try:
-            if os.path.exists(BACKUP_FILE):
-                # Replace the current database with the backup
-                with open(BACKUP_FILE, 'rb') as backup_file:
-                    with open(DATABASE_FILE, 'wb') as db_file:
-                        db_file.write(backup_file.read())
-                QMessageBox.information(self, "Restore Successful", "Database restored from backup successfully!")
-                # Reload the database in the UI
-                self.loadDatabase()
-            else:
-                QMessageBox.warning(self, "Restore Failed", "No backup file found to restore from.")
+            restore_backup(self.conn, backups[names.index(name)], progress=progress)
+            dialog.close()
         except Exception as e:
+            dialog.close()
             QMessageBox.critical(self, "Error", f"An error occurred while restoring from backup: {str(e)}")
+            return
 
+        # The restored file may predate the search index, and the search worker must not reuse its old connection
+        self.initDB()
+        self.repository.clear_cache()
+        self.live_search.reconnect()
+        self.model.discardChanges()
+        self.undo_stack.clear()  # Its changes were made to a database that is gone
+        QMessageBox.information(self, "Restore Successful", "Database restored from backup successfully!")
+        # Reload the database in the UI
+        self.loadDatabase()
+
+    def importParts(self):
+        """Bulk import parts from a CSV or JSON file, skipping ones already in the database."""
+        file_name, _ = QFileDialog.getOpenFileName(self, 'Import Parts', '',
+                                                   'Parts files (*.csv *.json *.jsonl *.ndjson);;All Files (*)')
+        if not file_name:
+            return
+        try:
+            added, updated, skipped = import_parts(self.conn, read_records(file_name))
+        except (ValueError, OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while importing: {str(e)}")
+            return
+        QMessageBox.information(self, "Import Complete", f"{added} parts added, {updated} updated, {skipped} skipped as duplicates or blank.")
+        self.loadDatabase()
 
+    def exportParts(self):
+        """Export every part to a CSV or JSON file."""
+        file_name, _ = QFileDialog.getSaveFileName(self, 'Export Parts', 'parts.csv',
+                                                   'CSV (*.csv);;JSON (*.json);;JSON lines (*.jsonl)')
+        if not file_name:
+            return
+        try:
+            count = export_parts(self.conn, file_name)
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while exporting: {str(e)}")
+            return
+        QMessageBox.information(self, "Export Complete", f"{count} parts exported.")
+
+    def exportReorderReport(self):
+        """Export the parts below their minimum stock, with how many of each to order."""
+        low = self.repository.low_stock_count()
+        if not low:
+            QMessageBox.information(self, "Reorder Report", "No parts are below their minimum stock.")
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, 'Reorder Report', 'reorder.csv',
+                                                   'CSV (*.csv);;JSON (*.json);;JSON lines (*.jsonl)')
+        if not file_name:
+            return
+        try:
+            count = export_reorder_report(self.repository, file_name)
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while writing the reorder report: {str(e)}")
+            return
+        groups = sum(1 for summary in self.repository.stock_summary() if summary.low)
+        QMessageBox.information(self, "Reorder Report",
+                                f"{count} parts to reorder across {groups} type/footprint groups.")
+
+    def exportUsageReport(self):
+        """Export how much of each part was used over the last N days, and how long its stock will last."""
+        days, ok = QInputDialog.getInt(self, "Usage Report", "Report on the last N days:", 90, 1, 3650)
+        if not ok:
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, 'Usage Report', 'usage.csv',
+                                                   'CSV (*.csv);;JSON (*.json);;JSON lines (*.jsonl)')
+        if not file_name:
+            return
+        try:
+            count = export_usage_report(StockLedger(self.conn), file_name, days_ago(days - 1))
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while writing the usage report: {str(e)}")
+            return
+        QMessageBox.information(self, "Usage Report", f"{count} parts had stock movements in the last {days} days.")
+
+    def importBom(self):
+        """Load a bill of materials into a project (new or existing) and match its lines onto parts."""
+        file_name, _ = QFileDialog.getOpenFileName(self, 'Import BOM', '',
+                                                   'BOM files (*.csv *.json *.jsonl *.ndjson);;All Files (*)')
+        if not file_name:
+            return
+        projects = ProjectRepository(self.conn)
+        default = os.path.splitext(os.path.basename(file_name))[0]
+        name, ok = QInputDialog.getText(self, "Import BOM", "Project name:", text=default)
+        if not ok or not name.strip():
+            return
+        try:
+            project = projects.find(name.strip())
+            if project and QMessageBox.question(
+                    self, "Import BOM", f"Replace the BOM of {project.name}?",
+                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No) != QMessageBox.Yes:
+                return
+            project_id, lines, matched = projects.import_bom(name, read_bom(file_name))
+            similar = projects.similar(project_id)
+            if similar:
+                ask = QMessageBox(QMessageBox.Question, "Import BOM",
+                                  f"{len(similar)} BOM lines only match a part with a different ordering code. "
+                                  "Use those parts for them?", QMessageBox.Yes | QMessageBox.No, self)
+                ask.setDefaultButton(QMessageBox.No)
+                ask.setDetailedText("\n".join(f"Line {line.line}: {line.part} -> {part}" for line, part in similar))
+                if ask.exec_() == QMessageBox.Yes:
+                    matched += projects.confirm_similar(project_id)
+            unmatched = projects.unmatched(project_id)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while importing the BOM: {str(e)}")
+            return
+        box = QMessageBox(QMessageBox.Information, "Import BOM",
+                          f"{lines} BOM lines loaded, {matched} matched to parts.", QMessageBox.Ok, self)
+        if unmatched:
+            box.setInformativeText(f"Lines matching no part: {len(unmatched)}. Add the parts, then import the BOM again.")
+            box.setDetailedText("\n".join(f"Line {line.line}: {line.part or line.cus_id or ''} {line.reference or ''}"
+                                          + (" (only a similar part)" if line.match == SIMILAR else "")
+                                          for line in unmatched))
+        box.exec_()
+
+    def chooseProject(self, title):
+        """Ask for a project and a number of boards. Returns (Project, boards) or (None, 0)."""
+        projects = ProjectRepository(self.conn).projects()
+        if not projects:
+            QMessageBox.information(self, title, "There are no projects yet. Use Projects > Import BOM... first.")
+            return None, 0
+        names = [project.name for project in projects]
+        name, ok = QInputDialog.getItem(self, title, "Project:", names, 0, False)
+        if not ok:
+            return None, 0
+        project = projects[names.index(name)]
+        boards, ok = QInputDialog.getInt(self, title, "Number of boards:", max(project.reserved_boards, 1), 1, 100000)
+        return (project, boards) if ok else (None, 0)
+
+    def showBuildCheck(self, title, text, check, icon=QMessageBox.Information):
+        """Show a build check, with the shortages and unmatched lines in the details."""
+        short = [requirement for requirement in check.requirements if requirement.short]
+        box = QMessageBox(icon, title, text, QMessageBox.Ok, self)
+        box.setInformativeText(f"{len(check.requirements)} parts needed, {len(short)} short, "
+                               f"{len(check.unmatched)} BOM lines unmatched. "
+                               f"The stock available covers {check.buildable} boards.")
+        details = [f"{requirement.part or requirement.cus_id}: need {requirement.needed}, "
+                   f"available {requirement.available}, short {requirement.short}" for requirement in short]
+        details += [f"Line {line.line} {'only similar to a part' if line.match == SIMILAR else 'unmatched'}: "
+                    f"{line.part or line.cus_id or ''} {line.reference or ''}" for line in check.unmatched]
+        if details:
+            box.setDetailedText("\n".join(details))
+        box.exec_()
+
+    def checkBuild(self):
+        """Check whether a number of boards of a project can be built from stock."""
+        project, boards = self.chooseProject("Check Build")
+        if project is None:
+            return
+        try:
+            check = ProjectRepository(self.conn).check(project.id, boards)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while checking the build: {str(e)}")
+            return
+        ready = not check.unmatched and not any(requirement.short for requirement in check.requirements)
+        self.showBuildCheck("Check Build", f"{boards} x {project.name} "
+                            + ("can be built." if ready else "can't be built from stock."), check)
+
+    def reserveStock(self):
+        """Hold the stock for a number of boards so other projects can't use it."""
+        project, boards = self.chooseProject("Reserve Stock")
+        if project is None:
+            return
+        try:
+            check = ProjectRepository(self.conn).reserve(project.id, boards)
+        except ShortageError as e:
+            self.showBuildCheck("Reserve Stock", "Nothing was reserved.", e.check, QMessageBox.Warning)
+            return
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while reserving stock: {str(e)}")
+            return
+        QMessageBox.information(self, "Reserve Stock", f"Stock for {boards} x {project.name} reserved "
+                                f"({len(check.requirements)} parts).")
+
+    def releaseStock(self):
+        """Give back the stock reserved for a project."""
+        reserved = [project for project in ProjectRepository(self.conn).projects() if project.reserved_boards]
+        if not reserved:
+            QMessageBox.information(self, "Release Reserved Stock", "No stock is reserved for any project.")
+            return
+        labels = [f"{project.name} ({project.reserved_boards} boards)" for project in reserved]
+        label, ok = QInputDialog.getItem(self, "Release Reserved Stock", "Project:", labels, 0, False)
+        if not ok:
+            return
+        try:
+            ProjectRepository(self.conn).release(reserved[labels.index(label)].id)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while releasing stock: {str(e)}")
+
+    def buildProject(self):
+        """Take the parts for a number of boards out of stock, all at once or not at all."""
+        project, boards = self.chooseProject("Build")
+        if project is None:
+            return
+        reply = QMessageBox.question(self, "Build", f"Take the parts for {boards} x {project.name} out of stock?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            check = ProjectRepository(self.conn).build(project.id, boards)
+        except ShortageError as e:
+            self.showBuildCheck("Build", "No stock was used.", e.check, QMessageBox.Warning)
+            return
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while using stock: {str(e)}")
+            return
+        self.model.refreshParts(requirement.part_id for requirement in check.requirements)
+        self.update_facets()
+        QMessageBox.information(self, "Build", f"Stock used for {boards} x {project.name} "
+                                f"({len(check.requirements)} parts).")
 
     def perform_search(self):
-        """Execute the search operation using the imported searchDatabase function"""
+        """Execute the search operation right away on the background search worker"""
         search_term = self.ui.searchField.text().strip()
-        searchDatabase(self, self.conn, search_term) 
+        self.live_search.searchNow(search_term)
+
+    def closeEvent(self, event):
+        """Stop background workers before the window goes away."""
+        self.live_search.shutdown()
+        self.prefetcher.shutdown()
+        self.diagnostics.close()
+        self.viewer.shutdown()
+        for worker in (self.index_worker, self.link_worker):
+            if worker is not None:
+                worker.requestInterruption()  # Stops after the files or folders being read
+                worker.wait()
+        super().closeEvent(event)
 
 
     def initDB(self):
-        """Create the components table if it doesn't exist"""
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS components (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cus_id TEXT,
-            type TEXT,
-            part TEXT,
-            description TEXT,
-            footprint TEXT,
-            stock INTEGER,
-            datasheetpath TEXT
-        )''')
-        self.conn.commit()
+        """Create or upgrade the database schema and its search index"""
+        init_db(self.conn)
+
+    def rebuildSearchIndex(self):
+        """Re-index every part for full-text search."""
+        try:
+            rebuild_search_index(self.conn)
+            QMessageBox.information(self, "Search Index", "Search index rebuilt successfully!")
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while rebuilding the search index: {str(e)}")
 
     def loadDatabase(self):
         """Load components from the SQLite database into the table"""
-        self.ui.partsTable.setRowCount(0)  
-        self.cursor.execute("SELECT id, cus_id, type, part, description, footprint, stock, datasheetpath FROM components")
-        rows = self.cursor.fetchall()
-
-        for row_data in rows:
-            row_pos = self.ui.partsTable.rowCount()
-            self.ui.partsTable.insertRow(row_pos)
-
-            for column, value in enumerate(row_data):
-                if column == 6:  # Stock column (editable)
-                    stock_input = QLineEdit()
-                    stock_input.setValidator(QIntValidator())
-                    stock_input.setText(str(value))
-                    self.ui.partsTable.setCellWidget(row_pos, column, stock_input)
-                elif column == 0:  # ID column (non-editable)
-                    id_item = QTableWidgetItem(str(value))
-                    id_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled) 
-                    self.ui.partsTable.setItem(row_pos, column, id_item)
-                elif column == 7:  # Datasheet path column (read-only)
-                    # Store the datasheet path in the Datasheet Path column (column 9)
-                    datasheet_path_item = QTableWidgetItem(str(value))
-                    self.ui.partsTable.setItem(row_pos, 9, datasheet_path_item)
-                elif column == 5:  # Footprint column (QComboBox)
-                    combo = QComboBox()
-                    combo.addItems(self.footprints)  # Use the loaded footprints
-                    combo.setEditable(True)  # Allow users to type their own value
-                    combo.setCurrentText(value)  # Set the current value to what's in the database
-                    self.ui.partsTable.setCellWidget(row_pos, column, combo)
-                elif column == 2:  # Type column (QComboBox)
-                    type_combo = QComboBox()
-                    type_combo.addItems(self.types)  # Use the loaded types
-                    type_combo.setEditable(True)  # Allow users to type their own value
-                    type_combo.setCurrentText(value)  # Set the current value to what's in the database
-                    self.ui.partsTable.setCellWidget(row_pos, column, type_combo)
-                else:
-                    self.ui.partsTable.setItem(row_pos, column, QTableWidgetItem(str(value)))
-
-            # Add Datasheet buttons in the Datasheet column (column 7)
-            add_datasheet_button = QPushButton('Add')
-            view_datasheet_button = QPushButton('View')
-            add_datasheet_button.clicked.connect(lambda _, r=row_pos: self.link_datasheet(r))
-            view_datasheet_button.clicked.connect(lambda _, r=row_pos: self.view_datasheet(r))
-            self.ui.partsTable.setCellWidget(row_pos, 7, self.create_button_widget(add_datasheet_button, view_datasheet_button))
-
-            # Add Delete button in the Delete column (column 8)
-            delete_button = QPushButton('Delete')
-            delete_button.setObjectName('deleteButton')  # Assign the deleteButton ID for custom styling
-            self.ui.partsTable.setCellWidget(row_pos, 8, self.create_button_widget(delete_button))
-            delete_button.clicked.connect(lambda _, r=row_pos: self.delete_part(r))  # Capture row_pos
-            self.ui.partsTable.setCellWidget(row_pos, 8, delete_button)
-
-    def load_data(self):
-        """Load types and footprints from a JSON file."""
+        self.model.setQuery(self.build_query(""))
+        self.update_facets()
+
+    def load_data(self, startup=None):
+        """Load types and footprints from a JSON file into the models the editors share.
+
+        data.json and the stylesheet are then watched and reloaded whenever they are saved.
+        """
         try:
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                self.types = data.get("types", [])
-                self.footprints = data.get("footprints", [])
+            self.resources = SharedResources(DATA_FILE, STYLE_FILE,
+                                             (startup.types, startup.footprints) if startup else None, self)
         except FileNotFoundError:
             QMessageBox.critical(self, "Error", f"Data file '{DATA_FILE}' not found.")
             sys.exit(1)
         except json.JSONDecodeError as e:
             QMessageBox.critical(self, "Error", f"Error reading JSON data: {e}")
             sys.exit(1)
-
-    def create_button_widget(self, add_button, view_button):
-        """Helper function to create a widget with Add and View buttons"""
-        widget = QWidget()
-        layout = QHBoxLayout()
-        layout.addWidget(add_button)
-        layout.addWidget(view_button)
-        layout.setContentsMargins(0, 0, 0, 0)
-        widget.setLayout(layout)
-        return widget
-
+        self.resources.vocabulariesChanged.connect(self.update_facets)
+        self.resources.stylesheetChanged.connect(QApplication.instance().setStyleSheet)
+        self.resources.reloadFailed.connect(lambda path, message: QMessageBox.warning(
+            self, "Reload Failed", f"Couldn't reload {os.path.basename(path)}, still using the previous version: {message}"))
 
     def add_component(self):
         """Add a new component row to the table"""
-        row_pos = self.ui.partsTable.rowCount()
-        self.ui.partsTable.insertRow(row_pos)
-
-        for col in range(10):  # Adjust loop to cover all 10 columns
-            if col == 0:  # ID column (non-editable, auto-generated)
-                id_item = QTableWidgetItem("Auto-ID")
-                id_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)  # Make ID column non-editable
-                self.ui.partsTable.setItem(row_pos, col, id_item)
-
-            elif col == 2:  # Type column (QComboBox)
-                type_combo = QComboBox()
-                type_combo.addItems(self.types)  # Use the loaded types
-                type_combo.setEditable(True)  # Allow users to type their own value
-                self.ui.partsTable.setCellWidget(row_pos, col, type_combo)
-
-            elif col == 5:  # Footprint column (QComboBox)
-                combo = QComboBox()
-                combo.addItems(self.footprints)  # Use the loaded footprints
-                combo.setEditable(True)  # Allow users to type their own value
-                self.ui.partsTable.setCellWidget(row_pos, col, combo)
-
-            elif col == 6:  # Stock column with QLineEdit
-                stock_input = QLineEdit()
-                stock_input.setValidator(QIntValidator())  # Ensure only integers are entered
-                self.ui.partsTable.setCellWidget(row_pos, col, stock_input)
-            elif col == 7:  # Datasheet buttons
-                add_datasheet_button = QPushButton('Add')
-                view_datasheet_button = QPushButton('View')
-                add_datasheet_button.clicked.connect(lambda _, r=row_pos: self.link_datasheet(r))
-                view_datasheet_button.clicked.connect(lambda _, r=row_pos: self.view_datasheet(r))
-                self.ui.partsTable.setCellWidget(row_pos, 7, self.create_button_widget(add_datasheet_button, view_datasheet_button))
-            elif col == 8:  # Delete button
-                delete_button = QPushButton('Delete')
-                delete_button.setObjectName('deleteButton')  # Assign the deleteButton ID for custom styling
-                self.ui.partsTable.setCellWidget(row_pos, 8, self.create_button_widget(delete_button))  # Use the updated function here
-                delete_button.clicked.connect(lambda _, r=row_pos: self.delete_part(r))
-                self.ui.partsTable.setCellWidget(row_pos, 8, delete_button)
-            elif col == 9:  # Datasheet Path (empty for new component)
-                datasheet_path_item = QTableWidgetItem("")
-                self.ui.partsTable.setItem(row_pos, col, datasheet_path_item)
-            else:
-                self.ui.partsTable.setItem(row_pos, col, QTableWidgetItem(""))
+        types, footprints = self.resources.type_list(), self.resources.footprint_list()
+        row_pos = self.model.addPart(types[0] if types else "", footprints[0] if footprints else "")
+        self.ui.partsTable.scrollToBottom()
+        self.ui.partsTable.setCurrentIndex(self.model.index(row_pos, 1))
 
     def saveDatabase(self):
-        """Save the table data into the SQLite database"""
-        self.cursor.execute("DELETE FROM components")  # Clear current records
-
-        for row in range(self.ui.partsTable.rowCount()):
-            id_item = self.ui.partsTable.item(row, 0)
-            cus_id_item = self.ui.partsTable.item(row, 1)
-
-            # Extract type from QComboBox
-            type_widget = self.ui.partsTable.cellWidget(row, 2)
-            if isinstance(type_widget, QComboBox):
-                type_value = type_widget.currentText()
-            else:
-                type_value = ""
-
-            part_item = self.ui.partsTable.item(row, 3)
-            desc_item = self.ui.partsTable.item(row, 4)
-
-            # Extract footprint from QComboBox
-            footprint_widget = self.ui.partsTable.cellWidget(row, 5)
-            if isinstance(footprint_widget, QComboBox):
-                footprint_value = footprint_widget.currentText()
-            else:
-                footprint_value = ""
-
-            # Stock column with QLineEdit
-            stock_input = self.ui.partsTable.cellWidget(row, 6)
-            if stock_input and isinstance(stock_input, QLineEdit):
-                stock_value = stock_input.text() if stock_input.text().isdigit() else '0'
-            else:
-                stock_value = '0'
-
-            datasheet_path_item = self.ui.partsTable.item(row, 9)  # Datasheet Path is in column 9
-
-            self.cursor.execute('''INSERT INTO components (cus_id, type, part, description, footprint, stock, datasheetpath)
-                                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                                (cus_id_item.text() if cus_id_item else "",
-                                 type_value,
-                                 part_item.text() if part_item else "",
-                                 desc_item.text() if desc_item else "",
-                                 footprint_value,
-                                 stock_value,
-                                 datasheet_path_item.text() if datasheet_path_item else ""))
-
-        self.conn.commit()
-        QMessageBox.information(self, "Database Saved", "Database saved successfully!")
-
-
-    def delete_part(self, row):
-        """Delete the selected part from the table and database"""
-        id_item = self.ui.partsTable.item(row, 0)  # Assuming ID is in column 0 (part ID)
-        if id_item:
-            part_id = id_item.text()  # Get the ID of the part
-            
-            # Confirm deletion
-            reply = QMessageBox.question(self, 'Delete Part', f"Are you sure you want to delete part ID {part_id}?",
-                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        """Save the added, edited and deleted rows into the SQLite database"""
+        if not self.model.hasPendingChanges():
+            QMessageBox.information(self, "Database Saved", "No changes to save.")
+            return
 
+        try:
+            with self.diagnostics.action("save", self.conn):
+                added, updated, deleted = self.commitChanges(*self.model.pendingChanges())
+        except ConflictError as e:
+            ids = ", ".join(str(part_id) for part_id in sorted(e.conflicts))
+            reply = QMessageBox.question(
+                self, "Save Conflict",
+                f"{len(e.conflicts)} of the parts you changed were edited or deleted by someone else since you "
+                f"loaded them (ID {ids}). Nothing has been saved.\n\n"
+                "Discard your changes to those parts, show their current values and save the rest?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
-                # Remove the row from the table
-                self.ui.partsTable.removeRow(row)
-
-                # Delete the part from the database using its unique ID
-                self.cursor.execute("DELETE FROM components WHERE id = ?", (part_id,))
-                self.conn.commit()
-
-                QMessageBox.information(self, "Part Deleted", f"Part ID {part_id} has been deleted successfully!")
-            else:
-                QMessageBox.information(self, "Cancelled", "Deletion cancelled.")
-
+                self.model.discardEdits(e.conflicts)
+                if self.model.hasPendingChanges():
+                    self.saveDatabase()
+            return
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while saving: {str(e)}")
+            return
+
+        QMessageBox.information(self, "Database Saved",
+                                f"Database saved successfully! {added} added, {updated} updated, {deleted} deleted.")
+
+    def commitChanges(self, inserted=(), updated=(), deleted=()):
+        """Write the given pending changes in one transaction and return (added, updated, deleted) counts.
+
+        Raises ConflictError, saving nothing, if another user has changed any of the parts since they were loaded.
+        """
+        result = self.repository.save(inserted, updated, deleted)
+        self.model.markSaved(inserted, result.new_ids, updated, deleted, result.versions)
+        self.update_facets()
+        return len(result.new_ids), result.updated, result.deleted
+
+
+    def delete_part(self, record):
+        """Delete the given part from the table and database"""
+        part_id = record[0]
+        if part_id is None:
+            # Never saved, so there is nothing to remove from the database
+            self.model.removePart(self.model.rowOf(record))
+            return
+
+        # Confirm deletion
+        reply = QMessageBox.question(self, 'Delete Part', f"Are you sure you want to delete part ID {part_id}?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+
+        if reply == QMessageBox.Yes:
+            # Delete the part from the database right away, leaving other unsaved edits pending. The
+            # row is looked up again, as the table may have been reloaded while the question was open.
+            row = self.model.rowOf(record)
+            version = self.model.version(row) if row >= 0 else record[VERSION]
+            try:
+                with self.diagnostics.action("delete", self.conn):
+                    self.commitChanges(deleted=[(part_id, version)])
+            except ConflictError:
+                self.model.refreshParts([part_id])
+                QMessageBox.warning(self, "Part Changed",
+                                    f"Part ID {part_id} was edited by someone else since you loaded it, so it has not "
+                                    "been deleted. The table now shows their changes.")
+                return
+            except sqlite3.Error as e:
+                QMessageBox.critical(self, "Error", f"An error occurred while deleting part ID {part_id}: {str(e)}")
+                return
+
+            # Remove the row from the table, wherever it is now
+            row = self.model.rowOf(record)
+            if row >= 0:
+                self.model.dropPart(row)
+
+            QMessageBox.information(self, "Part Deleted", f"Part ID {part_id} has been deleted successfully!")
+        else:
+            QMessageBox.information(self, "Cancelled", "Deletion cancelled.")
+
+
+    def selectedRecords(self, title):
+        """Return the saved records of the selected rows, in row order, and how many unsaved rows were selected.
+
+        Tells the user and returns ([], 0) if no saved part is selected.
+        """
+        rows = sorted({index.row() for index in self.ui.partsTable.selectionModel().selectedIndexes()})
+        records = [self.model.record(row) for row in rows]
+        saved = [record for record in records if record[0] is not None]
+        if not saved:
+            QMessageBox.information(self, title, "Select the rows of the parts to change first (unsaved rows "
+                                                 "can't be changed together; save them first).")
+            return [], 0
+        return saved, len(records) - len(saved)
+
+    def deleteSelected(self):
+        """Delete every selected part in one step, after one confirmation."""
+        records, unsaved = self.selectedRecords("Delete Parts")
+        if not records:
+            return
+        box = QMessageBox(QMessageBox.Question, "Delete Parts", f"Are you sure you want to delete {len(records)} parts?",
+                          QMessageBox.Yes | QMessageBox.No, self)
+        box.setDefaultButton(QMessageBox.No)
+        box.setInformativeText("Edit > Undo brings them back."
+                               + (f" {unsaved} unsaved rows are left out." if unsaved else ""))
+        box.setDetailedText("\n".join(f"ID {record[0]}: {record[3] or ''} {record[4] or ''}" for record in records))
+        if box.exec_() != QMessageBox.Yes:
+            return
+        self.undo_stack.push(DeleteCommand(self, {record[0]: record[VERSION] for record in records},
+                                           f"Delete {len(records)} parts"))
+
+    def changeSelectedStock(self):
+        """Set the stock of every selected part to an amount, or add or subtract one, in one step."""
+        title = "Change Stock"
+        records, unsaved = self.selectedRecords(title)
+        if not records:
+            return
+        modes = {"Set to": SET, "Add": ADD, "Subtract": SUBTRACT}
+        label = f"Stock of {len(records)} parts" + (f" ({unsaved} unsaved rows left out)" if unsaved else "") + ":"
+        mode, ok = QInputDialog.getItem(self, title, label, list(modes), 0, False)
+        if not ok:
+            return
+        amount, ok = QInputDialog.getInt(self, title, f"{mode}:", 0 if modes[mode] == SET else 1, 0, 1000000000)
+        if not ok:
+            return
+        stock = FIELD_FOR_COLUMN[COL_STOCK]
+        values = {record[0]: adjusted_stock(record[stock], modes[mode], amount) for record in records}
+        text = {SET: f"Set stock of {len(records)} parts to {amount}",
+                ADD: f"Add {amount} to the stock of {len(records)} parts",
+                SUBTRACT: f"Subtract {amount} from the stock of {len(records)} parts"}[modes[mode]]
+        self.undo_stack.push(SetFieldCommand(self, COL_STOCK, values, {record[0]: record[VERSION] for record in records},
+                                             text))
+
+    def changeSelected(self, column):
+        """Change the type or footprint of every selected part in one step."""
+        name = "type" if column == COL_TYPE else "footprint"
+        title = f"Change {name.title()}"
+        records, unsaved = self.selectedRecords(title)
+        if not records:
+            return
+        choices = self.resources.type_list() if column == COL_TYPE else self.resources.footprint_list()
+        current = records[0][FIELD_FOR_COLUMN[column]]
+        label = f"{name.title()} of {len(records)} parts" + (f" ({unsaved} unsaved rows left out)" if unsaved else "") + ":"
+        value, ok = QInputDialog.getItem(self, title, label, choices, choices.index(current) if current in choices else 0,
+                                         True)
+        if not ok or not value.strip():
+            return
+        values = {record[0]: value.strip() for record in records}
+        self.undo_stack.push(SetFieldCommand(self, column, values, {record[0]: record[VERSION] for record in records},
+                                             f"Change {name} of {len(records)} parts to {value.strip()}"))
+
+    def linkDatasheets(self):
+        """Link the datasheets in a folder (and its subfolders) to parts by the part numbers in their names."""
+        root = QFileDialog.getExistingDirectory(self, 'Link Datasheets', BASE_DIR)
+        if root:
+            self.scanDatasheetLinks(root)
+
+    def scanDatasheetLinks(self, root):
+        """Look for datasheets under root (or only check the existing links if None) on a background thread."""
+        if self.link_worker is not None:
+            QMessageBox.information(self, "Datasheets", "Datasheets are already being checked.")
+            return
+        title = "Looking for datasheets..." if root else "Checking datasheet links..."
+        dialog = QProgressDialog(title, "Cancel", 0, 0, self)
+        dialog.setWindowTitle("Datasheets")
+        dialog.setMinimumDuration(500)
+        dialog.setAutoReset(False)
+
+        def progress(stage, done, total):
+            dialog.setLabelText(f"{stage}: {done} of {total}")
+            dialog.setMaximum(total)
+            dialog.setValue(done)
+
+        self.link_worker = DatasheetLinkWorker(DATABASE_FILE, BASE_DIR, root, self)
+        self.link_worker.progress.connect(progress)
+        dialog.canceled.connect(self.link_worker.requestInterruption)
+        self.link_worker.finished.connect(lambda: self.on_datasheet_links_scanned(root, dialog))
+        self.link_worker.start()
+
+    def on_datasheet_links_scanned(self, root, dialog):
+        worker, self.link_worker = self.link_worker, None
+        dialog.close()
+        worker.deleteLater()
+        plan = worker.plan
+        if worker.error:
+            QMessageBox.critical(self, "Error", f"An error occurred while checking datasheets: {worker.error}")
+            return
+        if plan.cancelled:
+            QMessageBox.information(self, "Cancelled", "Datasheet check cancelled; nothing was changed.")
+            return
+
+        moved = sum(link.match == MOVED for link in plan.links)
+        if root:
+            text = (f"{plan.files} datasheets found: {len(plan.links) - moved} can be linked to parts without one"
+                    f" and {moved} missing ones were found again.")
+            informative = (f"{len(plan.unmatched)} files matched no part and {len(plan.ambiguous)} matched several "
+                           f"part numbers. {len(plan.dangling)} linked datasheets are still missing.")
+        else:
+            text = f"{len(plan.dangling)} linked datasheets can't be found."
+            informative = "Use File > Link Datasheets... to look for them in a folder." if plan.dangling else ""
+        details = [f"Link {link.part or link.part_id} to {link.path}"
+                   + (f" (was {link.old_path})" if link.old_path else "") for link in plan.links]
+        details += [f"Missing: {link.part or link.part_id} {link.path}" for link in plan.dangling]
+        details += [f"Several parts: {path} ({', '.join(keys)})" for path, keys in plan.ambiguous]
+
+        box = QMessageBox(QMessageBox.Question if plan.links else QMessageBox.Information, "Datasheets", text,
+                          (QMessageBox.Yes | QMessageBox.No) if plan.links else QMessageBox.Ok, self)
+        box.setInformativeText(informative + (f"\n\nLink {len(plan.links)} datasheets now?" if plan.links else ""))
+        if details:
+            box.setDetailedText("\n".join(details))
+        if box.exec_() != QMessageBox.Yes or not plan.links:
+            return
 
-    def link_datasheet(self, row):
-        """Attach a datasheet to the selected component and store the path in the Datasheet Path column."""
+        try:
+            linked = DatasheetLinker(self.conn, BASE_DIR).apply(plan.links)
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Error", f"An error occurred while linking datasheets: {str(e)}")
+            return
+        self.model.refreshParts(linked)
+        self.index_datasheets()
+        QMessageBox.information(self, "Datasheets", f"{len(linked)} datasheets linked."
+                                + (f" {len(plan.links) - len(linked)} parts changed meanwhile and were skipped."
+                                   if len(linked) < len(plan.links) else ""))
+
+    def link_datasheet(self, record):
+        """Attach a datasheet to the given component and store the path in the Datasheet Path column."""
         file_name, _ = QFileDialog.getOpenFileName(self, 'Open file', '', 'PDF files (*.pdf);;All Files (*)')
-        if file_name:
+        row = self.model.rowOf(record)  # Looked up after the dialog, which may have taken a while
+        if file_name and row >= 0:
             relative_path = os.path.relpath(file_name, BASE_DIR)
             # Store the relative path in the Datasheet Path column (column index 9)
-            datasheet_path_item = self.ui.partsTable.item(row, 9)
-            
-            if datasheet_path_item is None:
-                datasheet_path_item = QTableWidgetItem()
-                self.ui.partsTable.setItem(row, 9, datasheet_path_item)
-            
-            # Update the path in the Datasheet Path column
-            datasheet_path_item.setText(relative_path)
+            self.model.setDatasheetPath(row, relative_path)
+
+            # Keep a local copy, addressed by the file's hash
+            try:
+                digest = self.datasheet_cache.put(file_name)
+            except OSError:
+                digest = None  # Still linked; it will be cached when next reachable
 
             # Update the database to save the path for the component with the corresponding ID
-            id_item = self.ui.partsTable.item(row, 0)  # Assuming ID is in column 0
-            part_id = id_item.text() if id_item else None
+            part_id = self.model.partId(row)
             
             if part_id:
                 # Update the corresponding part's datasheet path in the database
-                self.cursor.execute("UPDATE components SET datasheetpath = ? WHERE id = ?", (relative_path, part_id))
-                self.conn.commit()
+                self.model.advanceVersion(row, self.repository.set_datasheet(part_id, relative_path, digest))
+                self.index_datasheets()
+            self.show_preview(row)
 
 
-    def view_datasheet(self, row):
-        """View the attached datasheet for the selected component using the path from the Datasheet Path column."""
-        id_item = self.ui.partsTable.item(row, 0)  # Assuming ID is in column 0
-        datasheet_path_item = self.ui.partsTable.item(row, 9)  # Datasheet Path is in column 9
+    def view_datasheet(self, record):
+        """View the attached datasheet for the given component using the path from the Datasheet Path column."""
+        part_id = record[0]
+        relative_path = self.model.datasheetPath(self.model.rowOf(record))
         
-        if id_item and datasheet_path_item:
-            part_id = id_item.text()  # Get the ID
-            datasheet_path = os.path.abspath(os.path.join(BASE_DIR, datasheet_path_item.text()))  # Get the datasheet path
-            
-            if os.path.exists(datasheet_path):
-                try:
-                    # Open the datasheet using SumatraPDF located in the thirdParty folder
-                    pdf_viewer = os.path.join(BASE_DIR, 'thirdParty', 'SumatraPDF-3.5.2-64.exe')
-                    subprocess.Popen([pdf_viewer, datasheet_path], shell=False)
-                except Exception as e:
-                    QMessageBox.warning(self, "Error", f"Could not open datasheet for ID {part_id}: {e}")
-            else:
+        if relative_path:
+            datasheet_path = os.path.abspath(os.path.join(BASE_DIR, relative_path))  # Get the datasheet path
+
+            found, error = False, None
+            with self.diagnostics.action("view", self.conn):
+                # Prefer the local cached copy over the (possibly slow or offline) original
+                digest = self.repository.datasheet_hashes([part_id]).get(part_id)
+                cached_path = self.datasheet_cache.get(digest) if digest else None
+                if cached_path:
+                    datasheet_path = cached_path
+
+                found = os.path.exists(datasheet_path)
+                if found:
+                    try:
+                        # Open the datasheet in the shared SumatraPDF instance (or the system viewer)
+                        self.viewer.open(datasheet_path)
+                    except Exception as e:
+                        error = e
+            if not found:
                 QMessageBox.warning(self, "Error", f"File not found: {datasheet_path}")
+            elif error:
+                QMessageBox.warning(self, "Error", f"Could not open datasheet for ID {part_id}: {error}")
         else:
-            QMessageBox.information(self, "No Datasheet", f"No datasheet linked for ID {id_item.text() if id_item else 'Unknown'}.")
-
-    def create_button_widget(self, *buttons):
-        """Helper function to create a widget with buttons centered."""
-        widget = QWidget()
-        layout = QHBoxLayout()  # Horizontal layout to center the buttons
-        layout.addStretch()  # Add stretchable space to the left
-        for button in buttons:  # Add all passed buttons (whether 1 or 2)
-            layout.addWidget(button)
-        layout.addStretch()  # Add stretchable space to the right
-        layout.setContentsMargins(0, 0, 0, 0)  # Set no margins
-        layout.setAlignment(Qt.AlignCenter)  # Center the layout content
-        widget.setLayout(layout)
-        return widget
-
-
-def show_splash_screen(app):
+            QMessageBox.information(self, "No Datasheet", f"No datasheet linked for ID {part_id if part_id else 'Unknown'}.")
+
+
+def show_splash_screen(app, profile):
+    """Show the splash screen while the database, data file and stylesheet are prepared in the background.
+
+    Returns the splash screen and the prepared StartupData.
+    """
     # Create a QPixmap to represent the splash screen background
     splash_pix = QPixmap(800, 400)  # Set the size of the splash screen
 
@@ -472,59 +1187,61 @@ def show_splash_screen(app):
     # Process events to keep the splash screen responsive
     app.processEvents()
 
-    # Real Tasks during Splash Screen:
-    try:
-        # 1. Test the Database Connection
-        splash.showMessage("Testing Database Connection...", Qt.AlignBottom | Qt.AlignCenter, QColor("white"))
-        app.processEvents()
-        QThread.msleep(1000)  # Wait for 1 second
-        conn = sqlite3.connect(DATABASE_FILE)  # Test DB connection
-        conn.cursor().execute("SELECT 1")  # Simple query to ensure DB is accessible
+    # Real Tasks during Splash Screen, run on a worker while the splash reports its progress
+    worker = StartupWorker(DATABASE_FILE, DATA_FILE, STYLE_FILE)
+    worker.progress.connect(lambda message, percent: splash.showMessage(
+        f"{message} {percent}%", Qt.AlignBottom | Qt.AlignCenter, QColor("white")))
+    loop = QEventLoop()
+    worker.finished.connect(loop.quit)
+    worker.start()
 
-        # 2. Verify Icon Exists
-        splash.showMessage("Verifying Icons...", Qt.AlignBottom | Qt.AlignCenter, QColor("white"))
-        app.processEvents()
-        QThread.msleep(1000)  # Wait for 1 second
-        if not os.path.exists('icons/transistor.ico'):
-            raise FileNotFoundError("Icon not found: 'icons/transistor.ico'")
+    # Verify Icon Exists while the worker runs
+    error = None if os.path.exists(ICON_FILE) else f"Icon not found: '{ICON_FILE}'"
 
-        # 3. Load Critical Resources
-        splash.showMessage("Loading Resources...", Qt.AlignBottom | Qt.AlignCenter, QColor("white"))
-        app.processEvents()
-        QThread.msleep(1000)  # Wait for 1 second
+    loop.exec_()
+    worker.wait()
+    for phase, seconds in worker.timings:
+        profile.record(phase, seconds)
+    error = error or worker.error
 
-        splash.showMessage("Initialization Complete!", Qt.AlignBottom | Qt.AlignCenter, QColor("white"))
-        app.processEvents()
-        QThread.msleep(1000)  # Wait for 1 second
-
-    except Exception as e:
+    if error:
         # Show error message and terminate if a critical error occurs
-        splash.showMessage(f"Error: {str(e)}", Qt.AlignBottom | Qt.AlignCenter, QColor("red"))
+        splash.showMessage(f"Error: {error}", Qt.AlignBottom | Qt.AlignCenter, QColor("red"))
         app.processEvents()
-        QMessageBox.critical(None, "Startup Error", f"An error occurred: {str(e)}")
+        QMessageBox.critical(None, "Startup Error", f"An error occurred: {error}")
         sys.exit(1)  # Exit with error
 
-    return splash, conn  # Return the splash screen and DB connection
+    return splash, worker.data
 
 
 def main():
+    multiprocessing.freeze_support()  # The datasheet indexer's pool processes start through the frozen exe
+    profile = StartupProfile()
     app = QApplication(sys.argv)
-    app.setWindowIcon(QIcon('icons/transistor.ico'))  # Ensure the icon path is correct
+    app.setWindowIcon(QIcon(ICON_FILE))
+    profile.record("qt init", time.perf_counter() - profile.start)
 
     # Show splash screen and perform real startup tasks
-    splash, conn = show_splash_screen(app)
+    (splash, startup), seconds = timed(show_splash_screen, app, profile)
+    profile.record("splash (wall)", seconds)
 
-    # Load and apply the custom stylesheet
-    with open(os.path.join(BASE_DIR, 'style/style.qss'), 'r') as style_file:
-        app.setStyleSheet(style_file.read())
+    # Apply the custom stylesheet read during startup
+    _, seconds = timed(app.setStyleSheet, startup.stylesheet)
+    profile.record("apply stylesheet", seconds)
 
     # Create and show the main window
-    window = MainWindow()
+    diagnostics = '--diagnostics' in sys.argv or os.environ.get('LABPARTS_DIAGNOSTICS') == '1'
+    window, seconds = timed(MainWindow, startup, diagnostics)
+    profile.record("main window", seconds)
     window.show()
 
     # Close splash screen once the main window is ready
     splash.finish(window)  # Call finish on the splash object
 
+    if '--profile-startup' in sys.argv:
+        # Runs once the event loop has painted the window and is idle
+        QTimer.singleShot(0, lambda: print(profile.report(), flush=True))
+
     sys.exit(app.exec_())
 
 
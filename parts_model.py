@@ -0,0 +1,506 @@
+from PyQt5.QtWidgets import (
+    QStyledItemDelegate, QLineEdit, QComboBox, QPushButton, QStyle, QStyleOptionButton
+)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QPersistentModelIndex, QEvent, QRect, pyqtSignal
+from PyQt5.QtGui import QIntValidator, QColor
+
+from repository import PartsQuery, VERSION
+
+
+# Table columns, in display order
+COLUMNS = ("ID", "CUS ID", "Type", "Part", "Description", "Footprint", "Stock", "Min Stock", "Reorder Qty",
+           "Datasheet", "Delete", "Datasheet Path")
+(COL_ID, COL_CUS_ID, COL_TYPE, COL_PART, COL_DESCRIPTION, COL_FOOTPRINT, COL_STOCK, COL_MIN_STOCK, COL_REORDER_QTY,
+ COL_DATASHEET, COL_DELETE, COL_DATASHEET_PATH) = range(len(COLUMNS))
+
+# Map table columns onto record fields (the button columns have no backing field)
+FIELD_FOR_COLUMN = {
+    COL_ID: 0, COL_CUS_ID: 1, COL_TYPE: 2, COL_PART: 3, COL_DESCRIPTION: 4,
+    COL_FOOTPRINT: 5, COL_STOCK: 6, COL_DATASHEET_PATH: 7, COL_MIN_STOCK: 8, COL_REORDER_QTY: 9,
+}
+
+# Columns holding whole numbers
+INTEGER_COLUMNS = (COL_STOCK, COL_MIN_STOCK, COL_REORDER_QTY)
+
+# Record field each sortable column orders by (see repository.SORT_FIELDS)
+SORT_FIELD_FOR_COLUMN = {
+    COL_ID: "id", COL_CUS_ID: "cus_id", COL_TYPE: "type", COL_PART: "part", COL_FOOTPRINT: "footprint", COL_STOCK: "stock",
+}
+
+# Number of rows pulled from SQLite per fetchMore call
+PAGE_SIZE = 200
+
+
+class PartsTableModel(QAbstractTableModel):
+    """Table model that pages rows out of the components table as the view scrolls.
+
+    Edits are tracked until saved: new rows, changed rows (by id) and deleted ids, each with the
+    row version it was made against. Pending edits survive a change of query, so searching doesn't
+    throw away unsaved work. Sorting is done by the database: sort() re-runs the current query in the
+    new order. refreshParts() brings rows changed elsewhere up to date without reloading the rest.
+    """
+
+    def __init__(self, repository, parent=None):
+        super().__init__(parent)
+        self.repository = repository
+        self._rows = []  # Loaded records as mutable lists, in repository.SELECT_COLUMNS order
+        self._query = PartsQuery()
+        self._fetched = 0  # Rows read from the current query so far
+        self._last = None  # Last database row read, where the next keyset page starts
+        self._sort = (None, False)  # (field, descending) chosen from the header; None is the default order
+        self._exhausted = False
+        self._streaming = False  # A background search is still delivering the first page
+        self._inserted = []  # Records added but not saved yet (their id is None)
+        self._updated = {}  # id -> edited record not saved yet
+        self._deleted = {}  # id -> version of rows removed but not yet deleted from the database
+        self._added = set()  # ids of parts added here and saved, still shown where they were added
+        self._snippets = {}  # id -> matching passage of the part's datasheet, when searching datasheets
+
+    def setQuery(self, query):
+        """Replace the backing PartsQuery and load its first page."""
+        self.beginResetModel()
+        self._query = query
+        self._rows = list(self._inserted)  # Unsaved rows stay on top
+        self._added = set()  # Saved ones come back from the query, in their place
+        self._fetched = 0
+        self._last = None
+        self._exhausted = False
+        self._streaming = False
+        self._snippets = {}
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def beginStream(self, query):
+        """Replace the backing PartsQuery, with its first page to be delivered through appendRows.
+
+        Paging on scroll is suspended until the stream is done, then carries on from where it ended.
+        """
+        self.beginResetModel()
+        self._query = query
+        self._rows = list(self._inserted)  # Unsaved rows stay on top
+        self._added = set()  # Saved ones come back from the query, in their place
+        self._fetched = 0
+        self._last = None
+        self._exhausted = False
+        self._streaming = True
+        self._snippets = {}
+        self.endResetModel()
+
+    def appendRows(self, rows, done=True, exhausted=False):
+        """Append rows produced elsewhere for the current query."""
+        # Update paging state first: the view asks canFetchMore as soon as the rows land
+        self._fetched += len(rows)
+        if rows:
+            self._last = rows[-1]
+        self._exhausted = exhausted
+        self._streaming = not done
+        self._insertPage(rows)
+
+    def refresh(self):
+        """Reload the current query from the first page."""
+        self.setQuery(self._query)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self._streaming
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Append the next page of the backing query."""
+        if not self.canFetchMore(parent):
+            return
+        page = self.repository.get_page(self._fetched, PAGE_SIZE, self._query, after=self._last)
+        self._fetched += len(page)
+        if page:
+            self._last = page[-1]
+        if len(page) < PAGE_SIZE:
+            self._exhausted = True
+        self._insertPage(page)
+
+    def _insertPage(self, page):
+        """Append database rows, showing pending edits in place of the stored values."""
+        # Parts added and saved here are already shown, so paging doesn't show them twice
+        records = [self._updated.get(record[0]) or list(record) for record in page
+                   if record[0] not in self._deleted and record[0] not in self._added]
+        if records and self._query.datasheet_match:
+            self._snippets.update(self.repository.datasheet_snippets(self._query.datasheet_match,
+                                                                     [record[0] for record in records]))
+        if records:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+            self._rows.extend(records)
+            self.endInsertRows()
+
+    def query(self):
+        return self._query
+
+    def sortKey(self):
+        """Return the (field, descending) order picked from the header; field is None for the default order."""
+        return self._sort
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Re-run the current query ordered by the given column (-1 restores the default order)."""
+        if column >= 0 and column not in SORT_FIELD_FOR_COLUMN:
+            return  # Button and free-text columns have no index to sort by
+        self._sort = (SORT_FIELD_FOR_COLUMN.get(column), order == Qt.DescendingOrder)
+        query = self.repository.sorted_query(self._query, *self._sort)
+        if query != self._query:
+            self.setQuery(query)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and 0 <= section < len(COLUMNS):
+            return COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        if index.column() not in (COL_ID, COL_DATASHEET, COL_DELETE, COL_DATASHEET_PATH):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ForegroundRole and index.column() == COL_STOCK and self.isLowStock(index.row()):
+            return QColor("#d32f2f")  # Below the part's minimum
+        if role == Qt.ToolTipRole:
+            return self._snippets.get(self._rows[index.row()][0])  # Why a datasheet search matched
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        field = FIELD_FOR_COLUMN.get(index.column())
+        if field is None:
+            return None
+        value = self._rows[index.row()][field]
+        if index.column() == COL_ID and value is None:
+            return "Auto-ID"  # Not saved yet
+        return "" if value is None else str(value)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        field = FIELD_FOR_COLUMN.get(index.column())
+        if field is None or index.column() == COL_ID:
+            return False
+        if index.column() in INTEGER_COLUMNS:
+            value = int(value) if str(value).isdigit() else 0
+        record = self._rows[index.row()]
+        if record[field] == value or (record[field] is None and value == ""):
+            return True
+        record[field] = value
+        if record[0] is not None:
+            self._updated[record[0]] = record
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        if index.column() == COL_MIN_STOCK:
+            stock = self.index(index.row(), COL_STOCK)
+            self.dataChanged.emit(stock, stock, [Qt.ForegroundRole])  # Low-stock highlight may change
+        return True
+
+    def record(self, row):
+        """Return the record (in repository.SELECT_COLUMNS order) shown at the given row."""
+        return self._rows[row]
+
+    def records(self):
+        """Return every loaded record."""
+        return self._rows
+
+    def rowOf(self, record):
+        """Return the row now showing record (as returned by record()), or -1 if it is no longer loaded.
+
+        Looks the record up by identity, then by part id, as rows move when others are added or
+        removed and a new query reloads saved parts as new records.
+        """
+        for row, other in enumerate(self._rows):
+            if other is record:
+                return row
+        if record[0] is not None:
+            for row, other in enumerate(self._rows):
+                if other[0] == record[0]:
+                    return row
+        return -1
+
+    def partId(self, row):
+        """Return the database id of the given row, or None if it has not been saved."""
+        return self._rows[row][0]
+
+    def version(self, row):
+        """Return the row version the record at row was loaded at (None if it has not been saved)."""
+        return self._rows[row][VERSION]
+
+    def advanceVersion(self, row, version):
+        """Note that this window's own write moved the part at row to version.
+
+        Only taken if the row was at the version before it, so changes made elsewhere in between
+        still show up as a conflict when pending edits are saved.
+        """
+        record = self._rows[row]
+        if version is not None and record[VERSION] == version - 1:
+            record[VERSION] = version
+
+    def refreshParts(self, part_ids):
+        """Re-read the given parts where they are loaded, and drop the rows of ones that were deleted.
+
+        Rows with unsaved edits or a pending deletion are left alone; saving them reports the conflict.
+        Parts that are not loaded are ignored. Returns how many rows changed.
+        """
+        part_ids = set(part_ids)
+        rows = {record[0]: row for row, record in enumerate(self._rows) if record[0] in part_ids}
+        wanted = [part_id for part_id in rows if part_id not in self._updated and part_id not in self._deleted]
+        if not wanted:
+            return 0
+        fresh = {part.id: part for part in self.repository.get_many(wanted)}
+        gone = []
+        for part_id in wanted:
+            row = rows[part_id]
+            if part_id not in fresh:
+                gone.append(row)
+            elif list(fresh[part_id]) != self._rows[row]:
+                self._rows[row][:] = fresh[part_id]
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+        for row in sorted(gone, reverse=True):
+            self.dropPart(row)
+        return len(wanted)
+
+    def dropPart(self, row):
+        """Remove a row whose part is no longer in the database, forgetting any unsaved edits to it."""
+        record = self._rows[row]
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
+        self._updated.pop(record[0], None)
+
+    def dropParts(self, part_ids):
+        """Remove the rows of many parts no longer in the database, as dropPart does for one.
+
+        Returns the (row, record) pairs removed, in row order, for restoreParts.
+        """
+        part_ids = set(part_ids)
+        removed = [(row, record) for row, record in enumerate(self._rows) if record[0] in part_ids]
+        for first, last in reversed(_runs([row for row, _ in removed])):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+        for _, record in removed:
+            self._updated.pop(record[0], None)
+        self._fetched -= len(removed)  # So an OFFSET-paged query doesn't skip rows past the gap
+        return removed
+
+    def restoreParts(self, removed):
+        """Put rows taken out by dropParts back where they were, given (row, record) pairs in row order."""
+        # Rows go back lowest first, so each one's old row number is where it ends up (or the end)
+        placed = []
+        for row, record in removed:
+            placed.append((min(row, len(self._rows) + len(placed)), record))
+        position = 0
+        for first, last in _runs([row for row, _ in placed]):
+            count = last - first + 1
+            self.beginInsertRows(QModelIndex(), first, last)
+            self._rows[first:first] = [record for _, record in placed[position:position + count]]
+            self.endInsertRows()
+            position += count
+        self._fetched += len(removed)
+
+    def setFieldValues(self, column, values, versions):
+        """Show values ({id: value}) written to the database for one column, and the versions the parts are now at."""
+        field = FIELD_FOR_COLUMN[column]
+        changed = []
+        for row, record in enumerate(self._rows):
+            if record[0] in values:
+                record[field] = values[record[0]]
+                record[VERSION] = versions.get(record[0], record[VERSION])
+                changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(changed[0], column), self.index(changed[-1], column))
+
+    def isLowStock(self, row):
+        """Return True if the part at row has a minimum stock and is below it."""
+        record = self._rows[row]
+        return bool(record[8]) and (record[6] or 0) < record[8]
+
+    def datasheetPath(self, row):
+        return self._rows[row][7] or ""
+
+    def setDatasheetPath(self, row, path):
+        """Show a datasheet path that has already been written to the database."""
+        self._rows[row][7] = path
+        index = self.index(row, COL_DATASHEET_PATH)
+        self.dataChanged.emit(index, index)
+
+    def addPart(self, part_type="", footprint=""):
+        """Append a blank, unsaved part and return its row."""
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        record = [None, "", part_type, "", "", footprint, 0, "", 0, 0, None]
+        self._rows.append(record)
+        self._inserted.append(record)
+        self.endInsertRows()
+        return row
+
+    def removePart(self, row):
+        """Remove the given row from the model, recording the deletion if it was saved."""
+        record = self._rows[row]
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
+        if record[0] is None:
+            self._inserted = [other for other in self._inserted if other is not record]
+        else:
+            self._updated.pop(record[0], None)
+            self._deleted[record[0]] = record[VERSION]
+
+    def discardChanges(self):
+        """Forget every pending change; the next query shows what is in the database."""
+        self._inserted = []
+        self._updated = {}
+        self._deleted = {}
+
+    def discardEdits(self, part_ids):
+        """Forget the pending edits and deletions of the given parts and show their current values.
+
+        A row whose deletion is dropped comes back with the next query.
+        """
+        for part_id in part_ids:
+            self._updated.pop(part_id, None)
+            self._deleted.pop(part_id, None)
+        self.refreshParts(part_ids)
+
+    def hasPendingChanges(self):
+        return bool(self._inserted or self._updated or self._deleted)
+
+    def pendingChanges(self):
+        """Return the unsaved (inserted records, updated records, deleted (id, version) pairs)."""
+        return list(self._inserted), list(self._updated.values()), sorted(self._deleted.items())
+
+    def markSaved(self, inserted=(), new_ids=(), updated=(), deleted=(), versions=None):
+        """Forget the given pending changes once they are in the database.
+
+        New rows get their ids, and saved rows the versions they are now at ({id: version}).
+        deleted holds ids or (id, version) pairs.
+        """
+        for record, part_id in zip(inserted, new_ids):
+            record[0] = part_id
+            self._added.add(part_id)
+        for record in list(inserted) + list(updated):
+            if versions and record[0] in versions:
+                record[VERSION] = versions[record[0]]
+        saved = {id(record) for record in inserted}
+        self._inserted = [record for record in self._inserted if id(record) not in saved]
+        for record in updated:
+            if self._updated.get(record[0]) is record:
+                del self._updated[record[0]]
+        for item in deleted:
+            self._deleted.pop(item[0] if isinstance(item, (tuple, list)) else item, None)
+        if inserted and self._rows:
+            self.dataChanged.emit(self.index(0, COL_ID), self.index(len(self._rows) - 1, COL_ID))
+
+
+def _runs(rows):
+    """Split ascending row numbers into (first, last) runs of consecutive rows."""
+    runs = []
+    for row in rows:
+        if runs and runs[-1][1] == row - 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return runs
+
+
+class StockDelegate(QStyledItemDelegate):
+    """Integer-only line edit for the Stock column."""
+
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setValidator(QIntValidator(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.text(), Qt.EditRole)
+
+
+class ComboDelegate(QStyledItemDelegate):
+    """Editable combo box (for the Type and Footprint columns).
+
+    Editors show items, a QStringListModel shared with every other editor of the column, rather
+    than a copy of the list each.
+    """
+
+    def __init__(self, items, parent=None):
+        super().__init__(parent)
+        self.items = items
+
+    def createEditor(self, parent, option, index):
+        combo = QComboBox(parent)
+        combo.setModel(self.items)
+        combo.setEditable(True)  # Allow users to type their own value
+        combo.setInsertPolicy(QComboBox.NoInsert)  # ...without adding it to the shared list
+        return combo
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), Qt.EditRole)
+
+
+class ButtonDelegate(QStyledItemDelegate):
+    """Paints a row of push buttons in a cell and reports clicks, without creating per-row widgets.
+
+    triggered is emitted with the action name of the clicked button (the one at the same position
+    in `actions`) and the row it was clicked on. One delegate paints the column however many rows
+    there are, so nothing is allocated per row.
+    """
+
+    triggered = pyqtSignal(str, int)
+
+    def __init__(self, labels, actions, object_name=None, parent=None):
+        super().__init__(parent)
+        self.labels = labels
+        self.actions = actions
+        self._pressed = None  # (QPersistentModelIndex, button) under the mouse while it is held down
+        # Hidden template button, so the stylesheet rules for QPushButton apply to the painted buttons
+        self._template = QPushButton()
+        if object_name:
+            self._template.setObjectName(object_name)
+
+    def _button_rects(self, rect):
+        """Split a cell into one centred rectangle per button."""
+        margin = 6
+        width = (rect.width() - margin * (len(self.labels) + 1)) // len(self.labels)
+        height = rect.height() - 2 * margin
+        return [QRect(rect.left() + margin + i * (width + margin), rect.top() + margin, width, height)
+                for i in range(len(self.labels))]
+
+    def paint(self, painter, option, index):
+        self._template.ensurePolished()
+        for i, rect in enumerate(self._button_rects(option.rect)):
+            button_option = QStyleOptionButton()
+            button_option.rect = rect
+            button_option.text = self.labels[i]
+            button_option.state = QStyle.State_Enabled | QStyle.State_Raised
+            if self._pressed == (QPersistentModelIndex(index), i):
+                button_option.state |= QStyle.State_Sunken
+            self._template.style().drawControl(QStyle.CE_PushButton, button_option, painter, self._template)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick):
+            return False
+        hit = None
+        for i, rect in enumerate(self._button_rects(option.rect)):
+            if rect.contains(event.pos()):
+                hit = (QPersistentModelIndex(index), i)
+        if event.type() == QEvent.MouseButtonRelease:
+            pressed, self._pressed = self._pressed, None
+            # The persistent index follows the row if rows above it come or go while the button is down
+            if hit is not None and hit == pressed and pressed[0].isValid():
+                self.triggered.emit(self.actions[hit[1]], pressed[0].row())
+            return True
+        self._pressed = hit
+        return hit is not None
@@ -0,0 +1,319 @@
+"""Projects and their bills of materials, checked against and drawn from stock.
+
+A project is a board (or anything else built in batches) with a BOM: lines naming a part and how
+many of it one board takes. Lines are matched onto components when the BOM is imported, so
+checking whether N boards can be built is one set-based query however long the BOM is.
+
+Stock can be reserved for a project's next build. Reserved units stay in components.stock, but
+count as unavailable to every other project until they are used (booked through the stock ledger)
+or released. Reserving and building check availability and write inside one transaction, so two
+people can't both take the last reel. No Qt here: the GUI's Projects menu and
+`python cli.py project ...` both use ProjectRepository.
+"""
+import json
+import re
+from collections import namedtuple
+
+from database import transaction
+from dedupe import strip_packaging, normalize_part, base_part
+from ledger import StockLedger, USED
+
+
+Project = namedtuple('Project', 'id name description reserved_boards lines matched')
+
+BomLine = namedtuple('BomLine', 'id line reference cus_id part description footprint quantity part_id match')
+
+# One part a build needs: per board and in total, and what there is of it. reserved is what other
+# projects hold; available is stock less that; short is how many more are needed.
+Requirement = namedtuple('Requirement', 'part_id cus_id part description per_board needed stock reserved available '
+                                        'short')
+
+# The outcome of checking a build: requirements per part (in BOM order), the BOM lines not matched
+# to any part, and how many boards the stock available covers
+BuildCheck = namedtuple('BuildCheck', 'project_id boards requirements unmatched buildable')
+
+# How a BOM line was matched: on the CUS ID, the exact part number (any case), the part number
+# without packaging suffixes and punctuation, or only up to the trailing ordering-code letters.
+# A similar match is only a suggestion: the line counts as unmatched, and no stock is checked,
+# reserved or used for it, until the user confirms it.
+CUS_ID, PART, NORMALIZED, SIMILAR, CONFIRMED = "cus_id", "part", "normalized", "similar", "confirmed"
+
+# Columns of the build check report, one row per part needed and per unmatched line
+CHECK_FIELDS = ("status", "id", "cus_id", "part", "description", "per_board", "needed", "stock", "reserved",
+                "available", "short", "reference")
+
+MAX_CANDIDATES = 50  # Parts looked at per line when matching on a part number prefix
+
+# BOM lines matched to a part whose stock the build may use; similar matches wait to be confirmed
+MATCHED = f"part_id IS NOT NULL AND match != '{SIMILAR}'"
+
+PROJECTS_SQL = f'''SELECT p.id, p.name, p.description, p.reserved_boards, COUNT(b.id),
+                          COUNT(CASE WHEN {MATCHED} THEN 1 END)
+                   FROM projects p LEFT JOIN bom_lines b ON b.project_id = p.id
+                   GROUP BY p.id ORDER BY p.name'''
+INSERT_LINE_SQL = '''INSERT INTO bom_lines (project_id, line, reference, cus_id, part, description, footprint,
+                                            quantity, part_id, match)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+# Both exact lookups take every line's value at once; the unique and NOCASE indexes answer each one
+CUS_ID_MATCH_SQL = '''SELECT j.value, c.id FROM json_each(?) j JOIN components c ON c.cus_id = j.value'''
+PART_MATCH_SQL = '''SELECT j.value, MIN(c.id) FROM json_each(?) j
+                    JOIN components c ON c.part = j.value COLLATE NOCASE GROUP BY j.value'''
+# Served by idx_components_part_nocase as a range scan
+CANDIDATES_SQL = f"SELECT id, part FROM components WHERE part LIKE ? ESCAPE '\\' ORDER BY id LIMIT {MAX_CANDIDATES}"
+# Each matched part with what the build needs of it and what there is, in a single statement
+CHECK_SQL = f'''SELECT n.part_id, c.cus_id, c.part, c.description, n.per_board, n.per_board * :boards,
+                       COALESCE(c.stock, 0),
+                       (SELECT COALESCE(SUM(r.quantity), 0) FROM stock_reservations r
+                        WHERE r.part_id = n.part_id AND r.project_id != :project)
+                FROM (SELECT part_id, SUM(quantity) AS per_board, MIN(line) AS first_line FROM bom_lines
+                      WHERE project_id = :project AND {MATCHED} GROUP BY part_id) n
+                JOIN components c ON c.id = n.part_id
+                ORDER BY n.first_line'''
+UNMATCHED_SQL = f'''SELECT id, line, reference, cus_id, part, description, footprint, quantity, part_id, match
+                    FROM bom_lines WHERE project_id = ? AND (part_id IS NULL OR match = '{SIMILAR}') AND quantity > 0
+                    ORDER BY line'''
+SIMILAR_SQL = f'''SELECT b.id, b.line, b.reference, b.cus_id, b.part, b.description, b.footprint, b.quantity,
+                         b.part_id, b.match, c.part
+                  FROM bom_lines b JOIN components c ON c.id = b.part_id
+                  WHERE b.project_id = ? AND b.match = '{SIMILAR}' ORDER BY b.line'''
+RESERVE_SQL = f'''INSERT INTO stock_reservations (project_id, part_id, quantity)
+                  SELECT project_id, part_id, SUM(quantity) * ? FROM bom_lines
+                  WHERE project_id = ? AND {MATCHED} GROUP BY part_id HAVING SUM(quantity) > 0'''
+
+# Ordering-code letters and punctuation at the end of a part number
+_ORDERING_TAIL = re.compile(r"[^0-9]+$")
+
+
+class ShortageError(Exception):
+    """A build can't go ahead: parts are short, or BOM lines aren't matched to parts. check is the BuildCheck."""
+
+    def __init__(self, check):
+        self.check = check
+        problems = [f"{requirement.part or requirement.cus_id} short by {requirement.short}"
+                    for requirement in check.requirements if requirement.short]
+        if check.unmatched:
+            problems.append(f"{len(check.unmatched)} BOM lines not matched to parts")
+        super().__init__(f"Can't build {check.boards}: " + "; ".join(problems))
+
+
+def _like_prefix(prefix):
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def match_candidates(conn, part):
+    """Return (part id, part number) of parts that may be the given part number, through the NOCASE
+    index: those starting with it up to its last digit, as written and without punctuation
+    ("LM-358N/NOPB" looks for "LM-358%" and "LM358%")."""
+    prefixes = set()
+    for text in (strip_packaging(part), normalize_part(part)):
+        prefix = _ORDERING_TAIL.sub("", text)
+        if len(prefix) >= 3:
+            prefixes.add(prefix)
+    candidates = {}
+    for prefix in prefixes:
+        candidates.update(conn.execute(CANDIDATES_SQL, (_like_prefix(prefix),)).fetchall())
+    return sorted(candidates.items())
+
+
+def match_lines(conn, lines):
+    """Work out which part each BOM line (a dict of importexport.BOM_FIELDS) is.
+
+    Returns [(part id, how matched)] in line order, (None, None) for lines that match nothing.
+    Exact CUS IDs and part numbers are looked up for all lines in two queries; the rest are
+    compared with the few parts sharing their prefix, lowest id first.
+    """
+    cus_ids = dict(conn.execute(CUS_ID_MATCH_SQL, (json.dumps([line["cus_id"] for line in lines if line["cus_id"]]),)))
+    parts = {value.lower(): part_id for value, part_id in
+             conn.execute(PART_MATCH_SQL, (json.dumps([line["part"] for line in lines if line["part"]]),))}
+    matches = []
+    for line in lines:
+        if line["cus_id"] in cus_ids:
+            matches.append((cus_ids[line["cus_id"]], CUS_ID))
+        elif line["part"] and line["part"].lower() in parts:
+            matches.append((parts[line["part"].lower()], PART))
+        else:
+            matches.append(_fuzzy_match(conn, line["part"]))
+    return matches
+
+
+def _fuzzy_match(conn, part):
+    normalized = normalize_part(part)
+    if not normalized:
+        return None, None
+    base = base_part(normalized)
+    similar = None
+    for part_id, candidate in match_candidates(conn, part):
+        candidate = normalize_part(candidate)
+        if candidate == normalized:
+            return part_id, NORMALIZED
+        if similar is None and base is not None and base_part(candidate) == base:
+            similar = part_id
+    return (similar, SIMILAR) if similar is not None else (None, None)
+
+
+class ProjectRepository:
+    """Reads and writes projects, their BOMs and stock reservations on one SQLite connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def projects(self):
+        """Return every Project, by name, with its BOM line count and how many lines are matched."""
+        return [Project._make(row) for row in self.conn.execute(PROJECTS_SQL)]
+
+    def find(self, name):
+        """Return the Project with the given name (or id), or None."""
+        return next((project for project in self.projects() if name in (project.name, project.id, str(project.id))),
+                    None)
+
+    def create(self, name, description=""):
+        """Add a project and return its id. Raises ValueError if the name is taken."""
+        name = name.strip()
+        if not name:
+            raise ValueError("A project needs a name")
+        if self.conn.execute("SELECT 1 FROM projects WHERE name = ?", (name,)).fetchone():
+            raise ValueError(f"There is already a project called '{name}'")
+        with transaction(self.conn):
+            return self.conn.execute("INSERT INTO projects (name, description) VALUES (?, ?)",
+                                     (name, description)).lastrowid
+
+    def delete(self, project_id):
+        """Delete a project with its BOM, releasing anything reserved for it."""
+        with transaction(self.conn):
+            self.conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+
+    def set_bom(self, project_id, lines):
+        """Replace a project's BOM with the given lines (dicts of importexport.BOM_FIELDS) and match
+        them onto parts, in one transaction. A line without a quantity takes one per reference
+        designator. Returns (lines, matched); lines only similar to a part aren't counted as matched."""
+        lines = list(lines)
+        for line in lines:
+            if not line["quantity"]:
+                line["quantity"] = len([ref for ref in re.split(r"[\s,;]+", line["reference"] or "") if ref]) or 1
+        with transaction(self.conn):
+            self.conn.execute("DELETE FROM bom_lines WHERE project_id = ?", (project_id,))
+            matches = match_lines(self.conn, lines)
+            self.conn.executemany(INSERT_LINE_SQL, [
+                (project_id, number, line["reference"], line["cus_id"], line["part"], line["description"],
+                 line["footprint"], line["quantity"], part_id, how)
+                for number, (line, (part_id, how)) in enumerate(zip(lines, matches), 1)])
+        return len(lines), sum(1 for part_id, how in matches if part_id is not None and how != SIMILAR)
+
+    def import_bom(self, name, lines, description=""):
+        """Load a BOM into the project with the given name, created if there is none, in one
+        transaction: if the BOM can't be read or matched, no empty project is left behind.
+        Returns (project id, lines, matched)."""
+        lines = list(lines)  # Read the file before taking the write lock
+        with transaction(self.conn):
+            project = self.find(name.strip())
+            project_id = project.id if project else self.create(name, description)
+            return (project_id, *self.set_bom(project_id, lines))
+
+    def rematch(self, project_id):
+        """Try again to match the lines of a BOM that matched nothing or only a similar part (e.g. once
+        the parts have been added). Returns how many lines are matched now."""
+        with transaction(self.conn):
+            unmatched = self.unmatched(project_id)
+            matches = match_lines(self.conn, [line._asdict() for line in unmatched])
+            self.conn.executemany("UPDATE bom_lines SET part_id = ?, match = ? WHERE id = ?",
+                                  [(part_id, how, line.id) for line, (part_id, how) in zip(unmatched, matches)
+                                   if part_id is not None])
+        return sum(1 for part_id, how in matches if part_id is not None and how != SIMILAR)
+
+    def similar(self, project_id):
+        """Return (BomLine, part number) for the lines of a project only similar to a part, waiting to
+        be confirmed."""
+        return [(BomLine._make(row[:-1]), row[-1]) for row in self.conn.execute(SIMILAR_SQL, (project_id,))]
+
+    def confirm_similar(self, project_id, line_ids=None):
+        """Accept the similar parts suggested for a project's BOM lines (all of them, or those with the
+        given BomLine ids), so their stock can be reserved and used. Returns how many were confirmed."""
+        with transaction(self.conn):
+            ids = [line.id for line, _ in self.similar(project_id) if line_ids is None or line.id in line_ids]
+            self.conn.executemany("UPDATE bom_lines SET match = ? WHERE id = ?", [(CONFIRMED, line_id) for line_id in ids])
+        return len(ids)
+
+    def bom(self, project_id):
+        """Return a project's BomLines in order."""
+        rows = self.conn.execute(f'''SELECT {", ".join(BomLine._fields)} FROM bom_lines
+                                     WHERE project_id = ? ORDER BY line''', (project_id,))
+        return [BomLine._make(row) for row in rows]
+
+    def unmatched(self, project_id):
+        """Return the BomLines of a project that need parts but aren't matched to one, including those
+        only similar to a part until they are confirmed."""
+        return [BomLine._make(row) for row in self.conn.execute(UNMATCHED_SQL, (project_id,))]
+
+    def check(self, project_id, boards=1):
+        """Return the BuildCheck for building the given number of boards of a project.
+
+        Stock reserved for the project itself counts as available to it.
+        """
+        requirements = []
+        for row in self.conn.execute(CHECK_SQL, {"project": project_id, "boards": boards}):
+            needed, stock, reserved = row[5:]
+            requirements.append(Requirement(*row, stock - reserved, max(needed - (stock - reserved), 0)))
+        buildable = min((max(requirement.available, 0) // requirement.per_board
+                         for requirement in requirements if requirement.per_board > 0), default=0)
+        return BuildCheck(project_id, boards, requirements, self.unmatched(project_id), buildable)
+
+    def _check_buildable(self, project_id, boards):
+        if boards < 1:
+            raise ValueError("Build at least one board")
+        check = self.check(project_id, boards)
+        if check.unmatched or any(requirement.short for requirement in check.requirements):
+            raise ShortageError(check)
+        return check
+
+    def reserve(self, project_id, boards):
+        """Hold the stock for building the given number of boards, replacing what the project held.
+
+        Checked and written in one transaction; raises ShortageError, reserving nothing, if the
+        stock not held by other projects falls short. Returns the BuildCheck.
+        """
+        with transaction(self.conn):
+            check = self._check_buildable(project_id, boards)
+            self.conn.execute("DELETE FROM stock_reservations WHERE project_id = ?", (project_id,))
+            self.conn.execute(RESERVE_SQL, (boards, project_id))
+            self.conn.execute("UPDATE projects SET reserved_boards = ? WHERE id = ?", (boards, project_id))
+        return check
+
+    def release(self, project_id):
+        """Give back all the stock reserved for a project."""
+        with transaction(self.conn):
+            self.conn.execute("DELETE FROM stock_reservations WHERE project_id = ?", (project_id,))
+            self.conn.execute("UPDATE projects SET reserved_boards = 0 WHERE id = ?", (project_id,))
+
+    def build(self, project_id, boards, note=None):
+        """Take the parts for the given number of boards out of stock, in one transaction.
+
+        Each part's usage is booked as a "used" stock movement, drawing on the project's reservation
+        first. Raises ShortageError, changing nothing, if anything is short. Returns the BuildCheck.
+        """
+        with transaction(self.conn):
+            check = self._check_buildable(project_id, boards)
+            name = self.conn.execute("SELECT name FROM projects WHERE id = ?", (project_id,)).fetchone()[0]
+            note = note or f"built {boards} x {name}"
+            StockLedger(self.conn).record([(requirement.part_id, -requirement.needed, USED)
+                                           for requirement in check.requirements if requirement.needed], note)
+            self.conn.executemany('''UPDATE stock_reservations SET quantity = MAX(quantity - ?, 0)
+                                     WHERE project_id = ? AND part_id = ?''',
+                                  [(requirement.needed, project_id, requirement.part_id)
+                                   for requirement in check.requirements])
+            self.conn.execute("DELETE FROM stock_reservations WHERE project_id = ? AND quantity = 0", (project_id,))
+            self.conn.execute("UPDATE projects SET reserved_boards = MAX(reserved_boards - ?, 0) WHERE id = ?",
+                              (boards, project_id))
+        return check
+
+
+def check_rows(check):
+    """Yield a BuildCheck as dicts of CHECK_FIELDS: the parts needed, then the lines left unmatched."""
+    for requirement in check.requirements:
+        record = {field: getattr(requirement, field, None) for field in CHECK_FIELDS}
+        record.update(status="short" if requirement.short else "ok", id=requirement.part_id)
+        yield record
+    for line in check.unmatched:
+        record = dict.fromkeys(CHECK_FIELDS)
+        record.update(status=SIMILAR if line.match == SIMILAR else "unmatched", cus_id=line.cus_id, part=line.part, description=line.description,
+                      per_board=line.quantity, needed=line.quantity * check.boards, reference=line.reference)
+        yield record
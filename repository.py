@@ -0,0 +1,495 @@
+"""Data access for the components table, with no GUI dependencies.
+
+MainWindow, the table model and the search worker read and write parts through PartsRepository,
+so the statements can be reused, scripted and timed without a QApplication.
+"""
+import json
+from collections import namedtuple
+
+from database import has_search_index, has_datasheet_index, to_match_query, transaction, LOW_STOCK
+
+
+# One row of components as read for display, in SELECT_COLUMNS order. version is the row version the
+# values were read at; it is kept by the database and checked when edits are saved.
+Part = namedtuple('Part', 'id cus_id type part description footprint stock datasheetpath min_stock reorder_qty '
+                          'version')
+
+SELECT_COLUMNS = ", ".join(Part._fields)
+
+# The fields a save writes: all but version
+WRITE_COLUMNS = ", ".join(Part._fields[:-1])
+VERSION = Part._fields.index("version")
+
+# Result columns qualified with the components alias, since components_fts shares column names
+QUALIFIED_COLUMNS = ", ".join(f"c.{column}" for column in Part._fields)
+
+# bm25 weights for cus_id, type, part and description: identifiers outrank prose
+RANK = "bm25(components_fts, 10.0, 2.0, 10.0, 1.0)"
+
+# Searches matching more parts than this list them by id rather than best match first: ranking
+# means scoring every match, which for a word found in most descriptions takes longer than a keystroke
+RANKED_MATCHES = 2000
+
+# Fields results can be ordered by; each has an index, so sorting never needs a pass over the table
+SORT_FIELDS = ("id", "cus_id", "type", "part", "footprint", "stock")
+
+# Narrowing of the parts list; None means "any"
+Filters = namedtuple('Filters', 'type footprint min_stock max_stock has_datasheet low_stock', defaults=(None,) * 6)
+
+# The result of PartsRepository.save: ids given to the new parts, rows updated and deleted, and the
+# version each saved part is now at
+SaveResult = namedtuple('SaveResult', 'new_ids updated deleted versions')
+
+# Per type/footprint totals from stock_summary
+StockSummary = namedtuple('StockSummary', 'type footprint parts units low')
+
+# Columns of the reorder report: the parts below their minimum and how many of each to order
+REORDER_FIELDS = ("id", "cus_id", "type", "part", "description", "footprint", "stock", "min_stock", "reorder_qty",
+                  "order_qty")
+
+# A list of parts to page through: extra WHERE clauses and their params, an FTS MATCH expression
+# (or None), and the field to order by (None for the default: best match first when searching,
+# otherwise by id). Every ordering except relevance is paged by keyset rather than OFFSET.
+# datasheet_match is the MATCH expression run against datasheet contents too, if any, for snippets.
+PartsQuery = namedtuple('PartsQuery', 'where params match order descending datasheet_match',
+                        defaults=((), (), None, None, False, None))
+
+DEFAULT_LIMIT = 200
+
+CHANGE_LOG_SIZE = 100000  # Entries of component_changes kept for clients polling for changes
+
+# The statements below are fixed strings with bound parameters, so sqlite3's statement cache
+# prepares each of them once per connection and reuses it.
+UPSERT_SQL = f'''INSERT INTO components ({WRITE_COLUMNS})
+                 VALUES (?, NULLIF(TRIM(?), ''), ?, ?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT(id) DO UPDATE SET
+                     cus_id = excluded.cus_id, type = excluded.type, part = excluded.part,
+                     description = excluded.description, footprint = excluded.footprint,
+                     stock = excluded.stock, datasheetpath = excluded.datasheetpath,
+                     min_stock = excluded.min_stock, reorder_qty = excluded.reorder_qty'''
+DELETE_SQL = "DELETE FROM components WHERE id = ?"
+# Fields that can be set on many parts at once with set_many
+BULK_FIELDS = ("type", "footprint", "stock")
+NEXT_ID_SQL = '''SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'components'), 0),
+                            COALESCE((SELECT MAX(id) FROM components), 0))'''
+SET_DATASHEET_SQL = "UPDATE components SET datasheetpath = ?, datasheet_hash = ? WHERE id = ?"
+SET_DATASHEET_HASH_SQL = "UPDATE components SET datasheet_hash = ? WHERE id = ?"
+# Order enough to get back to the minimum, or the part's usual reorder quantity if that is more
+REORDER_SQL = f'''SELECT id, cus_id, type, part, description, footprint, stock, min_stock, reorder_qty,
+                         MAX(reorder_qty, min_stock - COALESCE(stock, 0))
+                  FROM components WHERE {LOW_STOCK} ORDER BY type, footprint, part, id'''
+VERSIONS_SQL = "SELECT id, version FROM components WHERE id IN (SELECT value FROM json_each(?))"
+# Whether a MATCH has more than the given number of rows; reads no further than that
+MANY_MATCHES_SQL = "SELECT 1 FROM components_fts WHERE components_fts MATCH ? LIMIT 1 OFFSET ?"
+DATASHEET_SNIPPETS_SQL = '''SELECT rowid, snippet(datasheet_fts, 0, '[', ']', '...', 12) FROM datasheet_fts
+                            WHERE datasheet_fts MATCH ? AND rowid IN (SELECT value FROM json_each(?))'''
+# Read in the order of idx_components_facets, which holds exactly these values
+FACETS_SQL = '''SELECT type, footprint, COALESCE(datasheetpath, '') != '', COUNT(*)
+                FROM components GROUP BY 1, 2, 3'''
+
+
+class ConflictError(Exception):
+    """Saving would overwrite changes made by someone else.
+
+    conflicts maps each part id to the version now in the database, or None if it has been deleted.
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__("Parts changed by someone else since they were loaded: "
+                         + ", ".join(str(part_id) for part_id in sorted(conflicts)))
+
+
+def _part_row(cursor, row):
+    return Part._make(row)
+
+
+def _after(field, descending, value, part_id, id_column="c.id"):
+    """Return the (WHERE clause, params) segments that select, in order, the rows sorted after (value, part_id).
+
+    Each segment is a row-value comparison or an IS NULL test that SQLite answers with a seek on the
+    field's index. SQLite sorts NULL first, so the NULL rows of a column get a segment of their own.
+    """
+    if field == "id":
+        return [(f"{id_column} < ?" if descending else f"{id_column} > ?", [part_id])]
+    column = f"c.{field}"
+    if descending:
+        if value is None:
+            return [(f"{column} IS NULL AND {id_column} < ?", [part_id])]
+        return [(f"({column}, {id_column}) < (?, ?)", [value, part_id]), (f"{column} IS NULL", [])]
+    if value is None:
+        return [(f"{column} IS NULL AND {id_column} > ?", [part_id]), (f"{column} IS NOT NULL", [])]
+    return [(f"({column}, {id_column}) > (?, ?)", [value, part_id])]
+
+
+def is_keyset(query):
+    """Return True if query is paged by keyset (everything but relevance order)."""
+    return query.order is not None or not query.match
+
+
+class PartsRepository:
+    """Reads and writes parts on one SQLite connection.
+
+    Queries are passed around as PartsQuery tuples, so a caller can page through them (and the search
+    worker can run them on its own connection). Rows come back as Part tuples. Writes that take
+    several records run as one executemany inside a single transaction.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._facet_cache = None  # ((total_changes, data_version), grouped rows)
+
+    # Queries
+
+    def all_parts_query(self, filters=None, order=None, descending=False):
+        return self.search_query("", filters, order, descending)
+
+    def search_query(self, search_term, filters=None, order=None, descending=False, datasheets=False):
+        """Return the PartsQuery listing the parts that match search_term (every part if it is empty) and filters.
+
+        With datasheets=True, parts whose datasheet text matches are listed too (where the datasheet
+        index exists); the results are then in id order rather than best match first.
+        """
+        where, params, match, datasheet_match = [], [], None, None
+        search_term = (search_term or "").strip()
+        if search_term:
+            match_query = to_match_query(search_term)
+            if match_query and datasheets and has_datasheet_index(self.conn):
+                # Either index may match, so neither can drive the query's ranking
+                where.append("(c.id IN (SELECT rowid FROM components_fts WHERE components_fts MATCH ?)"
+                             " OR c.id IN (SELECT rowid FROM datasheet_fts WHERE datasheet_fts MATCH ?))")
+                params += [match_query, match_query]
+                datasheet_match = match_query
+            elif match_query and has_search_index(self.conn):
+                # Prefix-match every word through the full-text index
+                match = match_query
+            else:
+                # No index (or nothing indexable in the term): scan CUS ID, Part, Description and Type
+                where.append("(c.cus_id LIKE ? OR c.type LIKE ? OR c.part LIKE ? OR c.description LIKE ?)")
+                params += [f'%{search_term}%'] * 4
+
+        filters = filters or Filters()
+        if filters.type is not None:
+            where.append("c.type = ?")
+            params.append(filters.type)
+        if filters.footprint is not None:
+            where.append("c.footprint = ?")
+            params.append(filters.footprint)
+        # The + keeps stock bounds out of the indexes: a range read through idx_components_stock comes out
+        # in stock order, to be sorted again for every page in any other. Rows are read in the order's
+        # index instead, skipping those out of range, until the page is full.
+        if filters.min_stock is not None:
+            where.append("+c.stock >= ?")
+            params.append(filters.min_stock)
+        if filters.max_stock is not None:
+            where.append("+c.stock <= ?")
+            params.append(filters.max_stock)
+        if filters.has_datasheet is not None:
+            where.append("COALESCE(c.datasheetpath, '') != ''" if filters.has_datasheet
+                         else "COALESCE(c.datasheetpath, '') = ''")
+        if filters.low_stock:
+            where.append("c.min_stock > 0 AND c.stock < c.min_stock")  # Matches idx_components_low_stock
+
+        return self.sorted_query(PartsQuery(tuple(where), tuple(params), match, datasheet_match=datasheet_match),
+                                 order, descending)
+
+    def sorted_query(self, query, order=None, descending=False):
+        """Return query ordered by the given field, or in its default order if order is None.
+
+        The default is best match first for a search, but a search matching more than RANKED_MATCHES
+        parts is listed by id instead, which the index returns in order without scoring every match.
+        Filters don't change that: the cost is in reading the matches, before they are filtered.
+        """
+        if order is not None and order not in SORT_FIELDS:
+            raise ValueError(f"Can't sort parts by {order}")
+        if order is None and query.match and self.conn.execute(MANY_MATCHES_SQL,
+                                                               (query.match, RANKED_MATCHES)).fetchone():
+            order = "id"
+        return query._replace(order=order, descending=descending)
+
+    def page_sql(self, query, after=None):
+        """Return the (sql, params) of query without a LIMIT, starting after the given row if paging by keyset."""
+        where, params = list(query.where), list(query.params)
+        if query.match:
+            source = "components_fts JOIN components c ON c.id = components_fts.rowid"
+            where.insert(0, "components_fts MATCH ?")
+            params.insert(0, query.match)
+            id_column = "components_fts.rowid"  # The index returns matches in rowid order, so id order needs no sort
+        else:
+            source = "components c"
+            id_column = "c.id"
+
+        order = query.order or (None if query.match else "id")
+        if order is not None and f"c.{order} = ?" in where:
+            order = "id"  # Every row has the same value, so it is id order, which the filter's index reads in
+        if order is None:
+            order_by = f"{RANK}, c.id"
+        else:
+            direction = "DESC" if query.descending else "ASC"
+            order_by = f"{id_column} {direction}" if order == "id" else f"c.{order} {direction}, {id_column} {direction}"
+
+        segments = [((), [])]
+        if after is not None and order is not None:
+            segments = [((clause,), values)
+                        for clause, values in _after(order, query.descending, after[Part._fields.index(order)], after[0],
+                                                     id_column)]
+
+        selects, all_params = [], []
+        for clauses, values in segments:
+            sql = f"SELECT {QUALIFIED_COLUMNS} FROM {source}"
+            if where or clauses:
+                sql += " WHERE " + " AND ".join(where + list(clauses))
+            selects.append(f"{sql} ORDER BY {order_by}")
+            all_params += params + values
+        if len(selects) == 1:
+            return selects[0], all_params
+        # Each segment keeps its own index-ordered scan; UNION ALL reads the next only once one runs out
+        return " UNION ALL ".join(f"SELECT * FROM ({sql})" for sql in selects), all_params
+
+    # Reads
+
+    def cursor(self, query, limit=DEFAULT_LIMIT, offset=0, after=None):
+        """Execute one page of query and return the cursor, which yields Part rows.
+
+        Keyset queries continue after the given row (the last one of the previous page); offset is
+        only used for queries ordered by relevance. Useful to stream a page in pieces with fetchmany;
+        close the cursor when done with it.
+        """
+        if is_keyset(query):
+            sql, params = self.page_sql(query, after)
+            sql, params = f"{sql} LIMIT ?", params + [limit]
+        else:
+            sql, params = self.page_sql(query)
+            sql, params = f"{sql} LIMIT ? OFFSET ?", params + [limit, offset]
+        cursor = self.conn.cursor()
+        cursor.row_factory = _part_row
+        cursor.execute(sql, params)
+        return cursor
+
+    def get_page(self, offset=0, limit=DEFAULT_LIMIT, query=None, after=None):
+        """Return up to limit Parts of query (all parts by default), after the given row or offset."""
+        query = query or self.all_parts_query()
+        if after is None and offset and is_keyset(query):
+            # Find the row to continue after, since keyset queries carry no OFFSET
+            sql, params = self.page_sql(query)
+            after = self.conn.execute(f"{sql} LIMIT 1 OFFSET ?", params + [offset - 1]).fetchone()
+            if after is None:
+                return []
+        cursor = self.cursor(query, limit, offset, after)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def search(self, search_term, offset=0, limit=DEFAULT_LIMIT, filters=None):
+        """Return up to limit Parts matching search_term and filters, best matches first."""
+        return self.get_page(offset, limit, self.search_query(search_term, filters))
+
+    def get(self, part_id):
+        """Return the Part with the given id, or None."""
+        row = self.conn.execute(f"SELECT {SELECT_COLUMNS} FROM components WHERE id = ?", (part_id,)).fetchone()
+        return Part._make(row) if row else None
+
+    def get_many(self, part_ids):
+        """Return the Parts with the given ids (missing ones are left out), in id order."""
+        cursor = self.conn.cursor()
+        cursor.row_factory = _part_row
+        return cursor.execute(f'''SELECT {SELECT_COLUMNS} FROM components
+                                  WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id''',
+                              (json.dumps(list(part_ids)),)).fetchall()
+
+    def versions(self, part_ids):
+        """Return {id: version} for the given parts that exist."""
+        return dict(self.conn.execute(VERSIONS_SQL, (json.dumps(list(part_ids)),)))
+
+    def datasheet_hashes(self, part_ids):
+        """Return {id: datasheet_hash} for the given saved parts (None ids are ignored)."""
+        part_ids = [part_id for part_id in part_ids if part_id is not None]
+        if not part_ids:
+            return {}
+        placeholders = ", ".join("?" * len(part_ids))
+        return dict(self.conn.execute(f"SELECT id, datasheet_hash FROM components WHERE id IN ({placeholders})",
+                                      part_ids))
+
+    def datasheet_snippets(self, match, part_ids):
+        """Return {id: snippet} with the passage of each given part's datasheet that matches the MATCH
+        expression match (as in PartsQuery.datasheet_match), the matched words in [brackets]."""
+        return dict(self.conn.execute(DATASHEET_SNIPPETS_SQL, (match, json.dumps(list(part_ids)))))
+
+    def facet_counts(self, filters=None):
+        """Return {"type": {type: count}, "footprint": {footprint: count}, "has_datasheet": {bool: count}}.
+
+        Each facet is counted within the other facets' current selections, so a count says how many
+        parts picking that value would leave (the stock range is not taken into account). The counts
+        come from one grouped query that is cached until the database is next written to.
+        """
+        filters = filters or Filters()
+        version = (self.conn.total_changes, self.conn.execute("PRAGMA data_version").fetchone()[0])
+        if self._facet_cache is None or self._facet_cache[0] != version:
+            self._facet_cache = (version, self.conn.execute(FACETS_SQL).fetchall())
+
+        counts = {"type": {}, "footprint": {}, "has_datasheet": {}}
+        for part_type, footprint, has_datasheet, count in self._facet_cache[1]:
+            values = {"type": part_type, "footprint": footprint, "has_datasheet": bool(has_datasheet)}
+            selected = {facet: getattr(filters, facet) in (None, value) for facet, value in values.items()}
+            for facet, value in values.items():
+                if all(ok for other, ok in selected.items() if other != facet):
+                    counts[facet][value] = counts[facet].get(value, 0) + count
+        return counts
+
+    def clear_cache(self):
+        """Forget the cached facet counts. Needed once the database is replaced through this
+        connection (a restore), which neither its change count nor data_version notices."""
+        self._facet_cache = None
+
+    def stock_summary(self):
+        """Return the StockSummary of every type/footprint pair that has parts.
+
+        Read from the trigger-maintained stock_summary table, so the cost doesn't grow with the inventory.
+        """
+        rows = self.conn.execute('''SELECT type, footprint, parts, units, low FROM stock_summary
+                                    WHERE parts > 0 ORDER BY type, footprint''')
+        return [StockSummary._make(row) for row in rows]
+
+    def low_stock_count(self):
+        """Return how many parts are below their minimum stock."""
+        return self.conn.execute("SELECT COALESCE(SUM(low), 0) FROM stock_summary").fetchone()[0]
+
+    def reorder_items(self):
+        """Yield the reorder report as dicts of REORDER_FIELDS, one per part below its minimum."""
+        for row in self.conn.execute(REORDER_SQL):
+            yield dict(zip(REORDER_FIELDS, row))
+
+    # Writes
+
+    def transaction(self):
+        """Run the enclosed writes in one IMMEDIATE transaction, committed on success."""
+        return transaction(self.conn)
+
+    def check_versions(self, expected):
+        """Raise ConflictError if any part's version is not the one given in {id: version}.
+
+        A part that has been deleted conflicts too. Call inside a transaction, so nothing can change
+        between the check and the write.
+        """
+        current = self.versions(expected)
+        conflicts = {part_id: current.get(part_id) for part_id, version in expected.items()
+                     if current.get(part_id) != version}
+        if conflicts:
+            raise ConflictError(conflicts)
+
+    def upsert_many(self, records):
+        """Insert or update records in Part field order with one executemany.
+
+        Records whose id is None are new; they are given ids up front, so all rows go through the same
+        UPSERT keyed on id. A version field, if present, is not written (the database bumps it).
+        Returns the ids assigned to the new records, in order.
+        """
+        records = list(records)
+        with self.transaction():
+            new_count = sum(1 for record in records if record[0] is None)
+            new_ids = []
+            if new_count:
+                last_id = self.conn.execute(NEXT_ID_SQL).fetchone()[0]
+                new_ids = list(range(last_id + 1, last_id + 1 + new_count))
+            assigned = iter(new_ids)
+            rows = [[record[0] if record[0] is not None else next(assigned)] + list(record[1:VERSION])
+                    for record in records]
+            self.conn.executemany(UPSERT_SQL, rows)
+        return new_ids
+
+    def set_many(self, field, values, expected=None, previous=None):
+        """Set one field (one of BULK_FIELDS) of many parts, {id: value}, with one executemany.
+
+        expected ({id: version}) is checked first, as in save(); previous ({id: value}) only checks
+        that the field itself still holds the given values, whatever else changed. Either way
+        ConflictError is raised with nothing written if a part has moved on (or is gone).
+        Returns {id: version} the parts are now at.
+        """
+        if field not in BULK_FIELDS:
+            raise ValueError(f"Can't set {field} on many parts")
+        with self.transaction():
+            if expected:
+                self.check_versions(expected)
+            if previous:
+                current = {part.id: part for part in self.get_many(previous)}
+                conflicts = {part_id: current[part_id].version if part_id in current else None
+                             for part_id, value in previous.items()
+                             if part_id not in current or getattr(current[part_id], field) != value}
+                if conflicts:
+                    raise ConflictError(conflicts)
+            self.conn.executemany(f"UPDATE components SET {field} = ? WHERE id = ?",
+                                  [(value, part_id) for part_id, value in values.items()])
+            return self.versions(values)
+
+    def delete_many(self, part_ids):
+        """Delete the parts with the given ids and return how many rows went."""
+        with self.transaction():
+            deleted = self.conn.executemany(DELETE_SQL, [(part_id,) for part_id in part_ids]).rowcount
+        return max(deleted, 0)
+
+    def save(self, inserted=(), updated=(), deleted=()):
+        """Persist a batch of table edits in one transaction and return a SaveResult.
+
+        deleted holds part ids, or (id, version) pairs. Updated records that carry a version, and
+        deletions that give one, are only written if the part is still at that version; otherwise
+        nothing is saved and ConflictError is raised. Parts someone else already deleted are skipped.
+        """
+        inserted, updated = [[None] + list(record[1:]) for record in inserted], list(updated)
+        deleted = [item if isinstance(item, (tuple, list)) else (item, None) for item in deleted]
+        with self.transaction():
+            expected = {record[0]: record[VERSION] for record in updated
+                        if len(record) > VERSION and record[VERSION] is not None}
+            current = self.versions(part_id for part_id, _ in deleted)
+            expected.update((part_id, version) for part_id, version in deleted
+                            if version is not None and part_id in current)
+            self.check_versions(expected)
+            new_ids = self.upsert_many(inserted + updated)
+            deleted_count = self.delete_many(part_id for part_id, _ in deleted)
+            versions = self.versions(new_ids + [record[0] for record in updated])
+        return SaveResult(new_ids, len(updated), deleted_count, versions)
+
+    # Change polling
+
+    def data_version(self):
+        """Return PRAGMA data_version, which changes whenever another connection commits to the database."""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_change(self):
+        """Return the sequence number of the latest change logged (0 if there never was one)."""
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'component_changes'").fetchone()
+        return row[0] if row else 0
+
+    def changes_since(self, seq):
+        """Return (latest seq, {part_id: op}) for the parts changed after change log entry seq.
+
+        op is the part's last change: 'insert', 'update' or 'delete'. Returns None if entries after seq
+        have already been pruned, in which case the caller should reload everything.
+        """
+        oldest = self.conn.execute("SELECT MIN(seq) FROM component_changes").fetchone()[0]
+        if oldest is not None and oldest > seq + 1:
+            return None  # Sequence numbers are never reused, so a gap means entries were pruned
+        changes = {}
+        for change_seq, part_id, op in self.conn.execute(
+                "SELECT seq, part_id, op FROM component_changes WHERE seq > ? ORDER BY seq", (seq,)):
+            seq, changes[part_id] = change_seq, op
+        return seq, changes
+
+    def prune_changes(self, keep=CHANGE_LOG_SIZE):
+        """Drop all but the newest keep entries of the change log and return how many went."""
+        with self.transaction():
+            return self.conn.execute("DELETE FROM component_changes WHERE seq <= ?",
+                                     (self.last_change() - keep,)).rowcount
+
+    def set_datasheet(self, part_id, relative_path, digest=None):
+        """Link a datasheet (path relative to the app, and its cache hash if known) to a part.
+
+        Returns the part's new version, or None if it no longer exists.
+        """
+        with self.transaction():
+            self.conn.execute(SET_DATASHEET_SQL, (relative_path, digest, part_id))
+            return self.versions([part_id]).get(part_id)
+
+    def set_datasheet_hash(self, part_id, digest):
+        with self.transaction():
+            self.conn.execute(SET_DATASHEET_HASH_SQL, (digest, part_id))
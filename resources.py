@@ -0,0 +1,90 @@
+"""The type and footprint vocabularies and the stylesheet, shared across the GUI and reloaded live.
+
+Each vocabulary lives in one QStringListModel that every Type/Footprint combo editor uses as its
+model, so opening an editor never copies the list, however many footprints data.json grows to.
+data/data.json and style/style.qss are watched: saving either applies the change to the running
+app, without a restart.
+"""
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QStringListModel, QTimer, pyqtSignal
+
+from startup import read_vocabularies, read_stylesheet
+
+
+RELOAD_DELAY_MS = 200  # Editors often write a file in several steps; wait for them to finish
+
+
+class SharedResources(QObject):
+    """Owns the vocabulary models and watches the files they and the stylesheet come from.
+
+    types and footprints are the shared QStringListModels. vocabulariesChanged is emitted after
+    they are reloaded, stylesheetChanged with the new stylesheet text, and reloadFailed with the
+    path and reason when a changed file can't be read (the previous contents stay in use).
+    """
+
+    vocabulariesChanged = pyqtSignal()
+    stylesheetChanged = pyqtSignal(str)
+    reloadFailed = pyqtSignal(str, str)
+
+    def __init__(self, data_file, style_file, vocabularies=None, parent=None):
+        """vocabularies is the (types, footprints) already read during startup, if any; otherwise the
+        data file is read now and its errors are raised."""
+        super().__init__(parent)
+        self.data_file = data_file
+        self.style_file = style_file
+        types, footprints = vocabularies or read_vocabularies(data_file)
+        self.types = QStringListModel(types, self)
+        self.footprints = QStringListModel(footprints, self)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._schedule)
+        self._pending = set()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(RELOAD_DELAY_MS)
+        self._timer.timeout.connect(self._reload)
+        self._watch()
+
+    def type_list(self):
+        return self.types.stringList()
+
+    def footprint_list(self):
+        return self.footprints.stringList()
+
+    def _watch(self):
+        # A file replaced on save (written elsewhere and renamed over) drops out of the watch list
+        missing = [path for path in (self.data_file, self.style_file) if path not in self.watcher.files()]
+        for path in missing:
+            self.watcher.addPath(path)  # Fails quietly while the file doesn't exist
+
+    def _schedule(self, path):
+        self._pending.add(path)
+        self._timer.start()
+
+    def _reload(self):
+        pending, self._pending = self._pending, set()
+        self._watch()
+        if self.data_file in pending:
+            self.reload_vocabularies()
+        if self.style_file in pending:
+            self.reload_stylesheet()
+
+    def reload_vocabularies(self):
+        """Read the data file again and update the models if the lists changed."""
+        try:
+            types, footprints = read_vocabularies(self.data_file)
+        except (OSError, ValueError) as e:  # json.JSONDecodeError is a ValueError
+            self.reloadFailed.emit(self.data_file, str(e))
+            return
+        changed = False
+        for model, values in ((self.types, types), (self.footprints, footprints)):
+            if model.stringList() != values:
+                model.setStringList(values)
+                changed = True
+        if changed:
+            self.vocabulariesChanged.emit()
+
+    def reload_stylesheet(self):
+        try:
+            self.stylesheetChanged.emit(read_stylesheet(self.style_file))
+        except OSError as e:
+            self.reloadFailed.emit(self.style_file, str(e))
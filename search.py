@@ -1,58 +1,225 @@
 import sqlite3
-from PyQt5.QtWidgets import QLineEdit, QPushButton, QTableWidgetItem
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIntValidator
-
-def searchDatabase(main_window, conn, search_term):
-    """Search the database for components based on the search query or load all if empty"""
-    cursor = conn.cursor()
-    
-    try:
-        # Check if the search term is empty, if so load all data
-        if not search_term:
-            cursor.execute("SELECT id, cus_id, type, part, description, footprint, stock, datasheetpath FROM components")
-        else:
-            # Perform a search based on the search term in CUS ID, Part, Description, and Type fields
-            cursor.execute('''SELECT id, cus_id, type, part, description, footprint, stock, datasheetpath 
-                              FROM components
-                              WHERE cus_id LIKE ? OR type LIKE ? OR part LIKE ? OR description LIKE ?''',
-                           (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
-
-        rows = cursor.fetchall()
-        main_window.ui.partsTable.setRowCount(0)  # Clear the table before inserting results
-
-        for row_data in rows:
-            row_pos = main_window.ui.partsTable.rowCount()
-            main_window.ui.partsTable.insertRow(row_pos)
-
-            for column, value in enumerate(row_data):
-                if column == 6:  # Stock column (editable)
-                    stock_input = QLineEdit()
-                    stock_input.setValidator(QIntValidator())  # Ensure only integers are allowed
-                    stock_input.setText(str(value))
-                    main_window.ui.partsTable.setCellWidget(row_pos, column, stock_input)
-                elif column == 0:  # ID column (non-editable)
-                    id_item = QTableWidgetItem(str(value))
-                    id_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-                    main_window.ui.partsTable.setItem(row_pos, column, id_item)
-                elif column == 7:  # Datasheet path column
-                    datasheet_path_item = QTableWidgetItem(str(value))
-                    main_window.ui.partsTable.setItem(row_pos, 9, datasheet_path_item)
-                else:
-                    main_window.ui.partsTable.setItem(row_pos, column, QTableWidgetItem(str(value)))
-
-            # Add Datasheet buttons in the Datasheet column (column 7)
-            add_datasheet_button = QPushButton('Add')
-            view_datasheet_button = QPushButton('View')
-            add_datasheet_button.clicked.connect(lambda _, r=row_pos: main_window.link_datasheet(r))
-            view_datasheet_button.clicked.connect(lambda _, r=row_pos: main_window.view_datasheet(r))
-            main_window.ui.partsTable.setCellWidget(row_pos, 7, main_window.create_button_widget(add_datasheet_button, view_datasheet_button))
-
-            # Add Delete button in the Delete column (column 8)
-            delete_button = QPushButton('Delete')
-            delete_button.clicked.connect(lambda _, r=row_pos: main_window.delete_part(r))  # Capture row_pos
-            main_window.ui.partsTable.setCellWidget(row_pos, 8, delete_button)
-
-    except sqlite3.Error as e:
-        # Catch SQLite database errors and display a message box or log it
-        print(f"Error during search: {e}")
+import time
+
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal, pyqtSlot
+
+from database import connect
+from datasheet_index import DatasheetIndexer
+from datasheet_links import DatasheetLinker
+from parts_model import PAGE_SIZE
+from repository import PartsRepository
+
+# Live search waits for typing to pause this long before querying
+DEBOUNCE_MS = 250
+
+# Rows sent to the table ahead of the rest of the first page
+FIRST_BATCH = 50
+
+
+class SearchWorker(QObject):
+    """Runs search queries on its own thread and SQLite connection.
+
+    Each request carries a generation number. A request is abandoned, even mid-query, as soon as
+    a newer generation is posted to `latest`. Statements are traced into diagnostics while it records.
+    """
+
+    chunkReady = pyqtSignal(int, list, bool, bool)  # generation, rows, done, exhausted
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, db_path, diagnostics=None):
+        super().__init__()
+        self.db_path = db_path
+        self.diagnostics = diagnostics
+        self.conn = None
+        self.repository = None
+        self.latest = 0  # Newest generation requested; written from the GUI thread
+        self._current = 0
+
+    def _stale(self):
+        return self._current != self.latest
+
+    @pyqtSlot(int, object)
+    def run(self, generation, query):
+        """Run one search and stream its first page back in two chunks."""
+        self._current = generation
+        if self._stale():
+            return  # Superseded while queued
+        if self.conn is None:
+            self.conn = connect(self.db_path)
+            # Lets SQLite abort a running statement once a newer search arrives
+            self.conn.set_progress_handler(self._stale, 1000)
+            self.repository = PartsRepository(self.conn)
+        if self.diagnostics is not None:
+            self.diagnostics.attach(self.conn, "search")  # Follows recording being switched on or off
+
+        cursor = None
+        try:
+            cursor = self.repository.cursor(query, PAGE_SIZE)
+            first = cursor.fetchmany(FIRST_BATCH)
+            if self._stale():
+                return
+            if len(first) < FIRST_BATCH:
+                self.chunkReady.emit(generation, first, True, True)
+                return
+            self.chunkReady.emit(generation, first, False, False)
+
+            rest = cursor.fetchall()
+            if self._stale():
+                return
+            self.chunkReady.emit(generation, rest, True, len(first) + len(rest) < PAGE_SIZE)
+        except sqlite3.Error as e:
+            if not self._stale():
+                self.failed.emit(generation, str(e))
+        finally:
+            if cursor is not None:
+                cursor.close()  # An abandoned statement would otherwise keep the database read-locked
+            if self.diagnostics is not None:
+                self.diagnostics.flush(self.conn)
+
+    def close(self):
+        if self.conn is not None:
+            if self.diagnostics is not None:
+                self.diagnostics.detach(self.conn)
+            self.conn.close()
+            self.conn = None
+            self.repository = None
+
+
+class LiveSearch(QObject):
+    """Debounced search-as-you-type that keeps querying off the GUI thread."""
+
+    requested = pyqtSignal(int, object)
+    reconnectRequested = pyqtSignal()
+
+    def __init__(self, main_window, db_path):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.generation = 0
+        self._term = ""
+        self._pending = None  # (generation, query) of the search whose results haven't arrived yet
+        self._started = None  # When the current search was started, and its first rows shown, for diagnostics
+        self._first_rows = None
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self._start)
+
+        self.thread = QThread(self)
+        self.worker = SearchWorker(db_path, main_window.diagnostics)
+        self.worker.moveToThread(self.thread)
+        self.requested.connect(self.worker.run)
+        self.reconnectRequested.connect(self.worker.close)  # Reopened on the next search
+        self.worker.chunkReady.connect(self._on_chunk)
+        self.worker.failed.connect(self._on_failed)
+        self.thread.finished.connect(self.worker.close, Qt.DirectConnection)  # Close on the worker's own thread
+        self.thread.start()
+
+    def schedule(self, search_term):
+        """Search for search_term once typing pauses."""
+        self._term = search_term.strip()
+        self.timer.start()
+
+    def searchNow(self, search_term):
+        """Search for search_term immediately."""
+        self.timer.stop()
+        self._term = search_term.strip()
+        self._start()
+
+    def _start(self):
+        self.generation += 1
+        self.worker.latest = self.generation
+        query = self.main_window.build_query(self._term)
+        self._pending = (self.generation, query)
+        self._started, self._first_rows = time.perf_counter(), None
+        self.requested.emit(self.generation, query)
+
+    def _on_chunk(self, generation, rows, done, exhausted):
+        if generation != self.generation:
+            return  # A newer search has been started since
+        if self._pending is not None:
+            # Keep showing the old results until the first new ones are in
+            _, query = self._pending
+            self._pending = None
+            self.main_window.model.beginStream(query)
+        self.main_window.model.appendRows(rows, done, exhausted)
+        if self._first_rows is None:
+            self._first_rows = time.perf_counter() - self._started
+        if done:
+            self.main_window.diagnostics.record_action("search", time.perf_counter() - self._started,
+                                                       first_rows_ms=round(self._first_rows * 1000, 2),
+                                                       rows=self.main_window.model.rowCount())
+
+    def _on_failed(self, generation, message):
+        if generation == self.generation:
+            print(f"Error during search: {message}")
+
+    def reconnect(self):
+        """Make the worker open a fresh connection, e.g. after the database file was restored."""
+        self.generation += 1
+        self.worker.latest = self.generation
+        self.reconnectRequested.emit()
+
+    def shutdown(self):
+        """Abandon any running search and stop the worker thread."""
+        self.timer.stop()
+        self.worker.latest = -1
+        self.thread.quit()
+        self.thread.wait()
+
+
+class DatasheetIndexWorker(QThread):
+    """Runs a DatasheetIndexer pass on its own thread and connection.
+
+    The text itself is extracted on the indexer's process pool, so neither the GUI nor searches
+    wait on it. progress(done, total) is emitted as files finish; once the thread has finished,
+    `stats` holds the IndexStats (or `error` a message).
+    """
+
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, db_path, base_dir, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.base_dir = base_dir
+        self.stats = None
+        self.error = None
+
+    def run(self):
+        conn = connect(self.db_path)
+        try:
+            indexer = DatasheetIndexer(conn, self.base_dir)
+            self.stats = indexer.run(self.progress.emit, self.isInterruptionRequested)
+        except (sqlite3.Error, OSError) as e:
+            self.error = str(e)
+        finally:
+            conn.close()
+
+
+class DatasheetLinkWorker(QThread):
+    """Works out a DatasheetLinker plan on its own thread and connection.
+
+    root is the directory to look for datasheets in, or None to only check the existing links.
+    progress(stage, done, total) is emitted as it goes; once the thread has finished, `plan` holds
+    the LinkPlan (or `error` a message). The plan is applied by whoever asked for it.
+    """
+
+    progress = pyqtSignal(str, int, int)
+
+    def __init__(self, db_path, base_dir, root=None, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.base_dir = base_dir
+        self.root = root
+        self.plan = None
+        self.error = None
+
+    def run(self):
+        conn = connect(self.db_path)
+        try:
+            linker = DatasheetLinker(conn, self.base_dir)
+            self.plan = linker.plan(self.root, self.progress.emit, self.isInterruptionRequested)
+        except (sqlite3.Error, OSError) as e:
+            self.error = str(e)
+        finally:
+            conn.close()
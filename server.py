@@ -0,0 +1,400 @@
+"""Headless HTTP/JSON API over the parts database, for scripts, label printers and dashboards.
+
+    python server.py                          # http://127.0.0.1:8765
+    python server.py --host 0.0.0.0 --port 9000 --readers 8
+
+Endpoints (all responses are JSON):
+
+    GET  /parts                  list parts, one page at a time; filters: q, type, footprint, min_stock,
+                                 max_stock, has_datasheet, low_stock; order (id, cus_id, type, part,
+                                 footprint, stock), desc; limit (up to 100000); cursor (the "next"
+                                 value of the previous page)
+    GET  /search?q=...           the same list, best matches first (by id if the words are common)
+    GET  /parts/<id>             one part
+    POST /parts/<id>/stock       {"delta": -3} or {"stock": 40}, with optional "reason" and "note"
+
+Reads run on a small pool of read-only connections; every write goes through one writer
+connection, one at a time. Responses carry an ETag: send it back in If-None-Match to get a 304 if
+nothing has changed, or in If-Match on a stock change to have it refused (412) if the part has
+changed since. Lists are streamed as they are read, so large pages don't have to fit in memory.
+There is no authentication: only listen on other interfaces on a trusted network.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from database import connect, init_db
+from ledger import StockLedger, ADJUSTMENT, RECEIVED, USED
+from repository import PartsRepository, Part, Filters, ConflictError, is_keyset, DEFAULT_LIMIT
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_FILE = os.path.join(BASE_DIR, 'db/components.db')
+
+DEFAULT_PORT = 8765
+DEFAULT_READERS = 4
+MAX_LIMIT = 100000  # Rows one list request may ask for
+STREAM_BATCH = 500  # Rows read and written per chunk of a streamed list
+MAX_BODY = 64 * 1024
+
+
+class ApiError(Exception):
+    """An error to send back as {"error": message} with the given HTTP status."""
+
+    def __init__(self, status, message, part=None):
+        super().__init__(message)
+        self.status = status
+        self.part = part  # The current part, for 412 responses
+
+
+class ReaderPool:
+    """A fixed set of read-only connections, each lent to one request at a time."""
+
+    def __init__(self, db_file, size=DEFAULT_READERS):
+        self._idle = queue.LifoQueue()  # Most recently used first, so its page cache is warm
+        for _ in range(size):
+            conn = connect(db_file, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            self._idle.put(PartsRepository(conn))
+
+    @contextmanager
+    def repository(self):
+        repository = self._idle.get()
+        try:
+            yield repository
+        finally:
+            self._idle.put(repository)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get().conn.close()
+
+
+class Writer:
+    """Runs writes one at a time on a single connection owned by its own thread.
+
+    SQLite allows one writer anyway; queueing writes here means requests never wait on
+    SQLITE_BUSY, and each write is a short IMMEDIATE transaction.
+    """
+
+    def __init__(self, db_file):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='labparts-writer')
+        self._conn = self._executor.submit(connect, db_file).result()
+
+    def run(self, func, *args):
+        """Call func(conn, *args) on the writer thread and return its result (or raise its exception)."""
+        return self._executor.submit(func, self._conn, *args).result()
+
+    def close(self):
+        self._executor.submit(self._conn.close).result()
+        self._executor.shutdown()
+
+
+def adjust_stock(conn, part_id, delta=None, stock=None, reason=None, note=None, expected_version=None):
+    """Book a stock change for one part and return the updated Part. Runs on the writer connection."""
+    repository = PartsRepository(conn)
+    with repository.transaction():
+        part = repository.get(part_id)
+        if part is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No part with id {part_id}")
+        if expected_version is not None and part.version != expected_version:
+            raise ConflictError({part_id: part.version})
+        if stock is not None:
+            delta = stock - (part.stock or 0)
+        if delta:
+            reason = reason or (ADJUSTMENT if stock is not None else USED if delta < 0 else RECEIVED)
+            StockLedger(conn).record([(part_id, delta, reason)], note)
+        return repository.get(part_id)
+
+
+def part_etag(part):
+    return f'"{part.id}.{part.version}"'
+
+
+def list_etag(repository, params):
+    # Every change to a part is logged with a new sequence number, so it identifies the data's state;
+    # the query parameters, in a fixed order, identify which parts and page of it were asked for
+    query = hashlib.sha1(json.dumps(sorted(params.items())).encode()).hexdigest()[:16]
+    return f'W/"{repository.last_change()}-{query}"'
+
+
+def encode_cursor(query, last_part, offset):
+    """Return the opaque "next" token for the page after last_part."""
+    if is_keyset(query):
+        field = query.order or "id"
+        state = {"after": [getattr(last_part, field), last_part.id]}
+    else:
+        state = {"offset": offset}
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip("=")
+
+
+def decode_cursor(query, token):
+    """Return (after, offset) for get_page/cursor from a "next" token."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if "offset" in state:
+            return None, int(state["offset"])
+        value, part_id = state["after"]
+        blank = Part._make([None] * len(Part._fields))
+        fields = {query.order or "id": value, "id": int(part_id)}
+        return blank._replace(**fields), 0
+    except (ValueError, KeyError, TypeError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid cursor")
+
+
+def _int_param(params, name, default=None, minimum=None, maximum=None):
+    if name not in params:
+        return default
+    try:
+        value = int(params[name])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be a whole number")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
+def _bool_param(params, name):
+    if name not in params:
+        return None
+    return params[name].lower() in ("1", "true", "yes", "on")
+
+
+def parse_list_params(repository, params):
+    """Return the PartsQuery, limit and cursor token asked for by a list request's query string."""
+    filters = Filters(type=params.get("type"), footprint=params.get("footprint"),
+                      min_stock=_int_param(params, "min_stock"), max_stock=_int_param(params, "max_stock"),
+                      has_datasheet=_bool_param(params, "has_datasheet"), low_stock=_bool_param(params, "low_stock"))
+    try:
+        query = repository.search_query(params.get("q", ""), filters, params.get("order"),
+                                        bool(_bool_param(params, "desc")))
+    except ValueError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    return query, _int_param(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT), params.get("cursor")
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Routes requests to the endpoints; the pool and writer hang off self.server."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, and chunked streaming of lists
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+    server_version = "LabParts"
+
+    ROUTES = (
+        ("GET", re.compile(r"/parts/?"), "list_parts"),
+        ("GET", re.compile(r"/search/?"), "search_parts"),
+        ("GET", re.compile(r"/parts/(\d+)"), "get_part"),
+        ("POST", re.compile(r"/parts/(\d+)/stock"), "post_stock"),
+    )
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            for route_method, pattern, handler in self.ROUTES:
+                match = pattern.fullmatch(url.path)
+                if match and route_method == method:
+                    return getattr(self, handler)(params, *match.groups())
+            if any(pattern.fullmatch(url.path) for _, pattern, _ in self.ROUTES):
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported here")
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No endpoint {url.path}")
+        except ApiError as e:
+            body = {"error": str(e)}
+            if e.part is not None:
+                body["part"] = e.part._asdict()
+            self.send_json(e.status, body, part_etag(e.part) if e.part is not None else None)
+        except sqlite3.Error as e:
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": f"Database error: {e}"})
+
+    # Responses
+
+    def not_modified(self, etag):
+        """Return True (having sent a 304) if the request's If-None-Match matches etag."""
+        tags = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+        if etag not in tags and etag.removeprefix("W/") not in tags and "*" not in tags:
+            return False
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+
+    def send_json(self, status, body, etag=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def write_chunk(self, text):
+        data = text.encode()
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def stream_parts(self, repository, query, limit, token, etag):
+        """Send one page of query as {"parts": [...], "next": token or null}, STREAM_BATCH rows at a time."""
+        after, offset = decode_cursor(query, token) if token else (None, 0)
+        cursor = repository.cursor(query, limit, offset, after)
+        try:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.write_chunk('{"parts": [')
+            count, last = 0, None
+            try:
+                while True:
+                    rows = cursor.fetchmany(STREAM_BATCH)
+                    if not rows:
+                        break
+                    self.write_chunk(("," if count else "") + ",".join(json.dumps(row._asdict()) for row in rows))
+                    count, last = count + len(rows), rows[-1]
+            except sqlite3.Error as e:
+                # Too late for an error response: the 200 and part of the list are out. The body is left
+                # without its last chunk and the connection dropped, so the client sees it cut short.
+                self.log_error("Listing parts failed after %d rows: %s", count, e)
+                self.close_connection = True
+                return
+            next_token = encode_cursor(query, last, offset + count) if count == limit else None
+            self.write_chunk(f'], "count": {count}, "next": {json.dumps(next_token)}}}')
+            self.wfile.write(b"0\r\n\r\n")
+        finally:
+            cursor.close()
+
+    # Endpoints
+
+    def list_parts(self, params):
+        with self.server.readers.repository() as repository:
+            etag = list_etag(repository, params)
+            if self.not_modified(etag):
+                return
+            query, limit, token = parse_list_params(repository, params)
+            self.stream_parts(repository, query, limit, token, etag)
+
+    def search_parts(self, params):
+        if not params.get("q", "").strip():
+            raise ApiError(HTTPStatus.BAD_REQUEST, "q is required")
+        self.list_parts(params)
+
+    def get_part(self, params, part_id):
+        with self.server.readers.repository() as repository:
+            part = repository.get(int(part_id))
+        if part is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No part with id {part_id}")
+        if not self.not_modified(part_etag(part)):
+            self.send_json(HTTPStatus.OK, part._asdict(), part_etag(part))
+
+    def post_stock(self, params, part_id):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY:
+            self.close_connection = True  # The body is left unread, so the next request can't be found
+            if length > MAX_BODY:
+                raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length must be a whole number of bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        delta, stock = body.get("delta"), body.get("stock")
+        value = delta if stock is None else stock
+        # JSON true and false come back as bools, which are ints too
+        if (delta is None) == (stock is None) or not isinstance(value, int) or isinstance(value, bool):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Give a whole number "delta" or "stock"')
+        if stock is not None and stock < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, '"stock" can\'t be negative')
+        for field in ("reason", "note"):
+            if not isinstance(body.get(field), (str, type(None))):
+                raise ApiError(HTTPStatus.BAD_REQUEST, f'"{field}" must be a string')
+
+        expected = None
+        if_match = self.headers.get("If-Match")
+        if if_match:
+            match = re.fullmatch(r'"(\d+)\.(\d+)"', if_match.strip())
+            if not match or int(match.group(1)) != int(part_id):
+                raise ApiError(HTTPStatus.PRECONDITION_FAILED, "If-Match is not this part's ETag")
+            expected = int(match.group(2))
+        try:
+            part = self.server.writer.run(adjust_stock, int(part_id), delta, stock, body.get("reason"),
+                                          body.get("note"), expected)
+        except ConflictError:
+            with self.server.readers.repository() as repository:
+                current = repository.get(int(part_id))
+            raise ApiError(HTTPStatus.PRECONDITION_FAILED, "The part has changed since it was read", current)
+        self.send_json(HTTPStatus.OK, part._asdict(), part_etag(part))
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer holding the reader pool and the writer the handlers share."""
+
+    daemon_threads = True
+
+    def __init__(self, address, db_file, readers=DEFAULT_READERS, quiet=False):
+        conn = connect(db_file)
+        try:
+            init_db(conn)  # Migrate once, before any reader opens
+        finally:
+            conn.close()
+        self.readers = ReaderPool(db_file, readers)
+        self.writer = Writer(db_file)
+        self.quiet = quiet
+        super().__init__(address, ApiHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.readers.close()
+        self.writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LabParts HTTP/JSON API")
+    parser.add_argument('--db', default=DATABASE_FILE, help="database file (default: db/components.db)")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--readers', type=int, default=DEFAULT_READERS, help="read connections in the pool")
+    parser.add_argument('--quiet', action='store_true', help="don't log each request")
+    args = parser.parse_args(argv)
+
+    try:
+        server = ApiServer((args.host, args.port), args.db, args.readers, args.quiet)
+    except (OSError, sqlite3.Error) as e:
+        sys.exit(f"Error: {e}")
+    print(f"LabParts API on http://{args.host}:{server.server_address[1]}/parts (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
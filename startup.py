@@ -0,0 +1,148 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database import connect, init_db
+from ledger import StockLedger
+from parts_model import PAGE_SIZE
+from repository import PartsRepository
+
+
+# Everything MainWindow needs that can be prepared before it is built
+StartupData = namedtuple('StartupData', 'types footprints stylesheet first_page')
+
+
+class StartupProfile:
+    """Collects how long each startup phase took, for --profile-startup."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []  # (name, seconds)
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    def report(self):
+        """Return the per-phase timings and the time to first interactive as printable text."""
+        lines = ["Startup profile:"]
+        lines += [f"  {name:<24}{seconds * 1000:9.1f} ms" for name, seconds in self.phases]
+        lines.append(f"  {'first interactive':<24}{(time.perf_counter() - self.start) * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+
+def timed(func, *args):
+    """Call func(*args) and return (result, seconds taken)."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+_parsed = {}  # (reader, path) -> ((mtime, size), result)
+_parsed_lock = threading.Lock()
+
+
+def cached_read(reader):
+    """Wrap reader(path) so a file is only read and parsed again once its modification time or size
+    changes. Startup, the main window and hot reloads then share one parse of each file."""
+    @functools.wraps(reader)
+    def read(path):
+        stat = os.stat(path)
+        key, version = (reader.__name__, os.path.abspath(path)), (stat.st_mtime_ns, stat.st_size)
+        with _parsed_lock:
+            entry = _parsed.get(key)
+        if entry and entry[0] == version:
+            return entry[1]
+        result = reader(path)
+        with _parsed_lock:
+            _parsed[key] = (version, result)
+        return result
+    return read
+
+
+@cached_read
+def read_vocabularies(data_file):
+    """Return the (types, footprints) lists from the JSON data file. Treat them as read-only: they are cached."""
+    with open(data_file, 'r') as f:
+        data = json.load(f)
+    return data.get("types", []), data.get("footprints", [])
+
+
+@cached_read
+def read_stylesheet(style_file):
+    with open(style_file, 'r') as f:
+        return f.read()
+
+
+def open_and_load_first_page(db_file):
+    """Open (and if needed migrate) the database and read the first page of parts."""
+    conn = connect(db_file)
+    try:
+        init_db(conn)
+        return PartsRepository(conn).get_page(0, PAGE_SIZE)
+    finally:
+        conn.close()
+
+
+def housekeeping(db_file):
+    """Snapshot stock if the last snapshot is old enough and trim the change log."""
+    conn = connect(db_file)
+    try:
+        StockLedger(conn).snapshot_if_due()
+        PartsRepository(conn).prune_changes()
+    finally:
+        conn.close()
+
+
+class StartupWorker(QThread):
+    """Prepares StartupData off the GUI thread while the splash screen is up.
+
+    The data file and stylesheet are read on a small pool while the database is opened, migrated
+    and queried. On success `data` is set; on failure `error` holds a message.
+    """
+
+    progress = pyqtSignal(str, int)  # message, percent complete
+
+    def __init__(self, db_file, data_file, style_file, parent=None):
+        super().__init__(parent)
+        self.db_file = db_file
+        self.data_file = data_file
+        self.style_file = style_file
+        self.data = None
+        self.error = None
+        self.timings = []  # (phase, seconds), read once the thread has finished
+
+    def run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                vocabularies = pool.submit(timed, read_vocabularies, self.data_file)
+                stylesheet = pool.submit(timed, read_stylesheet, self.style_file)
+
+                self.progress.emit("Opening database...", 10)
+                first_page, seconds = timed(open_and_load_first_page, self.db_file)
+                self.timings.append(("database + first page", seconds))
+
+                _, seconds = timed(housekeeping, self.db_file)
+                self.timings.append(("housekeeping", seconds))
+
+                self.progress.emit("Loading component types...", 70)
+                (types, footprints), seconds = vocabularies.result()
+                self.timings.append(("data.json", seconds))
+
+                self.progress.emit("Loading resources...", 90)
+                style, seconds = stylesheet.result()
+                self.timings.append(("stylesheet", seconds))
+
+            self.data = StartupData(types, footprints, style, first_page)
+            self.progress.emit("Initialization Complete!", 100)
+        except FileNotFoundError as e:
+            self.error = f"File not found: {e.filename}"
+        except json.JSONDecodeError as e:
+            self.error = f"Error reading JSON data: {e}"
+        except Exception as e:
+            self.error = str(e)
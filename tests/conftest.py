@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect, init_db  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """A fresh, fully migrated parts database."""
+    conn = connect(str(tmp_path / "components.db"))
+    init_db(conn)
+    yield conn
+    conn.close()
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from backup import create_backup, list_backups, restore_backup
+from database import connect
+from repository import PartsRepository
+
+
+def parts(conn):
+    return conn.execute("SELECT part, stock FROM components ORDER BY id").fetchall()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_restore_brings_back_the_backed_up_parts(conn, tmp_path, compress):
+    conn.executemany("INSERT INTO components (part, stock) VALUES (?, ?)", [("LM358", 10), ("NE555", 4)])
+    conn.commit()
+    backups = tmp_path / "backups"
+    path = create_backup(conn, str(backups), compress=compress, keep=2)
+    assert path.endswith(".db.gz" if compress else ".db")
+
+    conn.execute("UPDATE components SET stock = 0")
+    conn.execute("INSERT INTO components (part) VALUES ('TL072')")
+    conn.commit()
+    other = connect(conn.execute("PRAGMA database_list").fetchone()[2])
+    restore_backup(conn, path)
+    assert parts(conn) == [("LM358", 10), ("NE555", 4)]
+    assert parts(other) == [("LM358", 10), ("NE555", 4)]  # Other connections see the restored database
+    other.close()
+
+    for _ in range(3):
+        create_backup(conn, str(backups), compress=compress, keep=2)
+    assert len(list_backups(str(backups))) == 2
+
+
+def test_damaged_backup_is_refused_before_anything_is_overwritten(conn, tmp_path):
+    conn.execute("INSERT INTO components (part, stock) VALUES ('LM358', 10)")
+    conn.commit()
+    path = create_backup(conn, str(tmp_path / "backups"))
+    with open(path, "r+b") as backup:
+        backup.seek(100)
+        backup.write(b"\xff" * 4000)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        restore_backup(conn, path)
+    assert parts(conn) == [("LM358", 10)]
+
+
+def test_facet_counts_follow_a_restore(conn, tmp_path):
+    conn.executemany("INSERT INTO components (type, part) VALUES (?, ?)", [("IC", "LM358"), ("IC", "NE555")])
+    conn.commit()
+    repository = PartsRepository(conn)
+    path = create_backup(conn, str(tmp_path / "backups"))
+    conn.execute("UPDATE components SET type = 'Resistor'")
+    conn.commit()
+    assert repository.facet_counts()["type"] == {"Resistor": 2}
+
+    restore_backup(conn, path)
+    repository.clear_cache()
+    assert repository.facet_counts()["type"] == {"IC": 2}
@@ -0,0 +1,102 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtWidgets import QUndoStack  # noqa: E402
+
+import batch_edit  # noqa: E402
+from batch_edit import ADD, DeleteCommand, SetFieldCommand, adjusted_stock  # noqa: E402
+from diagnostics import Diagnostics  # noqa: E402
+from parts_model import PartsTableModel, COL_STOCK  # noqa: E402
+from projects import ProjectRepository  # noqa: E402
+from repository import PartsRepository  # noqa: E402
+
+
+class Window:
+    """What the commands use of MainWindow, with the warnings they would show."""
+
+    def __init__(self, conn, tmp_path):
+        self.conn = conn
+        self.repository = PartsRepository(conn)
+        self.model = PartsTableModel(self.repository)
+        self.model.refresh()
+        self.diagnostics = Diagnostics(str(tmp_path / "diagnostics.jsonl"))
+        self.warnings = []
+
+    def update_facets(self):
+        pass
+
+    def index_datasheets(self):
+        pass
+
+
+@pytest.fixture
+def window(conn, tmp_path, monkeypatch):
+    conn.executemany("INSERT INTO components (part, stock) VALUES (?, ?)", [("P1", 5), ("P2", 0), ("P3", 7)])
+    conn.commit()
+    window = Window(conn, tmp_path)
+    monkeypatch.setattr(batch_edit.QMessageBox, "warning", lambda parent, title, text: window.warnings.append(text))
+    return window
+
+
+def stock(conn):
+    return [row[0] for row in conn.execute("SELECT stock FROM components ORDER BY id")]
+
+
+def test_stock_change_undoes_and_redoes_in_one_step(window):
+    stack = QUndoStack()
+    versions = {part_id: window.repository.get(part_id).version for part_id in (1, 2)}
+    values = {part_id: adjusted_stock(window.repository.get(part_id).stock, ADD, 3) for part_id in versions}
+    stack.push(SetFieldCommand(window, COL_STOCK, values, versions, "Add 3 to the stock of 2 parts"))
+    assert stock(window.conn) == [8, 3, 7]
+    assert [window.model.record(row)[COL_STOCK] for row in range(3)] == [8, 3, 7]
+
+    stack.undo()
+    assert stock(window.conn) == [5, 0, 7]
+    assert [window.model.record(row)[COL_STOCK] for row in range(3)] == [5, 0, 7]
+    stack.redo()
+    assert stock(window.conn) == [8, 3, 7]
+    assert window.warnings == []
+
+
+def test_undo_refuses_when_a_part_changed_in_the_meantime(window):
+    stack = QUndoStack()
+    versions = {part_id: window.repository.get(part_id).version for part_id in (1, 2)}
+    stack.push(SetFieldCommand(window, COL_STOCK, {1: 1, 2: 1}, versions, "Set the stock of 2 parts"))
+    window.conn.execute("UPDATE components SET stock = 4 WHERE id = 2")  # Someone else's change
+    window.conn.commit()
+
+    stack.undo()
+    assert stock(window.conn) == [1, 4, 7]  # Part 1 isn't put back either
+    assert len(window.warnings) == 1 and "ID 2" in window.warnings[0]
+    assert stack.count() == 0
+    assert window.model.record(1)[COL_STOCK] == 4
+
+
+def test_stale_batch_is_refused(window):
+    stack = QUndoStack()
+    versions = {part_id: window.repository.get(part_id).version for part_id in (1, 3)}
+    window.conn.execute("UPDATE components SET part = 'P3A' WHERE id = 3")
+    window.conn.commit()
+    stack.push(SetFieldCommand(window, COL_STOCK, {1: 0, 3: 0}, versions, "Set the stock of 2 parts"))
+    assert stock(window.conn) == [5, 0, 7]
+    assert len(window.warnings) == 1 and stack.count() == 0
+
+
+def test_undo_delete_restores_parts_and_their_bom_links(window):
+    projects = ProjectRepository(window.conn)
+    project_id, _, matched = projects.import_bom("amp", [{"reference": "U1", "cus_id": None, "part": "P1",
+                                                          "description": None, "footprint": None, "quantity": 1}])
+    assert matched == 1
+    stack = QUndoStack()
+    versions = {part_id: window.repository.get(part_id).version for part_id in (1, 3)}
+    stack.push(DeleteCommand(window, versions, "Delete 2 parts"))
+    assert stock(window.conn) == [0]
+    assert window.model.rowCount() == 1
+    assert len(projects.unmatched(project_id)) == 1
+
+    stack.undo()
+    assert stock(window.conn) == [5, 0, 7]
+    assert [window.model.partId(row) for row in range(3)] == [1, 2, 3]
+    assert projects.unmatched(project_id) == []
+    assert window.warnings == []
@@ -0,0 +1,44 @@
+import pytest
+
+from database import (MIGRATIONS, SCHEMA_VERSION, DuplicateCusIdError, connect, explain, init_db,
+                      renumber_duplicate_cus_ids, schema_version)
+
+
+@pytest.fixture
+def v1(tmp_path):
+    """A database at schema version 1: the components table as older versions created it."""
+    conn = connect(str(tmp_path / "components.db"))
+    MIGRATIONS[0](conn)
+    conn.execute("PRAGMA user_version = 1")
+    conn.executemany("INSERT INTO components (cus_id, part) VALUES (?, ?)",
+                     [("C1", "LM358"), ("C1", "NE555"), ("", "TL072"), ("  ", "LM7805"), ("C2", "BC547"),
+                      ("C1", "2N2222")])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_connections_use_wal_and_migrations_add_the_lookup_indexes(conn):
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert conn.execute("PRAGMA synchronous").fetchone() == (1,)  # NORMAL
+    assert schema_version(conn) == SCHEMA_VERSION
+    plan = " ".join(explain(conn, "SELECT id FROM components WHERE cus_id = ?", ("C1",)))
+    assert "idx_components_cus_id" in plan
+    for column in ("part", "type", "footprint"):
+        assert f"idx_components_{column}" in " ".join(explain(
+            conn, f"SELECT id FROM components WHERE {column} = ?", ("x",)))
+
+
+def test_duplicate_cus_ids_stop_the_upgrade_until_renumbered(v1):
+    with pytest.raises(DuplicateCusIdError) as error:
+        init_db(v1)
+    assert error.value.duplicates == {"C1": [1, 2, 6]}
+    assert schema_version(v1) == 1
+    assert v1.execute("SELECT cus_id FROM components ORDER BY id").fetchall() == \
+        [("C1",), ("C1",), ("",), ("  ",), ("C2",), ("C1",)]
+
+    assert renumber_duplicate_cus_ids(v1) == [(2, "C1", "C1-2"), (6, "C1", "C1-6")]
+    init_db(v1)
+    assert schema_version(v1) == SCHEMA_VERSION
+    assert v1.execute("SELECT cus_id FROM components ORDER BY id").fetchall() == \
+        [("C1",), ("C1-2",), (None,), (None,), ("C2",), ("C1-6",)]
@@ -0,0 +1,48 @@
+import pytest
+
+from dedupe import EXACT, MERGED, SIMILAR, find_duplicates, merge_duplicates
+from ledger import StockLedger
+from projects import ProjectRepository
+from repository import ConflictError, PartsRepository
+
+
+@pytest.fixture
+def parts(conn):
+    repository = PartsRepository(conn)
+    repository.upsert_many([(None, "C1", "IC", "LM358N", "Op amp", "DIP-8", 3, "", 0, 0),
+                            (None, "C2", "IC", "lm358n/nopb", "Dual op amp, low power", "DIP-8", 4,
+                             "datasheets/LM358.pdf", 5, 10),
+                            (None, "C3", "IC", "LM358P", "Op amp", "DIP-8", 2, "", 0, 0),
+                            (None, "C4", "IC", "NE555", "Timer", "DIP-8", 1, "", 0, 0)])
+    return repository
+
+
+def test_exact_duplicates_merge_into_the_oldest_part(conn, parts):
+    projects = ProjectRepository(conn)
+    project_id, _, _ = projects.import_bom("amp", [{"reference": "U1", "cus_id": "C2", "part": None,
+                                                    "description": None, "footprint": None, "quantity": 2}])
+    projects.reserve(project_id, 1)
+
+    groups = find_duplicates(conn)
+    assert [(group.kind, [part.id for part in group.parts]) for group in groups] == [(EXACT, [1, 2])]
+    assert [group.kind for group in find_duplicates(conn, similar=True)] == [SIMILAR]
+
+    assert merge_duplicates(conn, groups) == 1
+    kept = parts.get(1)
+    assert parts.get(2) is None
+    assert (kept.cus_id, kept.description, kept.stock, kept.datasheetpath, kept.min_stock, kept.reorder_qty) == \
+        ("C1", "Op amp", 7, "datasheets/LM358.pdf", 5, 10)
+    assert [(movement.delta, movement.reason) for movement in StockLedger(conn).history(1)][:1] == [(4, MERGED)]
+    assert [line.part_id for line in projects.bom(project_id)] == [1]
+    assert conn.execute("SELECT part_id, quantity FROM stock_reservations").fetchall() == [(1, 2)]
+    assert find_duplicates(conn) == []
+
+
+def test_merge_refuses_parts_changed_since_they_were_found(conn, parts):
+    groups = find_duplicates(conn)
+    parts.save(updated=[parts.get(2)._replace(stock=9)])
+
+    with pytest.raises(ConflictError) as error:
+        merge_duplicates(conn, groups)
+    assert list(error.value.conflicts) == [2]
+    assert [(part.id, part.stock) for part in parts.get_many([1, 2])] == [(1, 3), (2, 9)]
@@ -0,0 +1,66 @@
+from importexport import UPDATE, import_parts, read_records
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_partial_update_leaves_unmapped_fields_alone(conn, tmp_path):
+    conn.execute('''INSERT INTO components (type, part, description, footprint, stock, datasheetpath, datasheet_hash,
+                                            min_stock, reorder_qty)
+                    VALUES ('IC', 'PIC16F887', '8-bit MCU', 'DIP-40', 5, 'ds/pic.pdf', 'abc', 10, 25)''')
+    conn.commit()
+    path = write(tmp_path, "stock.csv", "part,qty\nPIC16F887,40\n")
+
+    assert import_parts(conn, read_records(path), on_duplicate=UPDATE) == (0, 1, 0)
+
+    row = conn.execute('''SELECT type, description, footprint, stock, datasheetpath, datasheet_hash, min_stock,
+                                 reorder_qty FROM components WHERE part = 'PIC16F887' ''').fetchone()
+    assert row == ("IC", "8-bit MCU", "DIP-40", 40, "ds/pic.pdf", "abc", 10, 25)
+
+
+def test_update_skips_blank_cells_and_forgets_hash_of_new_datasheet(conn, tmp_path):
+    conn.execute('''INSERT INTO components (part, description, stock, datasheetpath, datasheet_hash, min_stock)
+                    VALUES ('LM358', 'Op amp', 7, 'ds/old.pdf', 'abc', 3)''')
+    conn.commit()
+    path = write(tmp_path, "parts.csv", "part,description,stock,datasheet,min stock\nLM358,,,ds/new.pdf,\n")
+
+    import_parts(conn, read_records(path), on_duplicate=UPDATE)
+
+    row = conn.execute('''SELECT description, stock, datasheetpath, datasheet_hash, min_stock FROM components
+                          WHERE part = 'LM358' ''').fetchone()
+    assert row == ("Op amp", 7, "ds/new.pdf", None, 3)
+
+
+def test_new_parts_get_defaults_for_missing_fields(conn, tmp_path):
+    path = write(tmp_path, "new.csv", "part,qty\nNE555,\n")
+
+    assert import_parts(conn, read_records(path)) == (1, 0, 0)
+
+    row = conn.execute("SELECT cus_id, type, stock, min_stock FROM components WHERE part = 'NE555'").fetchone()
+    assert row == (None, "", 0, 0)
+
+
+def test_rows_match_parts_by_part_number_or_cus_id(conn, tmp_path):
+    conn.executemany("INSERT INTO components (cus_id, part, stock) VALUES (?, ?, ?)",
+                     [("C1", "LM358", 5), (None, "NE555", 2), ("C3", "TL072", 1)])
+    conn.commit()
+    # By part number only, by CUS ID only, a new part, and a different stock item with TL072's number
+    path = write(tmp_path, "stock.csv", "cus id,part,qty\n,LM358,40\nC3,,7\n,LM317,3\nC4,TL072,9\n")
+
+    assert import_parts(conn, read_records(path), on_duplicate=UPDATE) == (2, 2, 0)
+
+    rows = conn.execute("SELECT cus_id, part, stock FROM components ORDER BY id").fetchall()
+    assert rows == [("C1", "LM358", 40), (None, "NE555", 2), ("C3", "TL072", 7), (None, "LM317", 3),
+                    ("C4", "TL072", 9)]
+
+
+def test_skip_leaves_a_part_matched_by_part_number_alone(conn, tmp_path):
+    conn.execute("INSERT INTO components (cus_id, part, stock) VALUES ('C1', 'LM358', 5)")
+    conn.commit()
+    path = write(tmp_path, "stock.csv", "part,qty\nLM358,40\nLM358,41\n")
+
+    assert import_parts(conn, read_records(path)) == (0, 0, 2)
+    assert conn.execute("SELECT COUNT(*), SUM(stock) FROM components").fetchone() == (1, 5)
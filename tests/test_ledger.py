@@ -0,0 +1,27 @@
+from ledger import CLOSING, OPENING, StockLedger, today
+from repository import PartsRepository
+
+
+def test_deleted_part_drops_out_of_stock_as_of(conn):
+    repository = PartsRepository(conn)
+    ledger = StockLedger(conn)
+    kept, deleted = repository.upsert_many([(None, "C1", "IC", "LM358", "Op amp", "SOIC-8", 10, "", 0, 0),
+                                            (None, "C2", "IC", "NE555", "Timer", "DIP-8", 4, "", 0, 0)])
+    ledger.record([(deleted, -1, "used")])
+    assert ledger.stock_as_of(today().isoformat()) == {kept: 10, deleted: 3}
+
+    part = repository.get(deleted)
+    repository.save(deleted=[(deleted, part.version)])
+
+    assert ledger.stock_as_of(today().isoformat()) == {kept: 10}
+    assert ledger.stock_at(deleted, today().isoformat()) == 0
+    closing = ledger.history(deleted)[0]
+    assert (closing.delta, closing.balance, closing.reason) == (-3, 0, CLOSING)
+    # Closing isn't usage
+    assert conn.execute("SELECT used, received FROM stock_usage_daily WHERE part_id = ?",
+                        (deleted,)).fetchall() == [(1, 0)]
+
+    # Putting it back (as undo does) opens it again
+    repository.upsert_many([part])
+    assert ledger.stock_as_of(today().isoformat()) == {kept: 10, deleted: 3}
+    assert ledger.history(deleted)[0].reason == OPENING
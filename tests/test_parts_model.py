@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from parts_model import PartsTableModel, COL_PART, COL_STOCK  # noqa: E402
+from repository import ConflictError, PartsRepository  # noqa: E402
+
+
+def test_saved_new_part_is_not_paged_in_twice(conn):
+    conn.executemany("INSERT INTO components (part, stock) VALUES (?, 1)", [(f"P{i:04}",) for i in range(1000)])
+    conn.commit()
+    repository = PartsRepository(conn)
+    model = PartsTableModel(repository)
+    model.refresh()
+    row = model.addPart()
+    model.setData(model.index(row, COL_PART), "NEW-1")
+    inserted, updated, deleted = model.pendingChanges()
+    result = repository.save(inserted, updated, deleted)
+    model.markSaved(inserted, result.new_ids, updated, deleted, result.versions)
+
+    while model.canFetchMore():
+        model.fetchMore()
+
+    ids = [model.partId(row) for row in range(model.rowCount())]
+    assert len(ids) == 1001
+    assert len(set(ids)) == 1001
+
+    # A new query shows it once, in its place
+    model.refresh()
+    while model.canFetchMore():
+        model.fetchMore()
+    ids = [model.partId(row) for row in range(model.rowCount())]
+    assert ids == sorted(ids) and len(ids) == 1001
+
+
+def test_save_writes_only_the_edited_rows(conn):
+    conn.executemany("INSERT INTO components (part, stock) VALUES (?, 1)", [(f"P{i:02}",) for i in range(50)])
+    conn.commit()
+    repository = PartsRepository(conn)
+    model = PartsTableModel(repository)
+    model.refresh()
+    seq = repository.last_change()
+
+    model.setData(model.index(3, COL_STOCK), "9")
+    model.setData(model.index(3, COL_STOCK), "9")  # Setting the same value again isn't another edit
+    model.setData(model.index(5, COL_PART), model.record(5)[COL_PART])  # Nor is an unchanged value
+    model.removePart(10)
+    model.setData(model.index(model.addPart(), COL_PART), "NEW-1")
+    inserted, updated, deleted = model.pendingChanges()
+    assert [record[0] for record in updated] == [4]
+    assert deleted == [(11, 1)]
+
+    result = repository.save(inserted, updated, deleted)
+    model.markSaved(inserted, result.new_ids, updated, deleted, result.versions)
+    assert not model.hasPendingChanges()
+    assert repository.changes_since(seq)[1] == {4: "update", 11: "delete", 51: "insert"}
+    assert repository.get(4).stock == 9
+
+
+def test_failed_save_writes_nothing_and_keeps_the_edits(conn):
+    conn.executemany("INSERT INTO components (part, stock) VALUES (?, 1)", [("P1",), ("P2",)])
+    conn.commit()
+    repository = PartsRepository(conn)
+    model = PartsTableModel(repository)
+    model.refresh()
+    model.setData(model.index(0, COL_STOCK), "5")
+    model.setData(model.index(model.addPart(), COL_PART), "NEW-1")
+    conn.execute("UPDATE components SET stock = 2 WHERE id = 1")  # Someone else's change
+    conn.commit()
+
+    inserted, updated, deleted = model.pendingChanges()
+    with pytest.raises(ConflictError):
+        repository.save(inserted, updated, deleted)
+    assert conn.execute("SELECT COUNT(*), SUM(stock) FROM components").fetchone() == (2, 3)
+    assert model.pendingChanges() == (inserted, updated, deleted)
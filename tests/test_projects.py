@@ -0,0 +1,76 @@
+import pytest
+
+from projects import CONFIRMED, SIMILAR, ProjectRepository, ShortageError
+from repository import PartsRepository
+
+
+def bom_line(part, quantity=1, reference=None):
+    return {"reference": reference, "cus_id": None, "part": part, "description": None, "footprint": None,
+            "quantity": quantity}
+
+
+def test_similar_match_is_not_used_until_confirmed(conn):
+    [part_id] = PartsRepository(conn).upsert_many([(None, "C1", "IC", "LM358N", "Op amp", "DIP-8", 10, "", 0, 0)])
+    projects = ProjectRepository(conn)
+    project_id = projects.create("amp")
+
+    assert projects.set_bom(project_id, [bom_line("LM358P", 2)]) == (1, 0)
+    [line] = projects.unmatched(project_id)
+    assert (line.part_id, line.match) == (part_id, SIMILAR)
+    assert projects.check(project_id).requirements == []
+    with pytest.raises(ShortageError):
+        projects.build(project_id, 1)
+    with pytest.raises(ShortageError):
+        projects.reserve(project_id, 1)
+    assert conn.execute("SELECT stock FROM components WHERE id = ?", (part_id,)).fetchone() == (10,)
+    assert conn.execute("SELECT COUNT(*) FROM stock_reservations").fetchone() == (0,)
+
+    assert [(line.part, part) for line, part in projects.similar(project_id)] == [("LM358P", "LM358N")]
+    assert projects.confirm_similar(project_id) == 1
+    assert projects.unmatched(project_id) == []
+    assert projects.bom(project_id)[0].match == CONFIRMED
+    projects.build(project_id, 1)
+    assert conn.execute("SELECT stock FROM components WHERE id = ?", (part_id,)).fetchone() == (8,)
+
+
+def test_failed_bom_import_leaves_no_project(conn):
+    projects = ProjectRepository(conn)
+    with pytest.raises(KeyError):
+        projects.import_bom("amp", [{"part": "LM358N"}])
+    assert projects.projects() == []
+
+    project_id, lines, matched = projects.import_bom("amp", [bom_line("LM358N")])
+    assert (lines, matched) == (1, 0)
+    assert [project.id for project in projects.projects()] == [project_id]
+
+
+def test_reserved_stock_is_held_from_other_projects_until_built(conn):
+    opamp, timer = PartsRepository(conn).upsert_many([(None, "C1", "IC", "LM358N", "Op amp", "DIP-8", 10, "", 0, 0),
+                                                      (None, "C2", "IC", "NE555", "Timer", "DIP-8", 3, "", 0, 0)])
+    projects = ProjectRepository(conn)
+    amp, _, _ = projects.import_bom("amp", [bom_line("LM358N", 2), bom_line("NE555", 1)])
+    other, _, _ = projects.import_bom("other", [bom_line("LM358N", 3)])
+    assert projects.check(amp, 3).buildable == 3
+
+    projects.reserve(amp, 3)
+    assert projects.check(other).requirements[0].available == 4
+    with pytest.raises(ShortageError) as error:
+        projects.reserve(other, 2)
+    assert error.value.check.requirements[0].short == 2
+    assert conn.execute("SELECT project_id, part_id, quantity FROM stock_reservations ORDER BY part_id").fetchall() \
+        == [(amp, opamp, 6), (amp, timer, 3)]
+
+    with pytest.raises(ShortageError):
+        projects.build(amp, 4)
+    assert conn.execute("SELECT stock FROM components ORDER BY id").fetchall() == [(10,), (3,)]
+
+    projects.build(amp, 2)
+    assert conn.execute("SELECT stock FROM components ORDER BY id").fetchall() == [(6,), (1,)]
+    assert conn.execute("SELECT part_id, delta, reason, note FROM stock_movements WHERE reason = 'used' "
+                        "ORDER BY part_id").fetchall() == [(opamp, -4, "used", "built 2 x amp"),
+                                                           (timer, -2, "used", "built 2 x amp")]
+    assert projects.find("amp").reserved_boards == 1
+    assert projects.check(other).requirements[0].available == 4
+
+    projects.release(amp)
+    assert projects.check(other).requirements[0].available == 6
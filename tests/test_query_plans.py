@@ -0,0 +1,15 @@
+from cli import page_plan_checks, plan_checks
+from database import explain
+from repository import PartsRepository
+
+
+def test_lookups_use_their_indexes(conn):
+    for sql, params, index in plan_checks(PartsRepository(conn)):
+        plan = explain(conn, sql, params)
+        assert any(index in line for line in plan), (sql, plan)
+
+
+def test_parts_table_pages_are_read_in_order(conn):
+    for description, sql, params in page_plan_checks(PartsRepository(conn)):
+        plan = explain(conn, sql, params)
+        assert not any("TEMP B-TREE" in line for line in plan), (description, sql, plan)
@@ -0,0 +1,86 @@
+import pytest
+
+import repository
+from database import connect, explain
+from repository import ConflictError, Filters, PartsRepository
+
+
+def add_parts(conn, count, description):
+    conn.executemany("INSERT INTO components (part, description) VALUES (?, ?)",
+                     [(f"P{index}", description) for index in range(count)])
+    conn.commit()
+
+
+def test_search_ranks_a_few_matches_and_lists_many_by_id(conn, monkeypatch):
+    monkeypatch.setattr(repository, "RANKED_MATCHES", 10)
+    add_parts(conn, 12, "Resistor")
+    add_parts(conn, 3, "Zener diode")
+    conn.execute("INSERT INTO components (part, description) VALUES ('ZENER', 'Zener diode')")
+    conn.commit()
+    parts = PartsRepository(conn)
+
+    zener = parts.search_query("zener")
+    assert zener.order is None
+    assert parts.search("zener")[0].part == "ZENER"  # Matched on its part number too
+
+    resistors = parts.search_query("resistor")
+    assert resistors.order == "id"
+    first = parts.get_page(0, 5, resistors)
+    rest = parts.get_page(0, 100, resistors, after=first[-1])
+    assert [part.id for part in first + rest] == list(range(1, 13))
+    assert "TEMP B-TREE" not in " ".join(explain(conn, *parts.page_sql(resistors)))
+
+    # Going back to the default order from a column sort checks again
+    assert parts.sorted_query(resistors._replace(order="part")) == resistors
+
+
+def test_filtered_sorts_page_through_every_part_once(conn):
+    conn.executemany("INSERT INTO components (type, part, footprint, stock) VALUES (?, ?, ?, ?)",
+                     [(("IC", "Resistor")[index % 2], f"P{index % 7}", ("SMD", None)[index % 3 == 0], index % 11)
+                      for index in range(60)])
+    conn.commit()
+    parts = PartsRepository(conn)
+
+    for filters in (Filters(type="IC"), Filters(type="IC", footprint="SMD"), Filters(min_stock=2, max_stock=8)):
+        expected = {part.id for part in parts.get_page(0, 1000, parts.all_parts_query(filters))}
+        for order in ("type", "footprint", "part", "stock"):
+            for descending in (False, True):
+                query = parts.all_parts_query(filters, order, descending)
+                seen, after = [], None
+                while True:
+                    page = parts.get_page(0, 4, query, after=after)
+                    if not page:
+                        break
+                    seen += page
+                    after = page[-1]
+                assert [part.id for part in seen] == [part.id for part in sorted(
+                    seen, key=lambda part: ((getattr(part, order) is not None, getattr(part, order)), part.id),
+                    reverse=descending)]
+                assert sorted(part.id for part in seen) == sorted(expected)
+
+
+def test_save_refuses_to_overwrite_a_concurrent_change(conn):
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    mine, theirs = PartsRepository(conn), PartsRepository(connect(path))
+    [part_id, other_id] = mine.upsert_many([(None, "C1", "IC", "LM358", "Op amp", "SOIC-8", 10, "", 0, 0),
+                                            (None, "C2", "IC", "NE555", "Timer", "DIP-8", 4, "", 0, 0)])
+    loaded = mine.get(part_id)
+    seq = mine.last_change()
+
+    saved = theirs.save(updated=[theirs.get(part_id)._replace(stock=7)])
+    assert saved.versions[part_id] == loaded.version + 1
+    assert mine.changes_since(seq) == (mine.last_change(), {part_id: "update"})
+
+    # Both my edit of the changed part and my edit of another one are refused
+    with pytest.raises(ConflictError) as error:
+        mine.save(updated=[loaded._replace(stock=12), mine.get(other_id)._replace(stock=5)])
+    assert error.value.conflicts == {part_id: loaded.version + 1}
+    assert (mine.get(part_id).stock, mine.get(other_id).stock) == (7, 4)
+    with pytest.raises(ConflictError):
+        mine.save(deleted=[(part_id, loaded.version)])
+    assert mine.get(part_id) is not None
+
+    # Once reloaded, the same edit goes through
+    mine.save(updated=[mine.get(part_id)._replace(stock=12)])
+    assert theirs.get(part_id).stock == 12
+    theirs.conn.close()
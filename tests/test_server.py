@@ -0,0 +1,124 @@
+import http.client
+import json
+import socket
+import sqlite3
+import threading
+
+import pytest
+
+import server
+from database import connect, init_db
+from repository import PartsRepository
+
+
+@pytest.fixture
+def api(tmp_path):
+    """A running ApiServer over a database of 30 parts; yields its port."""
+    path = str(tmp_path / "components.db")
+    conn = connect(path)
+    init_db(conn)
+    conn.executemany("INSERT INTO components (part, stock) VALUES (?, 5)", [(f"P{index}",) for index in range(30)])
+    conn.commit()
+    conn.close()
+    api_server = server.ApiServer(("127.0.0.1", 0), path, readers=1, quiet=True)
+    thread = threading.Thread(target=api_server.serve_forever, daemon=True)
+    thread.start()
+    yield api_server.server_address[1]
+    api_server.shutdown()
+    api_server.server_close()
+
+
+def request(port, method, path, body=None):
+    client = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    client.request(method, path, json.dumps(body) if body is not None else None,
+                   {"Content-Type": "application/json"})
+    return client, client.getresponse()
+
+
+@pytest.mark.parametrize("body", [{"delta": True}, {"stock": False}, {"delta": 1.5}, {"delta": 1, "stock": 2},
+                                  {"stock": -1}, {"delta": 1, "reason": 3}, {"delta": 1, "note": ["box 4"]}, [1]])
+def test_stock_change_needs_one_whole_number(api, body):
+    client, response = request(api, "POST", "/parts/1/stock", body)
+    assert response.status == 400
+    response.read()
+    client, response = request(api, "GET", "/parts/1")
+    assert json.loads(response.read())["stock"] == 5
+
+
+def test_stock_change_is_booked_with_its_reason_and_note(api):
+    client, response = request(api, "POST", "/parts/1/stock", {"delta": -2, "reason": "used", "note": "amp"})
+    assert response.status == 200
+    assert json.loads(response.read())["stock"] == 3
+    client, response = request(api, "POST", "/parts/1/stock", {"stock": 0, "note": None})
+    assert response.status == 200
+    assert json.loads(response.read())["stock"] == 0
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-1"])
+def test_bad_content_length_is_refused(api, length):
+    with socket.create_connection(("127.0.0.1", api), timeout=5) as sock:
+        sock.sendall(b"POST /parts/1/stock HTTP/1.1\r\nHost: localhost\r\nContent-Length: " + length
+                     + b"\r\n\r\n{}")
+        received = b""
+        while True:
+            data = sock.recv(65536)  # The server closes the connection rather than read on
+            if not data:
+                break
+            received += data
+    assert received.startswith(b"HTTP/1.1 400") and received.count(b"HTTP/1.1") == 1
+
+
+def test_list_failing_mid_stream_is_cut_short(api, monkeypatch):
+    monkeypatch.setattr(server, "STREAM_BATCH", 10)
+    cursor = PartsRepository.cursor
+
+    def failing_cursor(self, *args, **kwargs):
+        real = cursor(self, *args, **kwargs)
+
+        class Failing:
+            calls = 0
+
+            def fetchmany(self, size):
+                Failing.calls += 1
+                if Failing.calls == 2:
+                    raise sqlite3.OperationalError("disk I/O error")
+                return real.fetchmany(size)
+
+            def close(self):
+                real.close()
+
+        return Failing()
+
+    monkeypatch.setattr(PartsRepository, "cursor", failing_cursor)
+    with socket.create_connection(("127.0.0.1", api), timeout=5) as sock:
+        sock.sendall(b"GET /parts HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        received = b""
+        while True:
+            data = sock.recv(65536)  # Times out unless the server closes the connection
+            if not data:
+                break
+            received += data
+    assert received.startswith(b"HTTP/1.1 200")
+    assert b'"P9"' in received and b'"P10"' not in received
+    assert b"HTTP/1.1 503" not in received and not received.endswith(b"0\r\n\r\n")
+
+
+def test_list_etag_depends_on_the_query_and_the_data(api):
+    def etag(path, headers=None):
+        client = http.client.HTTPConnection("127.0.0.1", api, timeout=5)
+        client.request("GET", path, headers=headers or {})
+        response = client.getresponse()
+        response.read()
+        return response.status, response.getheader("ETag")
+
+    _, first = etag("/parts?limit=5&sort=part")
+    assert etag("/parts?sort=part&limit=5") == (200, first)
+    assert etag("/parts?sort=part&limit=5", {"If-None-Match": first}) == (304, first)
+    # Another page or filter of the same data isn't the cached response
+    status, other = etag("/parts?limit=10&sort=part", {"If-None-Match": first})
+    assert status == 200 and other != first
+
+    client, response = request(api, "POST", "/parts/1/stock", {"delta": 1})
+    response.read()
+    status, changed = etag("/parts?sort=part&limit=5", {"If-None-Match": first})
+    assert status == 200 and changed != first
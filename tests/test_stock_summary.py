@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+from database import rebuild_stock_summary
+from ledger import StockLedger
+from repository import PartsRepository, StockSummary
+
+
+def test_summary_follows_every_kind_of_change(conn):
+    repository = PartsRepository(conn)
+    opamp, timer, _ = repository.upsert_many([(None, "C1", "IC", "LM358", "Op amp", "DIP-8", 10, "", 5, 20),
+                                              (None, "C2", "IC", "NE555", "Timer", "DIP-8", 4, "", 0, 0),
+                                              (None, "C3", "Resistor", "10k", "", None, 100, "", 0, 0)])
+    assert repository.stock_summary() == [StockSummary("IC", "DIP-8", 2, 14, 0),
+                                          StockSummary("Resistor", "", 1, 100, 0)]
+
+    StockLedger(conn).record([(opamp, -7, "used")])  # Stock booked through the ledger
+    repository.save(updated=[repository.get(timer)._replace(footprint="SOIC-8", min_stock=10)])
+    assert repository.stock_summary() == [StockSummary("IC", "DIP-8", 1, 3, 1), StockSummary("IC", "SOIC-8", 1, 4, 1),
+                                          StockSummary("Resistor", "", 1, 100, 0)]
+    assert repository.low_stock_count() == 2
+    assert [(item["part"], item["order_qty"]) for item in repository.reorder_items()] == [("LM358", 20),
+                                                                                       ("NE555", 6)]
+
+    repository.save(deleted=[opamp])
+    assert repository.stock_summary() == [StockSummary("IC", "SOIC-8", 1, 4, 1),
+                                          StockSummary("Resistor", "", 1, 100, 0)]
+    before = conn.execute("SELECT * FROM stock_summary WHERE parts > 0 ORDER BY 1, 2").fetchall()
+    rebuild_stock_summary(conn)
+    assert conn.execute("SELECT * FROM stock_summary ORDER BY 1, 2").fetchall() == before
+
+
+def test_stock_edits_are_booked_in_an_append_only_ledger(conn):
+    repository = PartsRepository(conn)
+    [part_id] = repository.upsert_many([(None, "C1", "IC", "LM358", "Op amp", "DIP-8", 10, "", 0, 0)])
+    repository.save(updated=[repository.get(part_id)._replace(stock=6)])
+    ledger = StockLedger(conn)
+    assert [(movement.delta, movement.balance) for movement in ledger.history(part_id)] == [(-4, 6), (10, 10)]
+
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("UPDATE stock_movements SET delta = 0")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("DELETE FROM stock_movements")
+    conn.rollback()
+    assert len(ledger.history(part_id)) == 2
+
+    # A failed batch leaves neither the stock, the ledger nor the summary half written
+    with pytest.raises(sqlite3.IntegrityError):
+        with repository.transaction():
+            ledger.record([(part_id, -1, "used")])
+            conn.execute("UPDATE stock_movements SET delta = 0")
+    assert repository.get(part_id).stock == 6
+    assert len(ledger.history(part_id)) == 2
+    assert repository.stock_summary() == [StockSummary("IC", "DIP-8", 1, 6, 0)]
@@ -0,0 +1,54 @@
+import os
+import shutil
+import subprocess
+import sys
+
+
+class DatasheetViewer:
+    """Opens datasheets without paying a viewer cold start for every click.
+
+    With the bundled SumatraPDF (Windows only), every file is opened with -reuse-instance: the first
+    launch starts the viewer, and later ones pass the path to the running window over SumatraPDF's
+    own IPC and exit, so the file opens as a new tab. Without it, files go to the desktop's default
+    PDF viewer (xdg-open on Linux, open on macOS).
+    """
+
+    def __init__(self, sumatra_path):
+        self.sumatra_path = sumatra_path
+        self._launched = []  # Processes started here and not yet seen to exit
+
+    def uses_sumatra(self):
+        return sys.platform == 'win32' and os.path.exists(self.sumatra_path)
+
+    def open(self, path):
+        """Show a PDF, in the running viewer if there is one."""
+        if self.uses_sumatra():
+            process = subprocess.Popen([self.sumatra_path, '-reuse-instance', path])
+        else:
+            process = open_with_system_viewer(path)
+        self.shutdown()
+        if process is not None:
+            self._launched.append(process)
+
+    def shutdown(self):
+        """Collect the exit status of launchers that have finished, so none is left unwaited.
+
+        Viewers still open are left running.
+        """
+        self._launched = [launched for launched in self._launched if launched.poll() is None]
+
+
+def open_with_system_viewer(path):
+    """Open a file with the platform's default application.
+
+    Returns the launcher process for the caller to wait on, or None on Windows, where none is started.
+    """
+    if sys.platform == 'win32':
+        os.startfile(path)
+        return None
+    if sys.platform == 'darwin':
+        return subprocess.Popen(['open', path])
+    opener = shutil.which('xdg-open')
+    if opener is None:
+        raise FileNotFoundError("No PDF viewer found: install xdg-utils or a desktop PDF viewer")
+    return subprocess.Popen([opener, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)